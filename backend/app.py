@@ -5,12 +5,44 @@ import os
 
 load_dotenv()
 
-def create_app():
+def create_app(connect: bool = True):
+    """
+    Build the Flask app. With connect=False no database / cache clients are
+    opened yet — serve.py calls init_services() in each worker after the
+    fork, because PyMongo clients are not fork-safe.
+    """
     app = Flask(__name__)
 
     app.config["SECRET_KEY"]       = os.environ.get("SECRET_KEY", "change-me")
     app.config["JWT_EXPIRY_HOURS"] = int(os.environ.get("JWT_EXPIRY_HOURS", 24))
     app.config["MONGO_URI"]        = os.environ.get("MONGO_URI", "mongodb://localhost:27017/notvault")
+    app.config["MONGO_MAX_POOL_SIZE"] = int(os.environ.get("MONGO_MAX_POOL_SIZE", 100))
+    app.config["MEDIA_STORE"]      = os.environ.get("MEDIA_STORE", "gridfs")
+    app.config["MEDIA_DIR"]        = os.environ.get("MEDIA_DIR", "media")
+    app.config["EVENTS_BACKEND"]   = os.environ.get("EVENTS_BACKEND", "auto")
+    app.config["STORAGE_BACKEND"]  = os.environ.get("STORAGE_BACKEND", "mongo")
+    app.config["SQLITE_PATH"]      = os.environ.get("SQLITE_PATH", "notevault.db")
+    app.config["CACHE_URL"]        = os.environ.get("CACHE_URL", "")
+    app.config["CACHE_TTL"]        = int(os.environ.get("CACHE_TTL", 300))
+    app.config["SINGLE_FLIGHT_GRACE"] = float(os.environ.get("SINGLE_FLIGHT_GRACE", 0))
+    app.config["ADMISSION_CONTROL"]     = os.environ.get("ADMISSION_CONTROL", "1") != "0"
+    app.config["ADMISSION_RETRY_AFTER"] = int(os.environ.get("ADMISSION_RETRY_AFTER", 2))
+    app.config["WORKER_CONCURRENCY"]    = int(os.environ.get("WORKER_CONCURRENCY", 0))
+    app.config["RELATED_MAX_USERS"]     = int(os.environ.get("RELATED_MAX_USERS", 32))
+    app.config["EXPORT_CONCURRENCY"]    = int(os.environ.get("EXPORT_CONCURRENCY", 2))
+    app.config["QUERY_BUDGETS"]         = os.environ.get("QUERY_BUDGETS", "")
+    app.config["DEGRADED_SECTIONS"]     = {s.strip() for s in os.environ.get(
+        "DEGRADED_SECTIONS", "dashboard.words,dashboard.tags").split(",") if s.strip()}
+    app.config["BREAKER"]               = os.environ.get("BREAKER", "1") != "0"
+    app.config["BREAKER_WINDOW"]        = float(os.environ.get("BREAKER_WINDOW", 10))
+    app.config["BREAKER_MIN_REQUESTS"]  = int(os.environ.get("BREAKER_MIN_REQUESTS", 20))
+    app.config["BREAKER_FAILURE_RATIO"] = float(os.environ.get("BREAKER_FAILURE_RATIO", 0.5))
+    app.config["BREAKER_COOLDOWN"]      = float(os.environ.get("BREAKER_COOLDOWN", 15))
+    app.config["METRICS_TOKEN"]         = os.environ.get("METRICS_TOKEN", "")
+    app.config["METRICS_PUBLIC"]        = os.environ.get("METRICS_PUBLIC", "0") == "1"
+    app.config["READ_PREFERENCES"]      = os.environ.get(
+        "READ_PREFERENCES", "heavy=secondaryPreferred,dashboard.get_activity=secondaryPreferred")
+    app.config["MAX_STALENESS_SECONDS"] = int(os.environ.get("MAX_STALENESS_SECONDS", 90))
 
     allowed = os.environ.get("ALLOWED_ORIGINS", "*")
     origins = [o.strip() for o in allowed.split(",")] if "," in allowed else allowed
@@ -18,23 +50,48 @@ def create_app():
     CORS(app, resources={r"/api/*": {
         "origins": origins,
         "methods": ["GET","POST","PUT","DELETE","OPTIONS"],
-        "allow_headers": ["Content-Type","Authorization"]
+        "allow_headers": ["Content-Type","Authorization","X-Causal-Token"],
+        "expose_headers": ["X-Causal-Token"]
     }})
 
-    from config.db import init_db
-    init_db(app)
+    # Query budgets + circuit breaker; first, so requests it turns away are never admitted
+    from middleware.deadline import init_deadlines
+    init_deadlines(app)
+
+    # Per-route-class concurrency limits + load shedding (per worker process)
+    from middleware.admission import init_admission
+    init_admission(app)
+
+    # Heavy reads to secondaries; read-your-writes tokens between requests
+    from middleware.routing import init_routing
+    init_routing(app)
+
+    if connect:
+        init_services(app)
 
     from routes.auth      import auth_bp
     from routes.subjects  import subjects_bp
     from routes.chapters  import chapters_bp
     from routes.notes     import notes_bp
     from routes.dashboard import dashboard_bp
+    from routes.media     import media_bp
+    from routes.sync      import sync_bp
+    from routes.events    import events_bp
+    from routes.tags      import tags_bp
+    from routes.tree      import tree_bp
+    from routes.export    import export_bp
 
     app.register_blueprint(auth_bp,      url_prefix="/api/auth")
     app.register_blueprint(subjects_bp,  url_prefix="/api/subjects")
     app.register_blueprint(chapters_bp,  url_prefix="/api/chapters")
     app.register_blueprint(notes_bp,     url_prefix="/api/notes")
     app.register_blueprint(dashboard_bp, url_prefix="/api/dashboard")
+    app.register_blueprint(media_bp,     url_prefix="/api/media")
+    app.register_blueprint(sync_bp,      url_prefix="/api/sync")
+    app.register_blueprint(events_bp,    url_prefix="/api/events")
+    app.register_blueprint(tags_bp,      url_prefix="/api/tags")
+    app.register_blueprint(tree_bp,      url_prefix="/api/tree")
+    app.register_blueprint(export_bp,    url_prefix="/api/export")
 
     @app.route("/")
     def root():
@@ -44,10 +101,51 @@ def create_app():
     def health():
         return {"status": "ok", "app": "NoteVault API", "version": "1.0.0"}, 200
 
+    @app.route("/api/metrics")
+    def metrics():
+        from flask import request
+        from config.metrics import snapshot, authorized
+        if not app.config["METRICS_PUBLIC"]:
+            if not app.config["METRICS_TOKEN"]:
+                return {"error": "Not found"}, 404
+            if not authorized(request.headers, app.config["METRICS_TOKEN"]):
+                return {"error": "Operator token required"}, 401
+        return snapshot(), 200
+
     return app
 
-# Vercel needs app at module level
-app = create_app()
+
+def init_services(app):
+    """Open storage, media, event and cache connections for this process."""
+    from storage import init_storage
+    init_storage(app)
+
+    from config.media import init_media
+    init_media(app)
+
+    from config.events import init_events
+    init_events(app)
+
+    from config.cache import init_cache
+    init_cache(app)
+
+    from config.related import init_related
+    init_related(app)
+
+
+def close_services(app):
+    """Wake open event streams and release connections (graceful shutdown)."""
+    from config.events import get_hub
+    hub = get_hub()
+    if hub is not None:
+        hub.close()
+    repo = getattr(app, "repo", None)
+    if repo is not None:
+        repo.close()
+
+
+# Vercel needs app at module level (serve.py connects it after forking)
+app = create_app(connect=os.environ.get("NOTEVAULT_DEFER_CONNECT") != "1")
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
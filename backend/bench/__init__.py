@@ -0,0 +1,5 @@
+"""
+bench — benchmarks, run from the backend folder:
+
+    python -m bench.<name>
+"""
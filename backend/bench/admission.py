@@ -0,0 +1,176 @@
+"""
+bench/admission.py — Autosave latency under a heavy-read spike, with and without admission control
+
+Starts `serve.py` (threaded, one worker by default) twice, once with
+ADMISSION_CONTROL=0 and once with it on. Each run loads a library, then
+for a fixed time:
+
+  • a few "autosave" clients PUT note content every --save-interval seconds
+  • many "spike" clients hammer search / browse / dashboard stats with no
+    think time, varying the arguments so nothing coalesces
+
+and prints autosave p50 / p95 / max, spike throughput, how many spike
+requests were shed (503) and the controller's final limits.
+
+    python -m bench.admission
+    python -m bench.admission --spike 48 --seconds 20 --threads 16
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import secrets
+import tempfile
+import threading
+import time
+
+from bench.fixtures import text_note
+from bench.serve import HOST, _call, _seed, _start
+
+WORDS = ["momentum", "energy", "theorem", "matrix", "enzyme", "market", "contract", "integral"]
+
+
+def _spike(port: int, data: dict, threads: int, seconds: float, out):
+    deadline = time.time() + seconds
+    result   = {"ok": 0, "shed": 0, "other": 0, "latencies": []}
+    lock     = threading.Lock()
+
+    def loop(seed):
+        rng  = random.Random(seed)
+        conn = http.client.HTTPConnection(HOST, port, timeout=60)
+        while time.time() < deadline:
+            roll = rng.random()
+            if roll < 0.45:
+                path = f"/api/notes/search?q={rng.choice(WORDS)}+{rng.choice(WORDS)}&limit={rng.randint(10, 50)}"
+            elif roll < 0.9:
+                path = f"/api/notes/browse?q={rng.choice(WORDS)}&page={rng.randint(1, 20)}"
+            else:
+                path = f"/api/dashboard/stats?r={rng.random()}"
+            start = time.perf_counter()
+            try:
+                status, _ = _call(conn, "GET", path, data["token"])
+            except (OSError, http.client.HTTPException):
+                status, conn = 0, http.client.HTTPConnection(HOST, port, timeout=60)
+            with lock:
+                if status == 200:
+                    result["ok"] += 1
+                    result["latencies"].append(time.perf_counter() - start)
+                elif status == 503:
+                    result["shed"] += 1
+                else:
+                    result["other"] += 1
+            if status == 503:
+                time.sleep(0.05)              # a real client would honour Retry-After
+
+    pool = [threading.Thread(target=loop, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    out.put(("spike", result))
+
+
+def _autosave(port: int, data: dict, clients: int, interval: float, seconds: float, out):
+    deadline = time.time() + seconds
+    result   = {"ok": 0, "errors": 0, "latencies": []}
+    lock     = threading.Lock()
+
+    def loop(seed):
+        rng  = random.Random(seed)
+        conn = http.client.HTTPConnection(HOST, port, timeout=60)
+        note = data["notes"][seed % len(data["notes"])]
+        while time.time() < deadline:
+            start = time.perf_counter()
+            try:
+                status, _ = _call(conn, "PUT", f"/api/notes/{note}", data["token"],
+                                  {"content": text_note(rng, 3)})
+            except (OSError, http.client.HTTPException):
+                status, conn = 0, http.client.HTTPConnection(HOST, port, timeout=60)
+            took = time.perf_counter() - start
+            with lock:
+                if status == 200:
+                    result["ok"] += 1
+                    result["latencies"].append(took)
+                else:
+                    result["errors"] += 1
+            time.sleep(max(0.0, interval - took))
+
+    pool = [threading.Thread(target=loop, args=(i,)) for i in range(clients)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    out.put(("autosave", result))
+
+
+def _pct(latencies: list, q: float) -> float:
+    if not latencies:
+        return float("nan")
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+
+
+def run(enabled: bool, port: int, args, env: dict) -> dict:
+    env = dict(env, ADMISSION_CONTROL="1" if enabled else "0")
+    env["SQLITE_PATH"] = os.path.join(env["BENCH_TMP"], f"admission-{int(enabled)}.db")
+    proc = _start("threaded", port, args.workers, env)
+    try:
+        data = _seed(port, args.notes)
+        out  = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=_spike, args=(port, data, args.spike, args.seconds, out)),
+            multiprocessing.Process(target=_autosave,
+                                    args=(port, data, args.savers, args.save_interval, args.seconds, out)),
+        ]
+        for p in procs:
+            p.start()
+        results = dict(out.get() for _ in procs)
+        for p in procs:
+            p.join()
+        _, snapshot = _call(http.client.HTTPConnection(HOST, port), "GET", "/api/metrics",
+                            env["METRICS_TOKEN"])
+    finally:
+        proc.terminate()
+        proc.wait(30)
+    results["admission"] = snapshot.get("admission")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--notes",         type=int,   default=1500)
+    parser.add_argument("--seconds",       type=float, default=15)
+    parser.add_argument("--spike",         type=int,   default=32, help="concurrent heavy-read clients")
+    parser.add_argument("--savers",        type=int,   default=3,  help="autosave clients")
+    parser.add_argument("--save-interval", type=float, default=0.5)
+    parser.add_argument("--workers",       type=int,   default=1)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("STORAGE_BACKEND", "sqlite")
+    env["BENCH_TMP"] = tempfile.mkdtemp()
+    env["METRICS_TOKEN"] = secrets.token_hex(16)
+    env.setdefault("MEDIA_DIR", os.path.join(env["BENCH_TMP"], "media"))
+
+    rows = [(label, run(enabled, 5700 + i, args, env))
+            for i, (label, enabled) in enumerate((("off", False), ("on", True)))]
+
+    print(f"\n{args.spike} spike clients + {args.savers} autosave clients (every {args.save_interval}s), "
+          f"{args.seconds:.0f} s, threaded × {args.workers}, {multiprocessing.cpu_count()} CPU(s)")
+    print(f"{'admission':<11}{'save p50':>10}{'save p95':>10}{'save max':>10}{'saves':>7}{'err':>5}"
+          f"{'spike ok/s':>12}{'spike p95':>11}{'shed':>7}")
+    for label, r in rows:
+        s, h = r["autosave"], r["spike"]
+        print(f"{label:<11}{_pct(s['latencies'], .5):10.0f}{_pct(s['latencies'], .95):10.0f}"
+              f"{_pct(s['latencies'], 1):10.0f}{s['ok']:7d}{s['errors']:5d}"
+              f"{h['ok'] / args.seconds:12.1f}{_pct(h['latencies'], .95):11.0f}{h['shed']:7d}")
+    if rows[1][1]["admission"]:
+        print("\nfinal limits (on):", json.dumps(
+            {k: {f: v[f] for f in ("limit", "shed", "latency_ms")} for k, v in rows[1][1]["admission"].items()}))
+
+
+if __name__ == "__main__":
+    main()
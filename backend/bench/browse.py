@@ -0,0 +1,170 @@
+"""
+bench/browse.py — Latency and index use of GET /api/notes/browse
+
+Loads one user's library (10k notes by default, updated over the last
+90 days), then times typical browse requests through the Flask test
+client and prints p50 / p95. Afterwards it shows how each backend reads
+the data:
+
+  sqlite  EXPLAIN QUERY PLAN for every statement one browse request runs
+          (SEARCH … USING INDEX is good; SCAN n means a full table scan)
+  mongo   executionStats for the leading $match — the only stage of the
+          pipeline that can use an index; the facets work on its output
+
+    python -m bench.browse                   # SQLite
+    python -m bench.browse --mongo           # + MongoDB at MONGO_URI
+    python -m bench.browse --notes 50000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+os.environ.setdefault("MEDIA_DIR", os.path.join(tempfile.mkdtemp(), "media"))
+
+from bson import ObjectId
+from models.note import new_subject_doc, new_chapter_doc, new_note_doc
+from bench.fixtures import library
+
+
+def _seed(app, notes: int) -> tuple:
+    """Sign up a fresh user and load the library; returns (headers, user_id, ids)."""
+    client = app.test_client()
+    email  = f"browse-{ObjectId()}@example.com"
+    body   = client.post("/api/auth/signup", json={
+        "name": "Bench", "username": email.split("@")[0], "email": email, "password": "benchmark",
+    }).get_json()
+    user_id = body["user"]["id"]
+
+    repo     = app.repo
+    rng      = random.Random(11)
+    now      = datetime.utcnow()
+    subjects = {}
+    chapters = {}
+    for subj_no, ch_no, title, content, tags in library(random.Random(7), notes):
+        if subj_no not in subjects:
+            doc = new_subject_doc(user_id, f"Subject {subj_no}", "#6C63FF", "📚")
+            doc["seq"] = repo.next_seq(ObjectId(user_id))
+            subjects[subj_no] = repo.insert_subject(doc)
+        key = (subj_no, ch_no)
+        if key not in chapters:
+            doc = new_chapter_doc(user_id, str(subjects[subj_no]), f"Chapter {ch_no}", "📖")
+            doc["seq"] = repo.next_seq(ObjectId(user_id))
+            chapters[key] = repo.insert_chapter(doc)
+        doc = new_note_doc(user_id, str(subjects[subj_no]), str(chapters[key]), title, content, tags)
+        doc["seq"]        = repo.next_seq(ObjectId(user_id))
+        doc["updated_at"] = now - timedelta(minutes=rng.randint(0, 90 * 24 * 60))
+        repo.insert_note(doc)
+
+    return {"Authorization": f"Bearer {body['token']}"}, ObjectId(user_id), {
+        "subject":  str(subjects[0]),
+        "subject2": str(subjects[1]),
+        "chapter":  str(chapters[(0, 0)]),
+    }
+
+
+def _queries(ids: dict) -> dict:
+    s, s2, ch = ids["subject"], ids["subject2"], ids["chapter"]
+    return {
+        "everything":             "",
+        "subject":                f"subject_id={s}",
+        "2 subjects + chapter":   f"subject_id={s},{s2}&chapter_id={ch}",
+        "tag":                    "tag=exam",
+        "2 tags + week":          "tag=exam&tag=lab&updated=week",
+        "date range":             f"updated_after={(datetime.utcnow() - timedelta(days=45)).date()}"
+                                  f"&updated_before={(datetime.utcnow() - timedelta(days=15)).date()}",
+        "text":                   "q=momentum+theorem",
+        "text + subject + tag":   f"q=momentum&subject_id={s}&tag=formula",
+        "title sort, page 40":    "sort=title&page=40",
+    }
+
+
+def _explain_sqlite(app, client, headers, qs: str):
+    conn  = app.repo._conn()
+    seen  = []
+    conn.set_trace_callback(seen.append)             # statements with bound values
+    client.get(f"/api/notes/browse?{qs}", headers=headers)
+    conn.set_trace_callback(None)
+    for sql in seen:
+        if not sql.lstrip().upper().startswith("SELECT") or "FROM notes" not in sql and "notes_fts" not in sql:
+            continue
+        head = " ".join(sql.split())[:70]
+        print(f"    {head}…")
+        for row in conn.execute("EXPLAIN QUERY PLAN " + sql):
+            print(f"      {row[3]}")
+
+
+def _explain_mongo(app, user_id, qs_name: str, first: dict):
+    from config.db import db
+    stats = db.command("explain", {"find": "notes", "filter": first}, verbosity="executionStats")
+    plan, stages = stats["queryPlanner"]["winningPlan"], []
+    while plan:
+        stages.append(plan["stage"] + (f" {plan['indexName']}" if "indexName" in plan else ""))
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    ex = stats["executionStats"]
+    print(f"    {qs_name:<22} {' ← '.join(stages):<60} keys={ex['totalKeysExamined']:>6} "
+          f"docs={ex['totalDocsExamined']:>6} returned={ex['nReturned']:>6}")
+
+
+def run(backend: str, notes: int, repeat: int) -> dict:
+    os.environ["STORAGE_BACKEND"] = backend
+    from app import create_app
+    app = create_app()
+
+    start = time.perf_counter()
+    headers, user_id, ids = _seed(app, notes)
+    print(f"\n{backend}: loaded {notes:,} notes in {time.perf_counter() - start:.1f} s")
+
+    client  = app.test_client()
+    queries = _queries(ids)
+    results = {}
+    for name, qs in queries.items():
+        res = client.get(f"/api/notes/browse?{qs}", headers=headers)          # warm up
+        assert res.status_code == 200, (name, res.status_code, res.get_data(as_text=True)[:200])
+        total   = res.get_json()["total"]
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            client.get(f"/api/notes/browse?{qs}", headers=headers)
+            samples.append((time.perf_counter() - t0) * 1000)
+        samples.sort()
+        results[name] = (statistics.median(samples), samples[int(len(samples) * 0.95) - 1])
+        print(f"  {name:<22} {total:>6} hits   p50={results[name][0]:8.2f} ms   p95={results[name][1]:8.2f} ms")
+
+    print(f"\n  {backend} query plans")
+    if backend == "sqlite":
+        for name in ("everything", "2 tags + week", "text + subject + tag"):
+            print(f"  [{name}]")
+            _explain_sqlite(app, client, headers, queries[name])
+    else:
+        for name, first in (
+            ("everything / subject",  {"user_id": user_id}),
+            ("tag",                   {"user_id": user_id, "tags": {"$all": ["exam"]}}),
+            ("2 tags",                {"user_id": user_id, "tags": {"$all": ["exam", "lab"]}}),
+            ("text",                  {"user_id": user_id, "$text": {"$search": "momentum theorem"}}),
+        ):
+            _explain_mongo(app, user_id, name, first)
+
+    app.repo.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--notes",  type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--mongo",  action="store_true", help="also benchmark MongoDB at MONGO_URI")
+    args = parser.parse_args()
+
+    for backend in ["sqlite"] + (["mongo"] if args.mongo else []):
+        run(backend, args.notes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
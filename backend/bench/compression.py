@@ -0,0 +1,56 @@
+"""
+bench/compression.py — Storage and latency of note content compression
+
+Compares the stored BSON size of a note document and the write/read cost
+of the previous plain-string layout vs. `pack_content`, for small,
+text-heavy and image-heavy notes.
+
+    python -m bench.compression
+"""
+
+import random
+import time
+import bson
+from models import note as note_model
+from models.note import new_note_doc, serialize_note
+from bench.fixtures import text_note, image_note
+
+USER = SUBJ = CHAP = "65f000000000000000000000"
+
+
+def _time(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def measure(name: str, content: str, repeat: int):
+    threshold = note_model.COMPRESS_THRESHOLD
+    rows = []
+    for label, limit in (("before", float("inf")), ("after", threshold)):
+        note_model.COMPRESS_THRESHOLD = limit
+        doc = new_note_doc(USER, SUBJ, CHAP, "Bench", content, "")
+        if label == "before":
+            del doc["content_codec"], doc["content_text"]
+        size   = len(bson.encode(doc))
+        encode = _time(lambda: new_note_doc(USER, SUBJ, CHAP, "Bench", content, ""), repeat)
+        decode = _time(lambda: serialize_note(doc), repeat)
+        rows.append((label, size, encode, decode, doc.get("content_codec") or "-"))
+    note_model.COMPRESS_THRESHOLD = threshold
+
+    print(f"\n{name}  ({len(content.encode()):,} bytes of HTML)")
+    for label, size, encode, decode, codec in rows:
+        print(f"  {label:<7} codec={codec:<5} bson={size:>11,} B   "
+              f"write={encode:8.3f} ms   read={decode:8.3f} ms")
+
+
+def main():
+    rng = random.Random(42)
+    measure("small note",       text_note(rng, 2),                          2000)
+    measure("text-heavy note",  text_note(rng, 400),                        50)
+    measure("image-heavy note", image_note(rng, 5 * 1024 * 1024, images=3), 5)
+
+
+if __name__ == "__main__":
+    main()
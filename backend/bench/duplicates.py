@@ -0,0 +1,107 @@
+"""
+bench/duplicates.py — GET /api/notes/duplicates against all-pairs comparison
+
+Loads one user's library (10k notes by default), then pastes --copies of
+them into other chapters, each copy lightly edited (a sentence added,
+some words changed). Prints:
+
+  • latency of GET /api/notes/duplicates (LSH candidates + verification)
+  • how many of the planted copies it found, out of those whose exact
+    shingle Jaccard similarity reaches the threshold (recall), and any
+    pairs it reported that are below it
+  • the cost of comparing every pair of signatures instead (timed on up
+    to --sample notes, scaled quadratically), for scale
+  • the cost of the create-time check (POST with "check_duplicates")
+
+    python -m bench.duplicates
+    python -m bench.duplicates --notes 20000 --copies 500
+"""
+
+import argparse
+import random
+import time
+
+from bench.browse import _seed               # sets SQLite / media defaults on import
+from bench.fixtures import paragraph
+from models.dedup import shingles, similarity
+from models.note import note_text
+
+
+def _edit(rng: random.Random, content: str) -> str:
+    """A pasted copy: one sentence added, a few words swapped."""
+    words = content.split(" ")
+    for _ in range(max(1, len(words) // 50)):
+        words[rng.randrange(len(words))] = rng.choice(("energy", "proof", "market", "enzyme"))
+    return " ".join(words).replace("</p>", f" {paragraph(rng, 12)}</p>", 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--notes",     type=int,   default=10_000)
+    parser.add_argument("--copies",    type=int,   default=200)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--sample",    type=int,   default=1500)
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    start = time.perf_counter()
+    headers, user_id, ids = _seed(app, args.notes)
+    print(f"\nloaded {args.notes:,} notes in {time.perf_counter() - start:.1f} s")
+
+    repo   = app.repo
+    client = app.test_client()
+    rng    = random.Random(5)
+    notes  = [n for _, coll, n in repo.changes_since(user_id, 0, args.notes * 2 + 100) if coll == "notes"]
+    planted = set()
+    for original in rng.sample(notes, args.copies):
+        copy = _edit(rng, original["content"])
+        res  = client.post("/api/notes", headers=headers, json={
+            "subject_id": str(original["subject_id"]), "chapter_id": ids["chapter"],
+            "title": original["title"] + " (copy)", "content": copy,
+        })
+        a, b = shingles(note_text(original)), shingles(note_text({"content": copy}))
+        if len(a & b) / len(a | b) >= args.threshold:
+            planted.add(frozenset((str(original["_id"]), res.get_json()["note"]["id"])))
+
+    timings = []
+    for _ in range(5):
+        t0  = time.perf_counter()
+        res = client.get(f"/api/notes/duplicates?threshold={args.threshold}", headers=headers)
+        timings.append((time.perf_counter() - t0) * 1000)
+    found = {
+        frozenset((a["id"], b["id"]))
+        for c in res.get_json()["clusters"] for a in c["notes"] for b in c["notes"] if a["id"] < b["id"]
+    }
+    hits = len(planted & found)
+    print(f"  GET /duplicates        p50={sorted(timings)[2]:8.1f} ms   {res.get_json()['total']} clusters")
+    print(f"  copies at >= {args.threshold} found  {hits}/{len(planted)} ({hits / max(1, len(planted)):.0%}) "
+          f"of {args.copies} planted; {len(found - planted)} pairs below it reported")
+
+    signatures = [n["minhash"] for n in repo.find_notes(
+        [n["_id"] for n in notes[:args.sample]], user_id, ("minhash",)) if n.get("minhash")]
+    t0 = time.perf_counter()
+    for i, a in enumerate(signatures):
+        for b in signatures[i + 1:]:
+            similarity(a, b)
+    took  = (time.perf_counter() - t0) * 1000
+    total = len(notes) + args.copies
+    print(f"  all pairs              {took:8.0f} ms for {len(signatures):,} notes → "
+          f"~{took * (total / len(signatures)) ** 2 / 1000:.0f} s for {total:,}")
+
+    content = notes[0]["content"]
+    timings = []
+    for check in (False, True):
+        t0 = time.perf_counter()
+        for _ in range(20):
+            client.post("/api/notes", headers=headers, json={
+                "subject_id": str(notes[0]["subject_id"]), "chapter_id": ids["chapter"],
+                "title": "again", "content": content, "check_duplicates": check,
+            })
+        timings.append((time.perf_counter() - t0) * 1000 / 20)
+    print(f"  POST /notes            {timings[0]:8.2f} ms   with check_duplicates {timings[1]:.2f} ms")
+    repo.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+bench/export.py — Throughput and memory of GET /api/export
+
+Loads one user's library — text notes plus notes with images, --mb of
+data in all (1 GB by default; images are random bytes, so they don't
+compress) — then downloads it through the Flask test client, unbuffered,
+in each format and prints:
+
+  • MB/s of archive produced and the archive size
+  • the peak of Python allocations during the download (tracemalloc, on
+    a second pass) and the process's peak RSS growth: both should stay
+    flat as --mb grows, since nothing but the zip's central directory
+    accumulates
+
+    python -m bench.export
+    python -m bench.export --mb 200 --notes 5000
+"""
+
+import argparse
+import hashlib
+import random
+import resource
+import time
+import tracemalloc
+
+from bench.browse import _seed               # sets SQLite / media defaults on import
+from bench.fixtures import paragraph
+from bson import ObjectId
+from config.media import get_media_store
+from models.media import MEDIA_URL
+from models.note import new_note_doc
+
+MB = 1024 * 1024
+
+
+def _add_images(app, user_id, ids: dict, total: int, image_bytes: int) -> int:
+    """Store `total` bytes of images, each in a note of its own; returns how many."""
+    rng   = random.Random(9)
+    store = get_media_store()
+    count = max(1, total // image_bytes)
+    for i in range(count):
+        blob   = rng.randbytes(image_bytes)
+        digest = hashlib.sha256(blob).hexdigest()
+        store.put(digest, blob, "image/jpeg")
+        doc = new_note_doc(str(user_id), ids["subject"], ids["chapter"], f"Figure {i}",
+                           f'<p>{paragraph(rng, 30)}</p><img src="{MEDIA_URL}{digest}" alt="figure"/>', "diagram")
+        doc["seq"] = app.repo.next_seq(user_id)
+        app.repo.insert_note(doc)
+    return count
+
+
+def _download(client, headers, fmt: str) -> tuple:
+    """(bytes received, seconds) for one unbuffered export."""
+    t0  = time.perf_counter()
+    res = client.get(f"/api/export?format={fmt}", headers=headers, buffered=False)
+    assert res.status_code == 200, res.get_data(as_text=True)[:200]
+    size = 0
+    for chunk in res.response:
+        size += len(chunk)
+    res.close()
+    return size, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--mb",     type=int, default=1024, help="library size, MB")
+    parser.add_argument("--notes",  type=int, default=10_000, help="text notes (the rest is images)")
+    parser.add_argument("--image",  type=int, default=2, help="image size, MB")
+    parser.add_argument("--format", default="md,html,ndjson")
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    start = time.perf_counter()
+    headers, user_id, ids = _seed(app, args.notes)
+    text   = sum(len(n.get("content") or "") for _, coll, n in
+                 app.repo.changes_since(user_id, 0, args.notes * 2 + 100) if coll == "notes")
+    images = _add_images(app, ObjectId(user_id), ids, max(0, args.mb * MB - text), args.image * MB)
+    print(f"\nloaded {args.notes:,} text notes ({text / MB:.0f} MB) + {images:,} × {args.image} MB images "
+          f"in {time.perf_counter() - start:.1f} s")
+
+    client = app.test_client()
+    for fmt in args.format.split(","):
+        rss0       = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        size, took = _download(client, headers, fmt)
+        rss1       = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        tracemalloc.start()
+        _download(client, headers, fmt)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"  {fmt:<7} {size / MB:8.0f} MB in {took:6.1f} s = {size / MB / took:6.0f} MB/s   "
+              f"peak alloc {peak / MB:6.1f} MB   peak RSS +{(rss1 - rss0) / 1024:.0f} MB")
+    app.repo.close()
+
+
+if __name__ == "__main__":
+    main()
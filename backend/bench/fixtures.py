@@ -0,0 +1,51 @@
+"""
+bench/fixtures.py — Synthetic but realistic note content for benchmarks
+"""
+
+import base64
+import random
+
+_WORDS = (
+    "the of and to in is that for it as with was on be by this are from "
+    "force energy velocity momentum equation theorem proof lemma matrix "
+    "vector integral derivative limit function graph node edge cell enzyme "
+    "protein reaction acid base market demand supply elasticity revenue "
+    "contract tort statute liability algorithm complexity recursion stack"
+).split()
+
+
+def paragraph(rng: random.Random, words: int = 60) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def text_note(rng: random.Random, paragraphs: int = 4) -> str:
+    """Plain lecture-style note: headings, paragraphs and a list."""
+    parts = [f"<h2>{paragraph(rng, 4)}</h2>"]
+    for _ in range(paragraphs):
+        parts.append(f"<p>{paragraph(rng)}</p>")
+    parts.append("<ul>" + "".join(f"<li>{paragraph(rng, 8)}</li>" for _ in range(5)) + "</ul>")
+    return "".join(parts)
+
+
+def image_note(rng: random.Random, image_bytes: int = 5 * 1024 * 1024, images: int = 1) -> str:
+    """Note with inline data-URL images, as the editor produces them."""
+    parts = [text_note(rng, 2)]
+    per_image = image_bytes // max(images, 1)
+    for _ in range(images):
+        blob = rng.randbytes(per_image)
+        parts.append(f'<img src="data:image/png;base64,{base64.b64encode(blob).decode()}" alt="upload"/>')
+        parts.append(f"<p>{paragraph(rng, 20)}</p>")
+    return "".join(parts)
+
+
+def library(rng: random.Random, notes: int = 10_000, subjects: int = 8, chapters: int = 6):
+    """Yield (subject_no, chapter_no, title, content, tags) for a user library."""
+    tags = ["exam", "lab", "revision", "important", "formula", "diagram", "todo", "week1"]
+    for i in range(notes):
+        yield (
+            i % subjects,
+            (i // subjects) % chapters,
+            f"Lecture {i}: {paragraph(rng, 3)[:-1]}",
+            text_note(rng, rng.randint(1, 8)),
+            ",".join(rng.sample(tags, rng.randint(0, 3))),
+        )
@@ -0,0 +1,389 @@
+"""
+bench/micro.py — Micro-benchmarks of the pure-Python helpers on every request
+
+Times serializers, snippet / HTML stripping, the auth decorator's token
+path (user lookup stubbed), note document building, tag normalizing and
+the dashboard's word count on three fixtures:
+
+  small   a lecture note of a few paragraphs
+  image   a note with a 5 MB inline image, as the editor sends it
+  10k     a 10,000-note library (the case works on all of it per call)
+
+Each case is run in batches until a batch takes --min-time seconds; the
+best of --repeat batches gives ops/s. A second pass under tracemalloc
+gives the peak bytes a single call allocates.
+
+    python -m bench.micro                          # run, print the table
+    python -m bench.micro -k serialize -k snippet  # only matching cases
+    python -m bench.micro --save before.json       # keep the results
+    python -m bench.micro --baseline before.json   # compare with them
+    python -m bench.micro --compare main HEAD      # two git revisions
+
+--compare checks each revision out into a temporary worktree and runs
+this file (the working tree's copy, so both sides run the same cases)
+against that revision's code. A case slower or allocating more than
+--threshold (default 10%) in the second run is a regression: they are
+marked and the command exits 1. Cases a revision cannot run (the helper
+did not exist yet) show as n/a.
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench.fixtures import text_note, image_note, library
+
+USER = SUBJ = CHAP = "65f000000000000000000000"
+
+CASES = {}             # name → setup(fixtures) returning the function to time
+_cleanups = []
+
+
+def case(name: str):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+# ── Fixtures ──────────────────────────────────────────────────────────────────
+
+class Fixtures:
+    """Built on first use, so a -k selection only pays for what it needs."""
+
+    def __init__(self, seed: int = 42):
+        self.rng    = random.Random(seed)
+        self._cache = {}
+
+    def _get(self, name, build):
+        if name not in self._cache:
+            self._cache[name] = build()
+        return self._cache[name]
+
+    @property
+    def small_html(self) -> str:
+        return self._get("small_html", lambda: text_note(self.rng, 3))
+
+    @property
+    def image_html(self) -> str:
+        return self._get("image_html", lambda: image_note(self.rng, 5 * 1024 * 1024))
+
+    def doc(self, html: str) -> dict:
+        """A note document as stored (compressed when large), with an _id."""
+        from bson import ObjectId
+        from models.note import new_note_doc
+        doc = new_note_doc(USER, SUBJ, CHAP, "Lecture 1: waves and optics", html, "exam, lab")
+        doc["_id"] = ObjectId()
+        return doc
+
+    @property
+    def small_doc(self) -> dict:
+        return self._get("small_doc", lambda: self.doc(self.small_html))
+
+    @property
+    def image_doc(self) -> dict:
+        return self._get("image_doc", lambda: self.doc(self.image_html))
+
+    @property
+    def library(self) -> list:
+        """10,000 stored note documents (built directly: no MinHash needed)."""
+        def build():
+            from datetime import datetime, timedelta
+            from bson import ObjectId
+            start = datetime(2025, 1, 1)
+            docs  = []
+            for i, (_, _, title, content, tags) in enumerate(library(random.Random(7), 10_000)):
+                when = start + timedelta(minutes=i)
+                docs.append({
+                    "_id": ObjectId(), "user_id": ObjectId(USER), "subject_id": ObjectId(SUBJ),
+                    "chapter_id": ObjectId(CHAP), "title": title, "content": content,
+                    "content_codec": None, "content_text": None, "tags": tags.split(",") if tags else [],
+                    "created_at": when, "updated_at": when, "seq": i + 1,
+                })
+            return docs
+        return self._get("library", build)
+
+
+# ── Cases ─────────────────────────────────────────────────────────────────────
+
+@case("serialize_id small")
+def _(fx):
+    from models.note import serialize_id
+    doc = fx.small_doc
+    return lambda: serialize_id(doc)
+
+
+@case("serialize_note small")
+def _(fx):
+    from models.note import serialize_note
+    doc = fx.small_doc
+    return lambda: serialize_note(doc)
+
+
+@case("serialize_note image")
+def _(fx):
+    from models.note import serialize_note
+    doc = fx.image_doc
+    return lambda: serialize_note(doc)
+
+
+@case("serialize_note 10k")
+def _(fx):
+    from models.note import serialize_note
+    docs = fx.library
+    return lambda: [serialize_note(d) for d in docs]
+
+
+@case("snippet small")
+def _(fx):
+    from models.note import make_snippet, note_text
+    doc = fx.small_doc
+    return lambda: make_snippet(note_text(doc))
+
+
+@case("snippet image")
+def _(fx):
+    from models.note import make_snippet, note_text
+    doc = fx.image_doc
+    return lambda: make_snippet(note_text(doc))
+
+
+@case("snippet 10k")
+def _(fx):
+    from models.note import make_snippet, note_text
+    docs = fx.library
+    return lambda: [make_snippet(note_text(d)) for d in docs]
+
+
+@case("strip_html image")
+def _(fx):
+    from models.note import strip_html
+    html = fx.image_html
+    return lambda: strip_html(html)
+
+
+@case("token_required")
+def _(fx):
+    import storage
+    from types import SimpleNamespace
+    from bson import ObjectId
+    from flask import Flask
+    from middleware.auth import token_required
+    from models.user import generate_token
+
+    app  = Flask("bench")
+    app.config["SECRET_KEY"] = "bench-secret-key-of-a-realistic-length"
+    user = {"_id": ObjectId(USER), "username": "bench", "email": "bench@example.com"}
+    saved, storage.repo = storage.repo, SimpleNamespace(find_user=lambda _id: user)
+    token = generate_token(USER, app.config["SECRET_KEY"])
+    ctx   = app.test_request_context(headers={"Authorization": f"Bearer {token}"})
+    ctx.push()
+
+    def restore():
+        ctx.pop()
+        storage.repo = saved
+    _cleanups.append(restore)
+    return token_required(lambda: None)
+
+
+@case("new_note_doc small")
+def _(fx):
+    from models.note import new_note_doc
+    html = fx.small_html
+    return lambda: new_note_doc(USER, SUBJ, CHAP, "Lecture 1", html, "exam, lab")
+
+
+@case("new_note_doc image")
+def _(fx):
+    from models.note import new_note_doc
+    html = fx.image_html
+    return lambda: new_note_doc(USER, SUBJ, CHAP, "Lecture 1", html, "exam, lab")
+
+
+@case("normalize_tags")
+def _(fx):
+    from models.note import normalize_tags
+    return lambda: (normalize_tags("Exam, lab ,  Revision,exam"), normalize_tags(["formula", "Diagram"]))
+
+
+@case("dashboard words 10k")
+def _(fx):
+    # The word count loop of GET /api/dashboard/stats
+    from models.note import strip_html, note_text
+    texts = [note_text(d) for d in fx.library]
+
+    def count():
+        total = 0
+        for text in texts:
+            total += len(strip_html(text).split())
+        return total
+    return count
+
+
+# ── Measuring ─────────────────────────────────────────────────────────────────
+
+def _ops_per_sec(fn, min_time: float, repeat: int) -> float:
+    n = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        took = time.perf_counter() - start
+        if took >= min_time:
+            break
+        n = max(n * 2, int(n * min_time / max(took, 1e-9) * 1.1))
+    best = took
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return n / best
+
+
+def _alloc_per_call(fn) -> int:
+    """Peak bytes allocated during one call (after a warm-up call)."""
+    fn()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        fn()
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+
+def run(patterns: list, min_time: float, repeat: int, echo=print) -> dict:
+    """name → {"ops": ops/s, "alloc": bytes}, or {"error": ...} if it can't run here."""
+    fx      = Fixtures()
+    results = {}
+    for name, setup in CASES.items():
+        if patterns and not any(p in name for p in patterns):
+            continue
+        try:
+            fn = setup(fx)
+            fn()
+        except Exception as e:
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+            echo(f"  {name:<22} n/a  ({results[name]['error'][:60]})")
+            continue
+        ops   = _ops_per_sec(fn, min_time, repeat)
+        alloc = _alloc_per_call(fn)
+        results[name] = {"ops": ops, "alloc": alloc}
+        echo(f"  {name:<22} {ops:>12,.1f} ops/s  {_fmt_ms(ops):>10}  {_fmt_bytes(alloc):>10} alloc/call")
+    while _cleanups:
+        _cleanups.pop()()
+    return results
+
+
+def _fmt_ms(ops: float) -> str:
+    ms = 1000 / ops
+    return f"{ms * 1000:.1f} µs" if ms < 1 else f"{ms:.2f} ms"
+
+
+def _fmt_bytes(n: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if n < 1024 or unit == "MB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def _revision(ref: str = "HEAD") -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", ref], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ref
+
+
+# ── Comparing ─────────────────────────────────────────────────────────────────
+
+def compare(before: dict, after: dict, threshold: float, labels=("before", "after")) -> list:
+    """Print both runs side by side; return the names of regressed cases."""
+    regressed = []
+    print(f"\n  {'case':<22} {labels[0]:>14} {labels[1]:>14} {'ops/s':>8} {'alloc':>8}")
+    for name in dict.fromkeys([*before, *after]):
+        a, b = before.get(name, {}), after.get(name, {})
+        if "ops" not in a or "ops" not in b:
+            print(f"  {name:<22} {'n/a' if 'ops' not in a else _fmt_ms(a['ops']):>14} "
+                  f"{'n/a' if 'ops' not in b else _fmt_ms(b['ops']):>14}")
+            continue
+        speed = b["ops"] / a["ops"] - 1
+        alloc = (b["alloc"] - a["alloc"]) / max(a["alloc"], 1)
+        worse = speed < -threshold or (alloc > threshold and b["alloc"] - a["alloc"] > 1024)
+        if worse:
+            regressed.append(name)
+        print(f"  {name:<22} {_fmt_ms(a['ops']):>14} {_fmt_ms(b['ops']):>14} {speed:>+8.0%} {alloc:>+8.0%}"
+              + ("   ⚠ regression" if worse else ""))
+    return regressed
+
+
+def _run_revision(rev: str, args) -> dict:
+    """Run this suite against `rev`'s code in a temporary git worktree."""
+    backend  = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    top      = subprocess.run(["git", "rev-parse", "--show-toplevel"], cwd=backend,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    tmp      = tempfile.mkdtemp(prefix="micro-")
+    worktree = os.path.join(tmp, "tree")
+    out      = os.path.join(tmp, "results.json")
+    subprocess.run(["git", "worktree", "add", "--detach", "--quiet", worktree, rev], cwd=top, check=True)
+    try:
+        target = os.path.join(worktree, os.path.relpath(backend, top))
+        os.makedirs(os.path.join(target, "bench"), exist_ok=True)
+        for name in ("__init__.py", "fixtures.py", "micro.py"):
+            shutil.copy(os.path.join(backend, "bench", name), os.path.join(target, "bench", name))
+        cmd = [sys.executable, "-m", "bench.micro", "--save", out,
+               "--min-time", str(args.min_time), "--repeat", str(args.repeat)]
+        for p in args.k:
+            cmd += ["-k", p]
+        print(f"\n{rev} ({_revision(rev)})")
+        subprocess.run(cmd, cwd=target, check=True)
+        with open(out) as f:
+            return json.load(f)["results"]
+    finally:
+        subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=top, check=False)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-k", action="append", default=[], help="only cases containing this (repeatable)")
+    parser.add_argument("--min-time",  type=float, default=0.2, help="seconds per timed batch")
+    parser.add_argument("--repeat",    type=int,   default=5,   help="batches; the best one counts")
+    parser.add_argument("--save",      help="write the results to this JSON file")
+    parser.add_argument("--baseline",  help="compare with results saved by --save")
+    parser.add_argument("--compare",   nargs=2, metavar=("OLD", "NEW"), help="compare two git revisions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        old, new  = (_run_revision(rev, args) for rev in args.compare)
+        regressed = compare(old, new, args.threshold, tuple(args.compare))
+    else:
+        results = run(args.k, args.min_time, args.repeat)
+        if args.save:
+            with open(args.save, "w") as f:
+                json.dump({"revision": _revision(), "python": sys.version.split()[0],
+                           "results": results}, f, indent=1)
+        regressed = []
+        if args.baseline:
+            with open(args.baseline) as f:
+                saved = json.load(f)
+            regressed = compare(saved["results"], results, args.threshold, (saved["revision"], "now"))
+
+    if regressed:
+        print(f"\n❌  {len(regressed)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+bench/related.py — Latency of GET /api/notes/<id>/related
+
+Loads one user's library (10k notes by default) and times, through the
+Flask test client:
+
+  cold     first request: the index reads the whole delta-sync feed,
+           tokenises every note and builds the matrix
+  warm     repeat requests for random notes, nothing changed
+  edited   a note is saved before every request, so each one applies one
+           change and rebuilds the IDF-weighted matrix
+
+and, for scale, the same top-k scored with a pure-Python loop over the
+same hashed features instead of one sparse matrix product.
+
+    python -m bench.related
+    python -m bench.related --notes 50000 --repeat 50
+"""
+
+import argparse
+import math
+import os
+import random
+import statistics
+import time
+
+from bench.browse import _seed               # sets SQLite / media defaults on import
+from bench.fixtures import text_note
+from config.related import _features
+from models.note import note_text
+
+
+def _time(fn, repeat: int) -> tuple:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[max(0, int(len(samples) * 0.95) - 1)]
+
+
+def _python_top(rows: dict, note_id: str, k: int) -> list:
+    """Cosine top-k with dicts: the loop the sparse product replaces."""
+    n  = len(rows)
+    df = {}
+    for cols, _ in rows.values():
+        for c in cols.tolist():
+            df[c] = df.get(c, 0) + 1
+    vecs = {}
+    for nid, (cols, tf) in rows.items():
+        v = {c: w * (math.log((1 + n) / (1 + df[c])) + 1) for c, w in zip(cols.tolist(), tf.tolist())}
+        norm = math.sqrt(sum(x * x for x in v.values())) or 1
+        vecs[nid] = {c: x / norm for c, x in v.items()}
+    q = vecs[note_id]
+    scores = [(sum(x * q.get(c, 0) for c, x in v.items()), nid) for nid, v in vecs.items() if nid != note_id]
+    return sorted(scores, reverse=True)[:k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--notes",  type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--k",      type=int, default=10)
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    app.config["METRICS_PUBLIC"] = True         # read through the in-process test client
+    start = time.perf_counter()
+    headers, user_id, _ = _seed(app, args.notes)
+    print(f"\nloaded {args.notes:,} notes in {time.perf_counter() - start:.1f} s")
+
+    client = app.test_client()
+    ids    = [str(n["_id"]) for n in app.repo.find_notes(
+        [doc["_id"] for _, coll, doc in app.repo.changes_since(user_id, 0, args.notes + 100, full=False)
+         if coll == "notes"], user_id, ())]
+    rng    = random.Random(3)
+
+    def get(nid=None):
+        res = client.get(f"/api/notes/{nid or rng.choice(ids)}/related?k={args.k}", headers=headers)
+        assert res.status_code == 200, res.get_data(as_text=True)[:200]
+        return res
+
+    t0   = time.perf_counter()
+    top  = get(ids[0]).get_json()["related"]
+    cold = (time.perf_counter() - t0) * 1000
+    print(f"  cold (build from feed)  {cold:9.1f} ms")
+    print(f"  e.g. {top[0]['title'][:40]!r} score={top[0]['score']}" if top else "  (no related notes)")
+
+    warm = _time(get, args.repeat)
+    print(f"  warm                    p50={warm[0]:8.2f} ms   p95={warm[1]:8.2f} ms")
+
+    def edit_then_get():
+        client.put(f"/api/notes/{rng.choice(ids)}", headers=headers, json={"content": text_note(rng, 3)})
+        t0 = time.perf_counter()
+        get()
+        return (time.perf_counter() - t0) * 1000
+
+    edited = sorted(edit_then_get() for _ in range(args.repeat))
+    print(f"  after one edit          p50={statistics.median(edited):8.2f} ms   "
+          f"p95={edited[max(0, int(len(edited) * 0.95) - 1)]:8.2f} ms")
+
+    rows = {}
+    for _, coll, doc in app.repo.changes_since(user_id, 0, args.notes * 2 + 100):
+        if coll == "notes":
+            rows[str(doc["_id"])] = _features(doc.get("title"), note_text(doc), doc.get("tags"))
+    loop = _time(lambda: _python_top(rows, ids[0], args.k), max(3, args.repeat // 10))
+    print(f"  pure-Python scoring     p50={loop[0]:8.2f} ms   (same features, no index)")
+    state = client.get("/api/metrics").get_json().get("related")
+    print(f"  index: {state}")
+    app.repo.close()
+
+
+if __name__ == "__main__":
+    main()
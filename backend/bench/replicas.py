@@ -0,0 +1,145 @@
+"""
+bench/replicas.py — Read routing and read-your-writes on a replica set
+
+Checks, through the Flask test client, that heavy reads are served by
+secondaries and writes by the primary, and that a read sent with the
+X-Causal-Token of the write before it always sees that write. It also
+counts how often the same read without the token missed the write (lag
+the token covered). Exits 1 if a check fails.
+
+Start a local three-member replica set first:
+
+    mkdir -p /tmp/rs/{0,1,2}
+    for i in 0 1 2; do
+        mongod --replSet rs0 --port 2701$i --dbpath /tmp/rs/$i --fork --logpath /tmp/rs/$i.log
+    done
+    mongosh --port 27010 --eval 'rs.initiate({_id: "rs0", members: [
+        {_id: 0, host: "localhost:27010"}, {_id: 1, host: "localhost:27011"},
+        {_id: 2, host: "localhost:27012"}]})'
+
+    MONGO_URI="mongodb://localhost:27010,localhost:27011,localhost:27012/notevault_bench?replicaSet=rs0" \\
+        python -m bench.replicas --rounds 200
+
+Use a throwaway database: it signs up a new user each run.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from pymongo import monitoring
+
+os.environ["STORAGE_BACKEND"] = "mongo"
+os.environ["CACHE_URL"]       = ""                  # every read must reach the database
+os.environ.setdefault("EVENTS_BACKEND", "local")
+
+HEADER = "X-Causal-Token"
+
+
+class CommandLog(monitoring.CommandListener):
+    """(command, server address, afterClusterTime sent) of the recording thread's commands."""
+
+    def __init__(self):
+        self.thread   = None
+        self.commands = []
+
+    def started(self, event):
+        if threading.get_ident() == self.thread:
+            after = "afterClusterTime" in (event.command.get("readConcern") or {})
+            self.commands.append((event.command_name, event.connection_id, after))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def record(self):
+        self.thread   = threading.get_ident()
+        self.commands = []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rounds", type=int, default=100, help="write → read rounds per mode")
+    args = parser.parse_args()
+
+    log = CommandLog()
+    monitoring.register(log)                  # before the client is created
+
+    from app import create_app
+    app    = create_app()
+    client = app.test_client()
+    if not app.repo.replicated:
+        print("❌  MONGO_URI is not a replica set (or sharded cluster)")
+        sys.exit(1)
+    primary = app.repo.db.client.primary
+    failed  = []
+
+    def call(method, url, json=None, token=None, expect=(200, 201)):
+        headers = {"Authorization": f"Bearer {auth}"} if auth else {}
+        if token:
+            headers[HEADER] = token
+        log.record()
+        res = client.open(url, method=method, json=json, headers=headers)
+        log.thread = None
+        assert res.status_code in expect, (method, url, res.status_code, res.get_json())
+        return res
+
+    def check(name, ok, detail=""):
+        print(f"  {'✅' if ok else '❌'}  {name}{detail}")
+        if not ok:
+            failed.append(name)
+
+    auth  = None
+    email = f"rs-{os.urandom(4).hex()}@example.com"
+    res   = call("POST", "/api/auth/signup", {"username": email.split("@")[0], "email": email, "password": "replicas"})
+    auth  = res.get_json()["token"]
+    token = res.headers.get(HEADER)
+    check("signup answers with a causal token", bool(token))
+
+    sid = call("POST", "/api/subjects", {"name": "Physics"}, token).get_json()["subject"]["id"]
+    cid = call("POST", "/api/chapters", {"name": "Waves", "subject_id": sid}, token).get_json()["chapter"]["id"]
+    res = call("POST", "/api/notes", {"title": "Interference", "content": "<p>Two slits</p>",
+               "chapter_id": cid, "subject_id": sid}, token)
+    nid   = res.get_json()["note"]["id"]
+    token = res.headers.get(HEADER) or token
+    writes = {addr for name, addr, _ in log.commands if name in ("insert", "update", "findAndModify")}
+    check("writes go to the primary", writes == {primary}, f"  ({', '.join(map(str, writes))})")
+
+    print("\nRouting")
+    for url in ("/api/dashboard/stats", "/api/dashboard/activity", "/api/notes/search?q=slits"):
+        call("GET", url, token=token)
+        reads = {addr for name, addr, _ in log.commands if name in ("find", "aggregate", "count")}
+        check(f"GET {url} from secondaries", bool(reads) and primary not in reads,
+              f"  ({', '.join(map(str, reads))})")
+        check(f"GET {url} waits for the token's write",
+              all(after for name, _, after in log.commands if name in ("find", "aggregate", "count")))
+
+    print(f"\nRead-your-writes ({args.rounds} rounds each)")
+    for with_token in (True, False):
+        missed = 0
+        start  = time.perf_counter()
+        for i in range(args.rounds):
+            word = f"w{os.urandom(4).hex()}"
+            res  = call("PUT", f"/api/notes/{nid}", {"content": f"<p>Two slits {word}</p>"}, token)
+            token = res.headers.get(HEADER) or token
+            found = call("GET", f"/api/notes/search?q={word}", token if with_token else None).get_json()["total"]
+            missed += not found
+        took = (time.perf_counter() - start) / args.rounds * 1000
+        label = "with token" if with_token else "without token"
+        if with_token:
+            check(f"{label}: every read saw its write", missed == 0, f"  ({missed} missed, {took:.1f} ms/round)")
+        else:
+            print(f"  ℹ️   {label}: {missed} of {args.rounds} reads missed the write ({took:.1f} ms/round)")
+
+    app.repo.close()
+    if failed:
+        print(f"\n❌  {len(failed)} check(s) failed")
+        sys.exit(1)
+    print("\n✅  Heavy reads on secondaries, writes on the primary, reads after a token see the write")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+bench/roundtrips.py — MongoDB commands sent per create / update request
+
+Registers a PyMongo CommandListener, makes each mutating request once
+through the Flask test client (auth lookup included) and prints the
+commands it sent, by name, next to EXPECTED. Exits 1 if any request sent
+more than expected, so it can guard against a re-read creeping back in.
+
+    MONGO_URI=mongodb://localhost:27017/notevault_bench python -m bench.roundtrips
+
+Use a throwaway database: it signs up a new user each run.
+"""
+
+import os
+import sys
+import threading
+from collections import Counter
+from pymongo import monitoring
+
+os.environ["STORAGE_BACKEND"] = "mongo"
+os.environ.setdefault("CACHE_URL", "")
+os.environ.setdefault("EVENTS_BACKEND", "local")
+
+# Commands per request: (now, before single-round-trip writes). The
+# protected routes start with the token's user lookup; note writes end
+# with the activity upsert (and a tag_counts bulk write when tags change).
+EXPECTED = {
+    "POST signup":       (1, 2),      # insert (was + re-read)
+    "PUT profile":       (2, 3),      # auth, findAndModify (was update + re-read)
+    "POST subject":      (3, 4),      # auth, seq, insert
+    "PUT subject":       (3, 5),      # auth, seq, findAndModify (was find + update + re-read)
+    "POST chapter":      (4, 5),      # auth, subject check, seq, insert
+    "PUT chapter":       (3, 5),
+    "POST note":         (6, 7),      # auth, projected chapter check, seq, insert, tags, activity
+    "PUT note":          (4, 6),      # auth, seq, findAndModify, activity
+    "PUT note tags":     (5, 7),      # + tag_counts
+}
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent from the recording thread (not the event hub's)."""
+
+    def __init__(self):
+        self.thread   = None
+        self.commands = Counter()
+
+    def started(self, event):
+        if threading.get_ident() == self.thread:
+            self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def record(self):
+        self.thread   = threading.get_ident()
+        self.commands = Counter()
+
+
+def measure(client, counter: CommandCounter) -> dict:
+    """name → Counter of commands, for each request in EXPECTED."""
+    email = f"rt-{os.urandom(4).hex()}@example.com"
+    seen  = {}
+
+    def call(name, method, url, json, headers=None):
+        counter.record()
+        res = client.open(url, method=method, json=json, headers=headers)
+        assert res.status_code in (200, 201), (name, res.status_code, res.get_json())
+        seen[name] = counter.commands
+        counter.thread = None
+        return res.get_json()
+
+    body = call("POST signup", "POST", "/api/auth/signup",
+                {"username": email.split("@")[0], "email": email, "password": "roundtrip"})
+    h = {"Authorization": f"Bearer {body['token']}"}
+    call("PUT profile", "PUT", "/api/auth/me", {"avatar": "🧪"}, h)
+    sid = call("POST subject", "POST", "/api/subjects", {"name": "Physics"}, h)["subject"]["id"]
+    call("PUT subject", "PUT", f"/api/subjects/{sid}", {"color": "#000000"}, h)
+    cid = call("POST chapter", "POST", "/api/chapters", {"name": "Waves", "subject_id": sid}, h)["chapter"]["id"]
+    call("PUT chapter", "PUT", f"/api/chapters/{cid}", {"icon": "🌊"}, h)
+    nid = call("POST note", "POST", "/api/notes", {"title": "Interference", "content": "<p>Two slits</p>",
+               "tags": ["optics"], "chapter_id": cid, "subject_id": sid}, h)["note"]["id"]
+    call("PUT note", "PUT", f"/api/notes/{nid}", {"content": "<p>Two slits, one screen</p>"}, h)
+    call("PUT note tags", "PUT", f"/api/notes/{nid}", {"tags": ["optics", "exam"]}, h)
+    return seen
+
+
+def main():
+    counter = CommandCounter()
+    monitoring.register(counter)              # before the client is created
+
+    from app import create_app
+    app  = create_app()
+    seen = measure(app.test_client(), counter)
+
+    over = []
+    print(f"\n  {'request':<15} {'now':>4} {'expected':>9} {'before':>7}   commands")
+    for name, (expected, before) in EXPECTED.items():
+        commands = seen[name]
+        total    = sum(commands.values())
+        if total > expected:
+            over.append(name)
+        print(f"  {name:<15} {total:>4} {expected:>9} {before:>7}   "
+              + ", ".join(f"{c}×{n}" if n > 1 else c for c, n in sorted(commands.items())))
+    app.repo.close()
+    if over:
+        print(f"\n❌  More commands than expected: {', '.join(over)}")
+        sys.exit(1)
+    print("\n✅  Every request within its expected round trips")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+bench/serve.py — Throughput of the serve.py worker models
+
+Starts `serve.py` once per worker model, loads a small library over HTTP,
+then drives a mixed read/write workload from several client processes
+for a fixed time — first on its own, then again while idle /api/events
+streams are held open (as browser tabs do). Prints requests/s and p50 /
+p95 latency per mode.
+
+    python -m bench.serve                                  # SQLite, all modes
+    python -m bench.serve --modes threaded gevent --streams 50
+    STORAGE_BACKEND=mongo MONGO_URI=... python -m bench.serve
+
+The load generator shares the machine with the server; compare modes
+against each other rather than reading the absolute numbers.
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from bench.fixtures import text_note
+
+HOST = "127.0.0.1"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _call(conn, method: str, path: str, token: str = None, body=None):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+    res  = conn.getresponse()
+    data = res.read()
+    is_json = (res.getheader("Content-Type") or "").startswith("application/json")
+    return res.status, (json.loads(data) if is_json else None)
+
+
+def _start(mode: str, port: int, workers: int, env: dict) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "serve.py", "--worker-class", mode, "--bind", f"{HOST}:{port}",
+         "--preload", *(["--workers", str(workers)] if workers else [])],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if _call(http.client.HTTPConnection(HOST, port, timeout=2), "GET", "/api/health")[0] == 200:
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"serve.py --worker-class {mode} did not start")
+
+
+def _seed(port: int, notes: int) -> dict:
+    conn   = http.client.HTTPConnection(HOST, port)
+    name   = f"bench{time.time_ns()}"
+    _, res = _call(conn, "POST", "/api/auth/signup",
+                   body={"username": name, "email": f"{name}@example.com", "password": "benchmark"})
+    token  = res["token"]
+    _, res = _call(conn, "POST", "/api/subjects", token, {"name": "Physics"})
+    sid    = res["subject"]["id"]
+    _, res = _call(conn, "POST", "/api/chapters", token, {"name": "Mechanics", "subject_id": sid})
+    cid    = res["chapter"]["id"]
+
+    rng, ids = random.Random(3), []
+    for i in range(notes):
+        _, res = _call(conn, "POST", "/api/notes", token, {
+            "subject_id": sid, "chapter_id": cid, "title": f"Lecture {i}",
+            "content": text_note(rng, rng.randint(1, 6)), "tags": "exam",
+        })
+        ids.append(res["note"]["id"])
+    return {"token": token, "subject": sid, "chapter": cid, "notes": ids}
+
+
+def _client(port: int, data: dict, threads: int, seconds: float, out):
+    """One load-generator process: `threads` keep-alive connections."""
+    deadline  = time.time() + seconds
+    latencies = []
+    errors    = [0]
+    lock      = threading.Lock()
+
+    def loop(seed):
+        rng  = random.Random(seed)
+        conn = http.client.HTTPConnection(HOST, port, timeout=30)
+        mine = []
+        while time.time() < deadline:
+            roll = rng.random()
+            if roll < 0.6:
+                req = ("GET", f"/api/notes/{rng.choice(data['notes'])}", None)
+            elif roll < 0.8:
+                req = ("GET", f"/api/notes?chapter_id={data['chapter']}", None)
+            elif roll < 0.9:
+                req = ("GET", f"/api/subjects/{data['subject']}", None)
+            else:
+                req = ("PUT", f"/api/notes/{rng.choice(data['notes'])}", {"title": f"Edit {rng.random()}"})
+            start = time.perf_counter()
+            try:
+                status, _ = _call(conn, req[0], req[1], data["token"], req[2])
+            except (OSError, http.client.HTTPException):
+                status = 0
+                conn   = http.client.HTTPConnection(HOST, port, timeout=30)
+            if status == 200:
+                mine.append(time.perf_counter() - start)
+            else:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(mine)
+
+    pool = [threading.Thread(target=loop, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    out.put((latencies, errors[0]))
+
+
+def _hold_streams(port: int, token: str, count: int) -> list:
+    """Open `count` idle SSE connections; returns them so they stay open."""
+    streams = []
+
+    def open_one():
+        conn = http.client.HTTPConnection(HOST, port, timeout=60)
+        conn.request("GET", f"/api/events?token={token}")
+        streams.append(conn)
+        try:
+            conn.getresponse()
+        except (OSError, http.client.HTTPException):
+            pass
+
+    for _ in range(count):
+        threading.Thread(target=open_one, daemon=True).start()
+    time.sleep(1)
+    return streams
+
+
+def _load(port: int, data: dict, concurrency: int, seconds: float) -> dict:
+    procs   = max(1, min(4, multiprocessing.cpu_count()))
+    out     = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=_client, args=(port, data, max(1, concurrency // procs), seconds, out))
+        for _ in range(procs)
+    ]
+    for w in workers:
+        w.start()
+    latencies, errors = [], 0
+    for _ in workers:
+        lat, err = out.get()
+        latencies.extend(lat)
+        errors += err
+    for w in workers:
+        w.join()
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000 if latencies else float("nan")
+    return {"rps": len(latencies) / seconds, "p50": pick(0.50), "p95": pick(0.95), "errors": errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--modes", nargs="+", default=["sync", "threaded", "gevent"])
+    parser.add_argument("--workers", type=int, default=0, help="default: serve.py's per-mode default")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--streams", type=int, default=20, help="idle /api/events streams in the 2nd run")
+    parser.add_argument("--notes", type=int, default=200)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("STORAGE_BACKEND", "sqlite")
+    tmp = tempfile.mkdtemp()
+    env.setdefault("MEDIA_DIR", os.path.join(tmp, "media"))
+
+    rows = []
+    for i, mode in enumerate(args.modes):
+        port = 5600 + i
+        env["SQLITE_PATH"] = os.path.join(tmp, f"{mode}.db")
+        proc = _start(mode, port, args.workers, env)
+        try:
+            data    = _seed(port, args.notes)
+            plain   = _load(port, data, args.concurrency, args.seconds)
+            streams = _hold_streams(port, data["token"], args.streams)
+            held    = _load(port, data, args.concurrency, args.seconds)
+            for conn in streams:
+                conn.close()
+        finally:
+            proc.terminate()
+            proc.wait(30)
+        rows.append((mode, plain, held))
+
+    print(f"\n{args.concurrency} concurrent clients, {args.seconds:.0f} s per run, "
+          f"backend={env['STORAGE_BACKEND']}, {multiprocessing.cpu_count()} CPU(s)")
+    print(f"{'mode':<10}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'err':>6}   "
+          f"+{args.streams} SSE:{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'err':>6}")
+    for mode, a, b in rows:
+        print(f"{mode:<10}{a['rps']:9.0f}{a['p50']:9.1f}{a['p95']:9.1f}{a['errors']:6d}   "
+              f"{'':>9}{b['rps']:8.0f}{b['p50']:9.1f}{b['p95']:9.1f}{b['errors']:6d}")
+
+
+if __name__ == "__main__":
+    main()
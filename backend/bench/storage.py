@@ -0,0 +1,130 @@
+"""
+bench/storage.py — Per-request latency of the Mongo vs. SQLite backends
+
+Loads the same synthetic library into each backend, then times the
+requests the frontend makes most through the Flask test client (so
+routing, auth and serialization are included) and prints p50 / p95.
+
+    python -m bench.storage                  # SQLite only
+    python -m bench.storage --mongo          # + MongoDB at MONGO_URI
+    python -m bench.storage --notes 20000
+
+MongoDB results depend heavily on where the server runs (local vs. Atlas);
+run both on the same machine for a fair comparison.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+os.environ.setdefault("MEDIA_DIR", os.path.join(tempfile.mkdtemp(), "media"))
+
+from bson import ObjectId
+from models.note import new_subject_doc, new_chapter_doc, new_note_doc
+from bench.fixtures import library
+
+
+def _seed(app, notes: int) -> tuple:
+    """Sign up a fresh user and load the library; returns (headers, ids)."""
+    client = app.test_client()
+    email  = f"bench-{ObjectId()}@example.com"
+    res    = client.post("/api/auth/signup", json={
+        "name": "Bench", "username": email.split("@")[0], "email": email, "password": "benchmark",
+    })
+    body    = res.get_json()
+    headers = {"Authorization": f"Bearer {body['token']}"}
+    user_id = body["user"]["id"]
+
+    repo     = app.repo
+    subjects = {}
+    chapters = {}
+    note_ids = []
+    for subj_no, ch_no, title, content, tags in library(random.Random(7), notes):
+        if subj_no not in subjects:
+            doc = new_subject_doc(user_id, f"Subject {subj_no}", "#6C63FF", "📚")
+            doc["seq"] = repo.next_seq(ObjectId(user_id))
+            subjects[subj_no] = repo.insert_subject(doc)
+        key = (subj_no, ch_no)
+        if key not in chapters:
+            doc = new_chapter_doc(user_id, str(subjects[subj_no]), f"Chapter {ch_no}", "📖")
+            doc["seq"] = repo.next_seq(ObjectId(user_id))
+            chapters[key] = repo.insert_chapter(doc)
+        doc = new_note_doc(user_id, str(subjects[subj_no]), str(chapters[key]), title, content, tags)
+        doc["seq"] = repo.next_seq(ObjectId(user_id))
+        note_ids.append(repo.insert_note(doc))
+
+    return headers, {
+        "subject": str(subjects[0]),
+        "chapter": str(chapters[(0, 0)]),
+        "notes":   [str(n) for n in note_ids],
+    }
+
+
+def _requests(ids: dict, rng: random.Random) -> dict:
+    """name → callable(client, headers) making one request."""
+    def note():
+        return rng.choice(ids["notes"])
+
+    return {
+        "GET subjects":        lambda c, h: c.get("/api/subjects", headers=h),
+        "GET subject":         lambda c, h: c.get(f"/api/subjects/{ids['subject']}", headers=h),
+        "GET notes?chapter":   lambda c, h: c.get(f"/api/notes?chapter_id={ids['chapter']}", headers=h),
+        "GET note":            lambda c, h: c.get(f"/api/notes/{note()}", headers=h),
+        "PUT note":            lambda c, h: c.put(f"/api/notes/{note()}", headers=h,
+                                                  json={"title": f"Edited {rng.random():.6f}"}),
+        "GET search":          lambda c, h: c.get("/api/notes/search?q=momentum+theorem", headers=h),
+        "GET dashboard/stats": lambda c, h: c.get("/api/dashboard/stats", headers=h),
+        "GET sync (full)":     lambda c, h: c.get("/api/sync?limit=500", headers=h),
+    }
+
+
+def run(backend: str, notes: int, repeat: int) -> dict:
+    os.environ["STORAGE_BACKEND"] = backend
+    from app import create_app
+    app = create_app()
+
+    start = time.perf_counter()
+    headers, ids = _seed(app, notes)
+    print(f"\n{backend}: loaded {notes:,} notes in {time.perf_counter() - start:.1f} s")
+
+    client  = app.test_client()
+    results = {}
+    for name, call in _requests(ids, random.Random(1)).items():
+        call(client, headers)                              # warm up
+        samples = []
+        for _ in range(repeat if "stats" not in name and "sync" not in name else max(repeat // 10, 5)):
+            t0  = time.perf_counter()
+            res = call(client, headers)
+            samples.append((time.perf_counter() - t0) * 1000)
+            assert res.status_code == 200, (name, res.status_code, res.get_data(as_text=True)[:200])
+        samples.sort()
+        results[name] = (statistics.median(samples), samples[int(len(samples) * 0.95) - 1])
+        print(f"  {name:<20} p50={results[name][0]:8.2f} ms   p95={results[name][1]:8.2f} ms")
+
+    app.repo.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--notes",  type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--mongo",  action="store_true", help="also benchmark MongoDB at MONGO_URI")
+    args = parser.parse_args()
+
+    backends = ["sqlite"] + (["mongo"] if args.mongo else [])
+    results  = {b: run(b, args.notes, args.repeat) for b in backends}
+
+    if len(results) == 2:
+        print("\np50 speed-up of sqlite over mongo")
+        for name, (p50, _) in results["sqlite"].items():
+            print(f"  {name:<20} ×{results['mongo'][name][0] / p50:6.2f}")
+
+
+if __name__ == "__main__":
+    main()
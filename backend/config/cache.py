@@ -0,0 +1,104 @@
+"""
+config/cache.py — Shared response cache tier (Redis, or in-memory)
+
+CACHE_URL selects the backend:
+  (empty)      → caching off
+  redis://...  → any Redis-protocol server (Redis, Valkey, KeyDB, Upstash);
+                 shared by every worker and every Vercel instance
+  memory://    → a dict in this process; only correct with a single worker
+                 (tests, local dev), since writes elsewhere can't bump it
+
+Entries are keyed by a per-user generation number which every write bumps
+(see middleware/cache.py), so stale entries are never read again and just
+age out after CACHE_TTL seconds.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# Global cache used across the app
+cache = None
+
+
+class MemoryCache:
+    name = "memory"
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._data       = OrderedDict()
+        self._lock       = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: int = 0):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl if ttl else 0, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            _, value = self._data.get(key, (0, b"0"))
+            value = str(int(value) + 1).encode()
+            self._data[key] = (0, value)
+            return int(value)
+
+
+class RedisCache:
+    name = "redis"
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_URL is a redis:// URL but the `redis` package is not installed")
+        self.client = redis.Redis.from_url(url, socket_timeout=0.25, socket_connect_timeout=0.5)
+
+    def get(self, key: str):
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: int = 0):
+        self.client.set(key, value, ex=ttl or None)
+
+    def incr(self, key: str) -> int:
+        return self.client.incr(key)
+
+
+def generation_key(user_id: str) -> str:
+    """Where a user's generation number lives; bumping it retires their cached responses."""
+    return f"nv:gen:{user_id}"
+
+
+def make_cache(url: str):
+    if not url:
+        return None
+    if url.startswith("memory:"):
+        return MemoryCache()
+    if url.startswith(("redis:", "rediss:", "unix:")):
+        return RedisCache(url)
+    raise ValueError(f"Unknown CACHE_URL scheme: {url}")
+
+
+def init_cache(app):
+    """Create the cache configured by CACHE_URL (no URL → caching off)."""
+    global cache
+    cache = make_cache(app.config.get("CACHE_URL", ""))
+    if cache is not None:
+        print(f"✅  Response cache → {cache.name}")
+
+
+def get_cache():
+    """Return the active cache, or None when caching is off."""
+    return cache
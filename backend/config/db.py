@@ -18,7 +18,12 @@ def init_db(app):
     uri = app.config.get("MONGO_URI", "mongodb://localhost:27017/notvault")
 
     try:
-        mongo_client = MongoClient(uri, serverSelectionTimeoutMS=5000)
+        mongo_client = MongoClient(
+            uri,
+            serverSelectionTimeoutMS=5000,
+            # Per process — serve.py sizes it to the worker's concurrency
+            maxPoolSize=app.config.get("MONGO_MAX_POOL_SIZE", 100),
+        )
         # Verify connection
         mongo_client.admin.command("ping")
         db_name = uri.split("/")[-1].split("?")[0] or "notvault"
@@ -46,18 +51,42 @@ def _create_indexes():
     db.chapters.create_index([("subject_id", ASCENDING), ("name", ASCENDING)], unique=True)
 
     # Notes — text index for full-text search
-    db.notes.create_index([("chapter_id", ASCENDING)])
+    # `modified` was a display string; (chapter_id, updated_at) covers chapter_id
+    for old in ("modified_-1", "chapter_id_1"):
+        if old in db.notes.index_information():
+            db.notes.drop_index(old)
+    db.notes.create_index([("chapter_id", ASCENDING), ("updated_at", DESCENDING)])
+    db.notes.create_index([("subject_id", ASCENDING)])
     db.notes.create_index([("user_id", ASCENDING)])
-    db.notes.create_index([("modified", DESCENDING)])
+    db.notes.create_index([("user_id", ASCENDING), ("tags", ASCENDING)])    # multikey
+    db.notes.create_index([("user_id", ASCENDING), ("updated_at", DESCENDING)])
+    db.notes.create_index([("user_id", ASCENDING), ("lsh", ASCENDING)])     # near-duplicate LSH keys
+
+    # Compressed notes are searchable through `content_text` (content
+    # itself is then a binary). Every text query is scoped to one user, so
+    # the index is prefixed with user_id and only that user's keys are read.
+    for old in ("notes_text_search", "notes_text_search_v2"):
+        if old in db.notes.index_information():
+            db.notes.drop_index(old)
     db.notes.create_index([
+        ("user_id", ASCENDING),
         ("title", TEXT),
         ("content", TEXT),
+        ("content_text", TEXT),
         ("tags", TEXT)
-    ], name="notes_text_search")
+    ], name="notes_text_search_v3")
+
+    # Tag counts — one document per (user, tag), kept current on note writes
+    db.tag_counts.create_index([("user_id", ASCENDING), ("tag", ASCENDING)], unique=True)
+    db.tag_counts.create_index([("user_id", ASCENDING), ("count", DESCENDING)])
 
     # Activity
     db.activity.create_index([("user_id", ASCENDING), ("date", ASCENDING)], unique=True)
 
+    # Delta sync — changes and tombstones are read by (user, seq)
+    for coll in ("subjects", "chapters", "notes", "tombstones"):
+        db[coll].create_index([("user_id", ASCENDING), ("seq", ASCENDING)])
+
     print("✅  MongoDB indexes created")
 
 
@@ -0,0 +1,85 @@
+"""
+config/deadline.py — The time budget of the current request
+
+    with deadline.budget(2.0):
+        repo.search_notes(...)          # every query inside gets what is left
+
+budget() opens a pymongo.timeout() block, so each MongoDB command issued
+inside it is sent with maxTimeMS set to the time remaining (server
+selection and connection checkout wait no longer than that either), and
+records the same deadline for the SQLite backend, whose progress handler
+interrupts a statement once it has passed. Budgets nest: an inner one
+never outlasts the outer one.
+
+When the budget runs out the query raises — a PyMongoError whose
+`timeout` is true, or sqlite3.OperationalError("interrupted");
+is_timeout() recognises both. middleware/deadline.py turns them into 504.
+"""
+
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+import pymongo
+from pymongo.errors import PyMongoError
+
+_deadline = ContextVar("deadline", default=None)      # time.monotonic() value, or None
+
+# A nested budget is never opened with less than this (pymongo treats 0 as "no limit")
+MIN_BUDGET = 0.001
+
+
+@contextmanager
+def budget(seconds: float):
+    """Run the block with at most `seconds` left (and no more than any outer budget)."""
+    seconds = max(MIN_BUDGET, seconds)
+    outer   = _deadline.get()
+    ends    = time.monotonic() + seconds
+    token   = _deadline.set(ends if outer is None else min(outer, ends))
+    try:
+        with pymongo.timeout(seconds):
+            yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left in the current budget; None outside of one."""
+    ends = _deadline.get()
+    return None if ends is None else ends - time.monotonic()
+
+
+def expired() -> bool:
+    ends = _deadline.get()
+    return ends is not None and time.monotonic() >= ends
+
+
+def optional(section: str, compute, skipped: list, allowed, reserve: float = 0, fallback=None):
+    """
+    compute() for a part of a response that may be left out. If `section`
+    is in `allowed`, it runs keeping `reserve` seconds of the budget for
+    what follows; when that is too short to start it, or runs out while
+    it runs, `section` is appended to `skipped` and `fallback` returned.
+    Otherwise it is an ordinary part of the response.
+    """
+    left = remaining()
+    if left is None or section not in allowed:
+        return compute()
+    if left <= reserve + MIN_BUDGET:
+        skipped.append(section)
+        return fallback
+    try:
+        with budget(left - reserve):
+            return compute()
+    except Exception as e:
+        if not is_timeout(e):
+            raise
+        skipped.append(section)
+        return fallback
+
+
+def is_timeout(exc: BaseException) -> bool:
+    """True if `exc` is a query stopped by its budget (MongoDB or SQLite)."""
+    if isinstance(exc, PyMongoError):
+        return exc.timeout
+    return isinstance(exc, sqlite3.OperationalError) and "interrupted" in str(exc)
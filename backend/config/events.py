@@ -0,0 +1,164 @@
+"""
+config/events.py — Per-user change notifications for GET /api/events
+
+One ChangeHub per process fans compact change notifications out to the
+SSE streams open on that process. It is fed by either:
+  • a single MongoDB change stream (replica sets / Atlas) — sees writes
+    from every worker, started on the first subscription, or
+  • the write routes themselves via `publish_change` (in-process pub/sub)
+    when change streams aren't available.
+An open stream costs one small queue, not a database cursor.
+"""
+
+import threading
+import time
+import queue
+from collections import defaultdict
+from pymongo.errors import PyMongoError
+
+# Global hub used across the app
+hub = None
+
+_KINDS = {"subjects": "subject", "chapters": "chapter", "notes": "note"}
+
+# Changes a slow stream may fall behind by before it's told to resync
+QUEUE_SIZE = 256
+
+
+class ChangeHub:
+    def __init__(self, db, backend: str = "auto"):
+        self.db       = db
+        self.backend  = backend          # auto | changestream | local
+        self._subs    = defaultdict(set)
+        self._lock    = threading.Lock()
+        self._watcher = None
+        self.watching = False
+        self.closed   = False
+
+    # ── Subscriptions ─────────────────────────────────────────────────────────
+
+    def subscribe(self, user_id: str) -> queue.Queue:
+        q = queue.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self._subs[user_id].add(q)
+        self._ensure_watcher()
+        return q
+
+    def unsubscribe(self, user_id: str, q: queue.Queue):
+        with self._lock:
+            subs = self._subs.get(user_id)
+            if subs:
+                subs.discard(q)
+                if not subs:
+                    del self._subs[user_id]
+
+    def connections(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subs.values())
+
+    def dispatch(self, user_id: str, event: dict):
+        with self._lock:
+            subs = list(self._subs.get(user_id, ()))
+        for q in subs:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # Too far behind — drop the backlog and ask for a resync
+                with q.mutex:
+                    q.queue.clear()
+                q.put_nowait({"reset": True})
+
+    def close(self):
+        """Wake every open stream so it can end (used on shutdown)."""
+        self.closed = True
+        with self._lock:
+            subs = [q for s in self._subs.values() for q in s]
+        for q in subs:
+            try:
+                q.put_nowait(None)
+            except queue.Full:
+                pass
+
+    # ── Change stream ─────────────────────────────────────────────────────────
+
+    def _ensure_watcher(self):
+        if self.backend == "local" or self._watcher is not None:
+            return
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, name="change-stream", daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        pipeline = [
+            {"$match": {
+                "ns.coll":       {"$in": ["subjects", "chapters", "notes", "tombstones"]},
+                "operationType": {"$in": ["insert", "update", "replace"]},
+            }},
+            {"$project": {
+                "ns.coll": 1, "operationType": 1, "documentKey": 1,
+                "fullDocument.user_id": 1, "fullDocument.seq": 1,
+                "fullDocument.kind": 1, "fullDocument.ref_id": 1,
+            }},
+        ]
+        resume = None
+        while not self.closed:
+            try:
+                with self.db.watch(pipeline, full_document="updateLookup",
+                                   resume_after=resume) as stream:
+                    self.watching = True
+                    for change in stream:
+                        resume = stream.resume_token
+                        self._dispatch_change(change)
+            except PyMongoError as e:
+                if not self.watching and self.backend == "auto":
+                    # Standalone server — routes publish in-process instead
+                    print(f"ℹ️  Change streams unavailable ({e}); using in-process events")
+                    self.backend = "local"
+                    return
+                self.watching = False
+                time.sleep(1)
+
+    def _dispatch_change(self, change: dict):
+        doc = change.get("fullDocument") or {}
+        if "user_id" not in doc or "seq" not in doc:
+            return
+        coll = change["ns"]["coll"]
+        if coll == "tombstones":
+            if change["operationType"] != "insert":
+                return
+            event = make_event(doc["kind"], doc["ref_id"], doc["seq"], "delete")
+        else:
+            event = make_event(_KINDS[coll], change["documentKey"]["_id"], doc["seq"], "upsert")
+        self.dispatch(str(doc["user_id"]), event)
+
+
+def make_event(kind: str, ref_id, seq: int, op: str) -> dict:
+    return {"kind": kind, "id": str(ref_id), "version": seq, "op": op}
+
+
+def init_events(app):
+    """
+    Create the process-wide change hub (EVENTS_BACKEND=auto|changestream|local).
+    Change streams need MongoDB, so other storage backends publish locally.
+    """
+    global hub
+    from config.db import get_db
+    if app.config.get("STORAGE_BACKEND", "mongo") == "mongo":
+        hub = ChangeHub(get_db(), app.config.get("EVENTS_BACKEND", "auto"))
+    else:
+        hub = ChangeHub(None, "local")
+
+
+def get_hub():
+    """Return the active change hub."""
+    return hub
+
+
+def publish_change(user_id: str, kind: str, ref_id, seq: int, op: str = "upsert"):
+    """Notify this process's streams of a write, unless a change stream is
+    already delivering it."""
+    if hub is None or hub.watching:
+        return
+    hub.dispatch(user_id, make_event(kind, ref_id, seq, op))
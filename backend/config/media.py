@@ -0,0 +1,123 @@
+"""
+config/media.py — Content-addressed media store (GridFS or local disk)
+
+Blobs are keyed by the SHA-256 of their bytes, so the same image pasted
+into ten notes is stored once. Only MEDIA_TYPES are accepted (see
+models/media.py).
+"""
+
+import os
+import tempfile
+import gridfs
+from pymongo.errors import DuplicateKeyError
+from models.media import is_media_type
+
+# Global store used across the app
+media_store = None
+
+
+def _check_type(mimetype: str):
+    if not is_media_type(mimetype):
+        raise ValueError(f"Not an allowed media type: {mimetype}")
+
+
+class GridFSMediaStore:
+    """Blobs in the `media` GridFS bucket, with the digest as file _id."""
+
+    def __init__(self, db):
+        self.db     = db
+        self.bucket = gridfs.GridFSBucket(db, bucket_name="media")
+
+    def exists(self, digest: str) -> bool:
+        return self.db["media.files"].find_one({"_id": digest}, {"_id": 1}) is not None
+
+    def put(self, digest: str, data: bytes, mimetype: str):
+        _check_type(mimetype)
+        if self.exists(digest):
+            return
+        try:
+            self.bucket.upload_from_stream_with_id(
+                digest, digest, data, metadata={"contentType": mimetype}
+            )
+        except (DuplicateKeyError, gridfs.errors.FileExists):
+            pass    # another request stored the same bytes first
+
+    def open(self, digest: str):
+        """Return (file, length, mimetype), or None if unknown."""
+        try:
+            out = self.bucket.open_download_stream(digest)
+        except gridfs.errors.NoFile:
+            return None
+        mimetype = (out.metadata or {}).get("contentType", "application/octet-stream")
+        return out, out.length, mimetype
+
+
+class LocalMediaStore:
+    """Blobs under `root/<aa>/<digest>`, with the mimetype in a sidecar file."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self._path(digest))
+
+    def put(self, digest: str, data: bytes, mimetype: str):
+        _check_type(mimetype)
+        path = self._path(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".type", "w") as f:
+            f.write(mimetype)
+        # Write-then-rename so readers never see a partial blob
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def open(self, digest: str):
+        path = self._path(digest)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path + ".type") as f:
+                mimetype = f.read().strip()
+        except OSError:
+            mimetype = "application/octet-stream"
+        return open(path, "rb"), os.path.getsize(path), mimetype
+
+
+def make_media_store(kind: str, db=None, root: str = "media"):
+    if kind == "local":
+        return LocalMediaStore(root)
+    if kind == "gridfs":
+        return GridFSMediaStore(db)
+    raise ValueError(f"Unknown MEDIA_STORE: {kind}")
+
+
+def init_media(app):
+    """
+    Create the media store configured by MEDIA_STORE / MEDIA_DIR.
+    Without MongoDB (STORAGE_BACKEND=sqlite) media always goes to disk.
+    """
+    global media_store
+    from config.db import get_db
+
+    kind = app.config.get("MEDIA_STORE", "gridfs")
+    if app.config.get("STORAGE_BACKEND", "mongo") != "mongo":
+        kind = "local"
+
+    media_store = make_media_store(
+        kind,
+        db=get_db(),
+        root=app.config.get("MEDIA_DIR", "media"),
+    )
+
+
+def get_media_store():
+    """Return the active media store."""
+    return media_store
@@ -0,0 +1,56 @@
+"""
+config/metrics.py — Process-local counters reported by GET /api/metrics
+
+Each worker process keeps its own counts; scrape every worker (or sum
+across them) for a deployment-wide view. They describe the deployment
+(pid, limits, breaker state), so the endpoint needs the operator token:
+
+    curl -H "Authorization: Bearer $METRICS_TOKEN" .../api/metrics
+
+Without METRICS_TOKEN it answers 404, unless METRICS_PUBLIC=1 (only
+behind a network that keeps it internal).
+"""
+
+import hmac
+import os
+import threading
+from collections import Counter
+
+_counters = Counter()
+_gauges   = {}                 # name → callable returning a JSON-able value
+_lock     = threading.Lock()
+
+
+def incr(name: str, n: int = 1):
+    with _lock:
+        _counters[name] += n
+
+
+def gauge(name: str, read):
+    """Report `read()` under `name` in every snapshot."""
+    _gauges[name] = read
+
+
+def authorized(headers, token: str) -> bool:
+    """True if `headers` carry `Authorization: Bearer <token>` (never for an empty token)."""
+    sent = headers.get("Authorization", "")
+    return bool(token) and hmac.compare_digest(sent.encode(), f"Bearer {token}".encode())
+
+
+def snapshot() -> dict:
+    """Current counters plus derived ratios."""
+    with _lock:
+        counts = dict(_counters)
+
+    hits, misses = counts.get("cache.hits", 0), counts.get("cache.misses", 0)
+    lookups      = hits + misses
+    return {
+        "pid":      os.getpid(),
+        "counters": counts,
+        "cache": {
+            "hits":      hits,
+            "misses":    misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+        },
+        **{name: read() for name, read in _gauges.items()},
+    }
@@ -0,0 +1,207 @@
+"""
+config/related.py — Per-user TF-IDF index behind GET /api/notes/<id>/related
+
+Each note becomes a hashed bag of words (title and tags count double) in a
+2^18-column sparse matrix, so no vocabulary has to be kept or shared
+between workers. Rows are stored as raw term weights (1 + log tf); the
+IDF-weighted, L2-normalised CSR matrix is rebuilt from them in a few
+vectorised NumPy operations whenever something changed, and a lookup is
+one sparse matrix × dense vector product plus an argpartition for the top k.
+
+The index follows the delta-sync feed: before answering, it asks the
+repository for changes with seq above its cursor, so only created /
+edited notes are re-tokenised and tombstones drop rows. Each
+worker process keeps its own indexes for the RELATED_MAX_USERS most
+recently used users.
+
+numpy and scipy are needed only here; without them the endpoint answers
+503 and the rest of the API is unaffected.
+"""
+
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from bson import ObjectId
+from config import metrics
+from models.note import note_text
+from models.sync import resume_point
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:          # optional — GET /related is unavailable without them
+    np = sparse = None
+
+# Global index used across the app
+index = None
+
+N_FEATURES = 1 << 18
+SYNC_PAGE  = 1000
+
+_TOKEN_RX = re.compile(r"[^\W_]{3,}")
+_STOP = frozenset(
+    "the and for are but not you all any can had her was one our out has have this that with "
+    "from they will would there their what about which when your said each into than then them "
+    "these some also more such only other been were its over very just".split()
+)
+
+
+def _features(title: str, text: str, tags) -> tuple:
+    """(sorted column indices, 1 + log tf weights) for one note."""
+    counts = {}
+    for weight, source in ((2, title or ""), (1, text or "")):
+        for token in _TOKEN_RX.findall(source.lower()):
+            if token not in _STOP:
+                col = zlib.crc32(token.encode()) & (N_FEATURES - 1)
+                counts[col] = counts.get(col, 0) + weight
+    for tag in tags or []:
+        col = zlib.crc32(b"#" + tag.encode()) & (N_FEATURES - 1)
+        counts[col] = counts.get(col, 0) + 2
+    if not counts:
+        return np.empty(0, np.int32), np.empty(0, np.float32)
+    cols = np.fromiter(counts, np.int32, len(counts))
+    tf   = np.fromiter(counts.values(), np.float32, len(counts))
+    order = np.argsort(cols)
+    return cols[order], 1 + np.log(tf[order])
+
+
+class _UserIndex:
+    def __init__(self):
+        self.lock   = threading.Lock()
+        self.rows   = {}                          # note id (str) → (cols, tf)
+        self.seqs   = {}                          # note id (str) → seq of the version in rows
+        self.df     = np.zeros(N_FEATURES, np.int32)
+        self.seq    = 0
+        self.ids    = []                          # row order of `matrix`
+        self.pos    = {}
+        self.matrix = None                        # None = rebuild before use
+
+    def put(self, note_id: str, features: tuple, seq: int = 0):
+        self.drop(note_id)
+        self.rows[note_id] = features
+        self.seqs[note_id] = seq
+        self.df[features[0]] += 1
+        self.matrix = None
+
+    def drop(self, note_id: str):
+        old = self.rows.pop(note_id, None)
+        self.seqs.pop(note_id, None)
+        if old is not None:
+            self.df[old[0]] -= 1
+            self.matrix = None
+
+    def build(self):
+        """IDF-weight and L2-normalise every row into one CSR matrix."""
+        self.ids = list(self.rows)
+        self.pos = {nid: i for i, nid in enumerate(self.ids)}
+        n = len(self.ids)
+        lengths = np.fromiter((len(c) for c, _ in self.rows.values()), np.int64, n)
+        indptr  = np.zeros(n + 1, np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        if n:
+            cols = np.concatenate([c for c, _ in self.rows.values()])
+            data = np.concatenate([w for _, w in self.rows.values()])
+        else:
+            cols, data = np.empty(0, np.int32), np.empty(0, np.float32)
+        idf   = np.log((1 + n) / (1 + self.df.astype(np.float32))) + 1
+        data  = data * idf[cols]
+        owner = np.repeat(np.arange(n), lengths)
+        norms = np.sqrt(np.bincount(owner, weights=data * data, minlength=n))
+        norms[norms == 0] = 1
+        data /= norms[owner]
+        self.matrix = sparse.csr_matrix((data.astype(np.float32), cols, indptr), shape=(n, N_FEATURES))
+
+    def top(self, note_id: str, k: int) -> list:
+        """[(note id, cosine similarity)] of the k most similar other notes."""
+        if self.matrix is None:
+            self.build()
+        row = self.pos.get(note_id)
+        if row is None:
+            return []
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        query = np.zeros(N_FEATURES, np.float32)          # dense: a 2^18 gather beats sparse × sparse
+        query[self.matrix.indices[start:end]] = self.matrix.data[start:end]
+        scores = self.matrix @ query
+        scores[row] = 0
+        k = min(k, len(scores) - 1)
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(self.ids[i], float(scores[i])) for i in best if scores[i] > 0]
+
+
+class RelatedIndex:
+    def __init__(self, repo, max_users: int = 32):
+        self.repo      = repo
+        self.max_users = max_users
+        self._users    = OrderedDict()
+        self._lock     = threading.Lock()
+        self.build_ms  = 0.0
+
+    def _user(self, user_id: str) -> _UserIndex:
+        with self._lock:
+            idx = self._users.get(user_id)
+            if idx is None:
+                idx = self._users[user_id] = _UserIndex()
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            self._users.move_to_end(user_id)
+            return idx
+
+    def _catch_up(self, user_id: str, idx: _UserIndex):
+        """
+        Apply every change after idx.seq from the delta-sync feed. Like a
+        sync client's cursor, idx.seq stays below writes still in flight
+        (models/sync.py), so changes after it are applied again next time.
+        """
+        while True:
+            changes = self.repo.changes_since(ObjectId(user_id), idx.seq, SYNC_PAGE)
+            page    = changes[:SYNC_PAGE]
+            for seq, coll, doc in page:
+                if coll == "notes" and idx.seqs.get(str(doc["_id"])) != seq:      # not a repeat
+                    features = _features(doc.get("title"), note_text(doc), doc.get("tags"))
+                    idx.put(str(doc["_id"]), features, seq)
+                elif coll == "tombstones" and doc.get("kind") == "note":
+                    idx.drop(str(doc["ref_id"]))
+            last    = resume_point(self.repo, user_id, idx.seq, [seq for seq, _, _ in page])
+            capped  = page and last < page[-1][0]
+            idx.seq = last
+            if capped or len(changes) <= SYNC_PAGE:
+                return
+
+    def related(self, user_id: str, note_id: str, k: int) -> list:
+        idx = self._user(user_id)
+        with idx.lock:
+            self._catch_up(user_id, idx)
+            if idx.matrix is None:
+                start = time.perf_counter()
+                idx.build()
+                self.build_ms = (time.perf_counter() - start) * 1000
+                metrics.incr("related.rebuild")
+            return idx.top(note_id, k)
+
+    def state(self) -> dict:
+        with self._lock:
+            users = list(self._users.values())
+        return {
+            "users":         len(users),
+            "notes":         sum(len(u.rows) for u in users),
+            "last_build_ms": round(self.build_ms, 1),
+        }
+
+
+def init_related(app):
+    """Create this process's RelatedIndex (after init_storage)."""
+    global index
+    if np is None:
+        print("ℹ️  numpy / scipy not installed — GET /api/notes/<id>/related is disabled")
+        return
+    index = RelatedIndex(app.repo, app.config.get("RELATED_MAX_USERS", 32))
+    metrics.gauge("related", index.state)
+
+
+def get_related():
+    return index
@@ -0,0 +1,232 @@
+"""
+maintenance — Resumable batch jobs over whole collections (run with manage.py)
+
+A job walks one or more collections in `_id` order. Each collection is
+cut into --partitions `_id` ranges, with boundaries taken from a $sample
+so the ranges hold about the same number of documents. The ranges run on
+a pool of --workers processes, and every worker has its own MongoClient.
+
+After every batch, a partition's position (the last `_id` done) and its
+tallies are saved to the `maintenance` collection. A run that stops
+early (Ctrl-C, a crash, a deploy) picks up where it left off the next
+time the same job is started. Once a run has finished, the next one
+starts from scratch; --restart does that straight away.
+
+--rate caps the documents processed per second across all workers, so a
+live database stays responsive. Each worker gets an equal share.
+
+Jobs that change what the app serves call invalidate() with the users
+they touched, after each batch that changed something, so responses
+cached under CACHE_URL (see middleware/cache.py) aren't served stale
+until CACHE_TTL runs out. Only a shared (Redis) cache can be reached
+from here; memory:// lives inside an app process.
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config.cache import make_cache, generation_key
+from migrations import connect
+from models.note import utcnow
+
+JOBS = {}
+
+SAMPLES_PER_PARTITION = 32
+
+
+class Job:
+    """
+    A maintenance job: `collections` are walked in `_id` order, batches
+    projected to `fields[collection]` go to `process`, which returns how
+    many documents it changed (or would change, with dry_run).
+    """
+
+    name        = ""
+    help        = ""
+    collections = ()
+    fields      = {}
+
+    def process(self, db, coll: str, docs: list, dry_run: bool) -> int:
+        raise NotImplementedError
+
+
+def register(cls):
+    JOBS[cls.name] = cls()
+    return cls
+
+
+class Throttle:
+    """Sleep as needed to stay under `rate` operations a second (0 = no limit)."""
+
+    def __init__(self, rate: float):
+        self.rate  = rate
+        self.start = time.monotonic()
+        self.done  = 0
+
+    def wait(self, n: int):
+        self.done += n
+        if self.rate > 0:
+            ahead = self.done / self.rate - (time.monotonic() - self.start)
+            if ahead > 0:
+                time.sleep(ahead)
+
+
+# ── Partitions and checkpoints ────────────────────────────────────────────────
+
+def partition(db, coll: str, n: int) -> list:
+    """`n` contiguous `_id` ranges [lo, hi) covering `coll`; None is an open end."""
+    if n <= 1:
+        return [(None, None)]
+    ids = sorted(d["_id"] for d in db[coll].aggregate([
+        {"$sample":  {"size": n * SAMPLES_PER_PARTITION}},
+        {"$project": {"_id": 1}},
+    ]))
+    bounds = sorted({ids[len(ids) * i // n] for i in range(1, n)}) if ids else []
+    edges  = [None, *bounds, None]
+    return list(zip(edges, edges[1:]))
+
+
+def plan(db, job: Job, partitions: int, restart: bool = False, dry_run: bool = False) -> list:
+    """The run's partitions: those of an unfinished earlier run, or a fresh set."""
+    saved = list(db.maintenance.find({"job": job.name}).sort("_id", 1))
+    if saved and not restart and not all(p["done"] for p in saved):
+        return saved
+
+    now   = utcnow()
+    parts = [
+        {
+            "_id":        f"{job.name}:{coll}:{i:03d}",
+            "job":        job.name,
+            "coll":       coll,
+            "lo":         lo,
+            "hi":         hi,
+            "last":       None,
+            "scanned":    0,
+            "changed":    0,
+            "done":       False,
+            "started_at": now,
+            "updated_at": now,
+        }
+        for coll in job.collections
+        for i, (lo, hi) in enumerate(partition(db, coll, partitions))
+    ]
+    if not dry_run:
+        db.maintenance.delete_many({"job": job.name})
+        db.maintenance.insert_many(parts)
+    return parts
+
+
+def status(db, name: str = None) -> list:
+    """Progress of the last run of each job (or just `name`)."""
+    match = {"job": name} if name else {}
+    return list(db.maintenance.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id":        "$job",
+            "partitions": {"$sum": 1},
+            "done":       {"$sum": {"$cond": ["$done", 1, 0]}},
+            "scanned":    {"$sum": "$scanned"},
+            "changed":    {"$sum": "$changed"},
+            "started_at": {"$min": "$started_at"},
+            "updated_at": {"$max": "$updated_at"},
+        }},
+        {"$sort": {"_id": 1}},
+    ]))
+
+
+# ── Workers ───────────────────────────────────────────────────────────────────
+
+_db    = None
+_cache = None
+
+
+def _init_worker():
+    global _db, _cache
+    _db = connect()                 # loads .env, so CACHE_URL is set by now
+    url = os.environ.get("CACHE_URL", "")
+    _cache = make_cache(url) if not url.startswith("memory:") else None
+
+
+def invalidate(user_ids):
+    """Bump the cache generation of each of `user_ids`, retiring their cached responses."""
+    if _cache is None:
+        return
+    for user_id in set(user_ids):
+        try:
+            _cache.incr(generation_key(str(user_id)))
+        except Exception as e:
+            # The data is right either way; their cached reads just live out CACHE_TTL
+            print(f"⚠️  cache generation bump failed for user {user_id}: {e}")
+
+
+def _run_partition(name: str, part: dict, batch: int, rate: float, dry_run: bool) -> tuple:
+    """Process one `_id` range from its checkpoint on; returns (id, scanned, changed)."""
+    job, coll = JOBS[name], part["coll"]
+    bounds = {}
+    if part["lo"] is not None:
+        bounds["$gte"] = part["lo"]
+    if part["hi"] is not None:
+        bounds["$lt"] = part["hi"]
+
+    throttle = Throttle(rate)
+    last     = part["last"]
+    scanned  = changed = 0
+    while True:
+        query = dict(bounds)
+        if last is not None:
+            query["$gt"] = last
+        docs = list(_db[coll].find({"_id": query} if query else {}, job.fields.get(coll))
+                              .sort("_id", 1).limit(batch))
+        if not docs:
+            break
+        n        = job.process(_db, coll, docs, dry_run)
+        last     = docs[-1]["_id"]
+        scanned += len(docs)
+        changed += n
+        if not dry_run:
+            _db.maintenance.update_one({"_id": part["_id"]}, {
+                "$set": {"last": last, "updated_at": utcnow()},
+                "$inc": {"scanned": len(docs), "changed": n},
+            })
+        throttle.wait(len(docs))
+
+    if not dry_run:
+        _db.maintenance.update_one({"_id": part["_id"]}, {"$set": {"done": True}})
+    return part["_id"], scanned, changed
+
+
+def run(name: str, workers: int = 4, partitions: int = 16, batch: int = 500, rate: float = 0,
+        dry_run: bool = False, restart: bool = False, echo=print) -> dict:
+    """Run (or resume) job `name`; returns totals for this invocation."""
+    job   = JOBS[name]
+    db    = connect()
+    parts = plan(db, job, partitions, restart, dry_run)
+    todo  = [p for p in parts if not p["done"]]
+    if any(p["scanned"] for p in parts):
+        echo(f"ℹ️  Resuming '{name}': {len(parts) - len(todo)}/{len(parts)} partitions already done")
+
+    workers = max(1, min(workers, len(todo)))
+    share   = rate / workers if rate else 0
+    totals  = {"partitions": len(todo), "scanned": 0, "changed": 0}
+    start   = time.perf_counter()
+
+    # Spawned, not forked: PyMongo clients are not fork-safe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker) as pool:
+        futures = [pool.submit(_run_partition, name, p, batch, share, dry_run) for p in todo]
+        try:
+            for i, future in enumerate(as_completed(futures), 1):
+                part_id, scanned, changed = future.result()
+                totals["scanned"] += scanned
+                totals["changed"] += changed
+                echo(f"   [{i}/{len(todo)}] {part_id}: {scanned:,} scanned, {changed:,} changed")
+        except BaseException:
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+
+    totals["seconds"] = time.perf_counter() - start
+    return totals
+
+
+from maintenance import jobs  # noqa: E402,F401  (registers the jobs)
@@ -0,0 +1,118 @@
+"""
+maintenance/jobs.py — The jobs manage.py can run
+
+  text      recompute notes' HTML-stripped text (`content_text`) and the
+            MinHash / LSH fields derived from it
+  counts    rebuild each user's tag counts from their notes
+  orphans   delete chapters whose subject is gone, notes whose chapter or
+            subject is gone (left by a cascade that stopped part way) and
+            activity of users that no longer exist
+
+Every job only writes documents that are actually off, so it is safe to
+re-run. A batch that changes something retires the cached responses of
+the users it touched (maintenance.invalidate).
+"""
+
+from pymongo import DeleteOne, UpdateOne
+from maintenance import Job, register, invalidate
+from models.dedup import dedup_fields
+from models.note import strip_html, unpack_content
+from models.sync import write_tombstones
+from storage.mongo import MongoRepository
+
+
+@register
+class RecomputeText(Job):
+    name        = "text"
+    help        = "Recompute notes' HTML-stripped text and MinHash / LSH fields"
+    collections = ("notes",)
+    fields      = {"notes": {"user_id": 1, "content": 1, "content_codec": 1, "content_text": 1,
+                             "minhash": 1, "lsh": 1}}
+
+    def process(self, db, coll, docs, dry_run):
+        ops, users = [], set()
+        for note in docs:
+            text   = strip_html(unpack_content(note))
+            fields = {"content_text": text if note.get("content_codec") else None, **dedup_fields(text)}
+            if any(note.get(k) != v for k, v in fields.items()):
+                ops.append(UpdateOne({"_id": note["_id"]}, {"$set": fields}))
+                users.add(note["user_id"])
+        if ops and not dry_run:
+            db.notes.bulk_write(ops, ordered=False)
+            invalidate(users)
+        return len(ops)
+
+
+@register
+class RebuildCounts(Job):
+    name        = "counts"
+    help        = "Rebuild each user's tag counts from their notes"
+    collections = ("users",)
+    fields      = {"users": {"_id": 1}}
+
+    def process(self, db, coll, docs, dry_run):
+        repo    = MongoRepository(db)
+        changed = []
+        for user in docs:
+            actual = {
+                row["_id"]: row["count"]
+                for row in db.notes.aggregate([
+                    {"$match":  {"user_id": user["_id"], "tags.0": {"$exists": True}}},
+                    {"$unwind": "$tags"},
+                    {"$group":  {"_id": "$tags", "count": {"$sum": 1}}},
+                ])
+            }
+            stored = {t["tag"]: t["count"] for t in repo.tag_counts(user["_id"])}
+            if stored != actual:
+                changed.append(user["_id"])
+                if not dry_run:
+                    repo.rebuild_tag_counts(user["_id"])
+        if changed and not dry_run:
+            invalidate(changed)
+        return len(changed)
+
+
+@register
+class CleanOrphans(Job):
+    name        = "orphans"
+    help        = "Delete chapters and notes left behind by partial cascades, and activity of deleted users"
+    collections = ("chapters", "notes", "activity")
+    fields      = {
+        "chapters": {"user_id": 1, "subject_id": 1},
+        "notes":    {"user_id": 1, "subject_id": 1, "chapter_id": 1, "tags": 1},
+        "activity": {"user_id": 1},
+    }
+
+    def process(self, db, coll, docs, dry_run):
+        if coll == "chapters":
+            orphans = _missing(db.subjects, docs, "subject_id")
+        elif coll == "notes":
+            # A note under an orphaned chapter has a missing subject too, so
+            # this doesn't depend on the chapters being cleaned up first
+            orphans = _missing(db.chapters, docs, "chapter_id") | _missing(db.subjects, docs, "subject_id")
+        else:
+            orphans = _missing(db.users, docs, "user_id")
+        gone = [d for d in docs if d["_id"] in orphans]
+        if not gone or dry_run:
+            return len(gone)
+
+        repo = MongoRepository(db)
+        if coll == "notes":
+            repo.delete_notes(gone)
+        else:
+            db[coll].bulk_write([DeleteOne({"_id": d["_id"]}) for d in gone], ordered=False)
+        if coll != "activity":
+            by_user = {}
+            for d in gone:
+                by_user.setdefault(str(d["user_id"]), []).append((coll[:-1], d["_id"]))
+            for user_id, deleted in by_user.items():
+                write_tombstones(repo, user_id, deleted)
+            invalidate(by_user)
+        return len(gone)
+
+
+def _missing(target, docs: list, field: str) -> set:
+    """_ids of the `docs` whose `field` refers to no document in `target`."""
+    refs  = list({d.get(field) for d in docs})
+    found = {r["_id"] for r in target.find({"_id": {"$in": refs}}, {"_id": 1})}
+    return {d["_id"] for d in docs if d.get(field) not in found}
@@ -0,0 +1,79 @@
+"""
+manage.py — Maintenance jobs over the whole database (MongoDB at MONGO_URI)
+
+    python manage.py jobs                              # what can run
+    python manage.py run text                          # run, or resume, a job
+    python manage.py run orphans --dry-run             # count what would change
+    python manage.py run counts --workers 8 --rate 2000
+    python manage.py status [job]                      # progress of the last run
+
+Jobs split each collection into `_id` ranges, work through them on a
+process pool and save their progress as they go: if a run is stopped,
+the same command carries on from where it stopped (--restart starts
+over). --rate caps documents per second across all workers; leave it
+unset only when the app is offline. See maintenance/__init__.py.
+"""
+
+import argparse
+import os
+import sys
+from maintenance import JOBS, run, status
+from migrations import connect
+
+
+def _jobs(args):
+    for job in JOBS.values():
+        print(f"  {job.name:<9} {job.help}  [{', '.join(job.collections)}]")
+
+
+def _run(args):
+    try:
+        result = run(args.job, args.workers, args.partitions, args.batch, args.rate,
+                     args.dry_run, args.restart)
+    except KeyboardInterrupt:
+        print("\nℹ️  Stopped — progress is saved; run the same command to resume")
+        sys.exit(130)
+    took = result["seconds"]
+    print(f"✅  '{args.job}': {result['scanned']:,} documents scanned, {result['changed']:,} "
+          f"{'would change' if args.dry_run else 'changed'} in {took:.1f}s "
+          f"({result['scanned'] / max(took, 1e-9):,.0f}/s)")
+
+
+def _status(args):
+    rows = status(connect(), args.job)
+    if not rows:
+        print("ℹ️  No runs recorded")
+    for r in rows:
+        state = "done" if r["done"] == r["partitions"] else f"{r['done']}/{r['partitions']} partitions"
+        print(f"  {r['_id']:<9} {state:<16} {r['scanned']:>12,} scanned {r['changed']:>10,} changed   "
+              f"started {r['started_at']:%Y-%m-%d %H:%M}  last batch {r['updated_at']:%Y-%m-%d %H:%M}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("jobs", help="list the jobs").set_defaults(func=_jobs)
+
+    p = commands.add_parser("run", help="run or resume a job")
+    p.add_argument("job", choices=sorted(JOBS))
+    p.add_argument("--workers",    type=int,   default=os.cpu_count() or 2)
+    p.add_argument("--partitions", type=int,   default=0, help="_id ranges per collection (default 4 × workers)")
+    p.add_argument("--batch",      type=int,   default=500)
+    p.add_argument("--rate",       type=float, default=0, help="max documents/second, all workers together")
+    p.add_argument("--dry-run",    action="store_true", help="change nothing, save no progress")
+    p.add_argument("--restart",    action="store_true", help="ignore the progress of an unfinished run")
+    p.set_defaults(func=_run)
+
+    p = commands.add_parser("status", help="progress of the last run of each job")
+    p.add_argument("job", nargs="?", choices=sorted(JOBS))
+    p.set_defaults(func=_status)
+
+    args = parser.parse_args()
+    if getattr(args, "partitions", None) == 0:
+        args.partitions = 4 * args.workers
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+middleware/admission.py — Adaptive concurrency limits and load shedding
+
+Every API request is put in a class:
+
+  auth   /api/auth/*                                   never shed
+  write  POST / PUT / DELETE (autosave lives here)     never shed
+         (but READ_ONLY_POSTS count as reads)
+  read   other GETs                                    shed second
+  heavy  HEAVY_ENDPOINTS (stats, search, browse, tree) shed first
+
+Each class has a concurrency limit that adapts AIMD-style: a request that
+finishes within the class's latency target while the class was at its
+limit raises the limit by 1/limit (about +1 per round of requests); a slow
+or failed one cuts it by BACKOFF, at most once per target interval. When
+an auth or write request is slow, the sheddable classes are cut as well,
+heavy first, so expensive reads give way before autosaves queue up behind
+them. A sheddable request arriving while its class is at the limit gets
+503 + Retry-After at once instead of waiting. When serve.py reports the
+worker's concurrency, read and heavy requests together may also use only
+(1 - RESERVE) of it; hitting that ceiling sheds and counts as a slow reply.
+
+Limits are per worker process and only see requests the worker has
+already accepted, so they matter for the threaded and gevent workers
+(serve.py); a sync worker runs one request at a time anyway. Health,
+metrics, media, event streams and exports (which have their own limit,
+routes/export.py) are never counted.
+
+    ADMISSION_CONTROL=0          → off
+    ADMISSION_RETRY_AFTER=2      → seconds suggested to shed clients
+    WORKER_CONCURRENCY=<n>       → set by serve.py; keeps RESERVE of the
+                                   worker's slots free of read/heavy work
+
+Current limits, in-flight counts and shed totals: GET /api/metrics.
+"""
+
+import threading
+import time
+from flask import g, jsonify, request
+from config import metrics
+
+# Expensive GETs, by endpoint name; add new ones here
+HEAVY_ENDPOINTS = {
+    "dashboard.get_stats",
+    "notes.search_notes",
+    "notes.browse_notes",
+    "tree.get_tree",
+    "notes.related_notes",
+    "notes.duplicate_notes",
+}
+
+# POSTs that only read (their ids are in the body); classed as GETs are
+READ_ONLY_POSTS = {"notes.batch_notes"}
+
+EXEMPT_PREFIXES = ("/api/health", "/api/metrics", "/api/media", "/api/events", "/api/export")
+
+BACKOFF = 0.9
+RESERVE = 0.25      # share of the worker's request slots sheddable classes may not take
+
+#            target ms, start limit, min, max, shed order (0 = never)
+CLASSES = {
+    "auth":  (600,  16, 4,  64,  0),          # bcrypt alone is ~250 ms
+    "write": (50,   32, 4,  128, 0),
+    "read":  (150,  32, 2,  128, 1),
+    "heavy": (500,  8,  1,  32,  2),
+}
+
+
+class _Class:
+    def __init__(self, name: str, target_ms: float, limit: int, min_limit: int,
+                 max_limit: int, shed_order: int):
+        self.name       = name
+        self.target     = target_ms / 1000
+        self.limit      = float(limit)
+        self.min_limit  = min_limit
+        self.max_limit  = max_limit
+        self.shed_order = shed_order
+        self.inflight   = 0
+        self.cut_at     = 0.0
+        self.latency    = None            # EWMA, seconds
+        self.admitted   = 0
+        self.shed       = 0
+
+    def cut(self, now: float) -> bool:
+        """Multiplicative decrease, at most once per target interval."""
+        if now - self.cut_at < self.target or self.limit <= self.min_limit:
+            return False
+        self.limit  = max(self.min_limit, self.limit * BACKOFF)
+        self.cut_at = now
+        return True
+
+
+class AdmissionController:
+    def __init__(self, capacity: int = 0, classes: dict = None):
+        self.classes  = {name: _Class(name, *spec) for name, spec in (classes or CLASSES).items()}
+        self._lock    = threading.Lock()
+        self.inflight = 0
+        # Requests this worker can run at once (threads / greenlets), if known.
+        # Sheddable classes together stay below it, leaving room for saves.
+        self.shared   = capacity - max(1, int(capacity * RESERVE)) if capacity > 1 else 0
+        self._sheddable = sorted(
+            (c for c in self.classes.values() if c.shed_order),
+            key=lambda c: -c.shed_order,
+        )
+
+    def admit(self, name: str) -> bool:
+        with self._lock:
+            c = self.classes[name]
+            if c.shed_order:
+                busy = self.shared and sum(s.inflight for s in self._sheddable) >= self.shared
+                if busy or c.inflight >= int(c.limit):
+                    c.shed += 1
+                    if busy:
+                        c.cut(time.monotonic())     # the worker is full: back off as on a slow reply
+                    return False
+            c.inflight    += 1
+            self.inflight += 1
+            c.admitted    += 1
+            return True
+
+    def release(self, name: str, seconds: float, ok: bool):
+        now = time.monotonic()
+        with self._lock:
+            c = self.classes[name]
+            at_limit       = c.inflight >= int(c.limit)
+            c.inflight    -= 1
+            self.inflight -= 1
+            c.latency   = seconds if c.latency is None else 0.8 * c.latency + 0.2 * seconds
+
+            if ok and seconds <= c.target:
+                if at_limit:
+                    c.limit = min(c.max_limit, c.limit + 1 / c.limit)
+                return
+            c.cut(now)
+            if not c.shed_order:
+                # A protected class is slow: the lowest-priority class with room to give backs off
+                for other in self._sheddable:
+                    if other.cut(now):
+                        break
+
+    def state(self) -> dict:
+        with self._lock:
+            return {
+                c.name: {
+                    "limit":      round(c.limit, 2),
+                    "inflight":   c.inflight,
+                    "admitted":   c.admitted,
+                    "shed":       c.shed,
+                    "latency_ms": round(c.latency * 1000, 1) if c.latency is not None else None,
+                    "target_ms":  round(c.target * 1000),
+                }
+                for c in self.classes.values()
+            }
+
+
+def classify(req) -> str:
+    """Route class for a request, or None if it is not admission-controlled."""
+    path = req.path
+    if not path.startswith("/api/") or path.startswith(EXEMPT_PREFIXES) or req.method == "OPTIONS":
+        return None
+    if path.startswith("/api/auth/"):
+        return "auth"
+    if req.method in ("POST", "PUT", "PATCH", "DELETE") and req.endpoint not in READ_ONLY_POSTS:
+        return "write"
+    if req.endpoint in HEAVY_ENDPOINTS:
+        return "heavy"
+    return "read"
+
+
+# ── App wiring ────────────────────────────────────────────────────────────────
+
+controller = None
+
+
+def init_admission(app):
+    """Track every API request through a per-process AdmissionController."""
+    global controller
+    if not app.config.get("ADMISSION_CONTROL", True):
+        return
+    controller  = AdmissionController(app.config.get("WORKER_CONCURRENCY", 0))
+    retry_after = str(app.config.get("ADMISSION_RETRY_AFTER", 2))
+    metrics.gauge("admission", controller.state)
+
+    @app.before_request
+    def _admit():
+        name = classify(request)
+        if name is None:
+            return None
+        if not controller.admit(name):
+            metrics.incr(f"admission.shed.{name}")
+            response = jsonify({"error": "Server is busy — please retry in a moment"})
+            response.status_code = 503
+            response.headers["Retry-After"] = retry_after
+            return response
+        g.admission = (name, time.perf_counter())
+        g.admitted  = True             # kept after release, for the breaker (middleware/deadline.py)
+        return None
+
+    @app.after_request
+    def _status(response):
+        g.admission_ok = response.status_code < 500
+        return response
+
+    @app.teardown_request
+    def _release(exc):
+        admitted = g.pop("admission", None)
+        if admitted is not None:
+            name, start = admitted
+            ok = exc is None and g.pop("admission_ok", False)
+            controller.release(name, time.perf_counter() - start, ok)
+
+
+def get_controller():
+    return controller
@@ -7,7 +7,7 @@ import os
 from functools import wraps
 from flask import request, jsonify, current_app, g
 from bson import ObjectId
-from config.db import get_db
+from storage import get_repo
 
 
 def token_required(f):
@@ -45,8 +45,7 @@ def token_required(f):
         except jwt.InvalidTokenError:
             return jsonify({"error": "Invalid token"}), 401
 
-        db = get_db()
-        user = db.users.find_one({"_id": ObjectId(payload["user_id"])})
+        user = get_repo().find_user(ObjectId(payload["user_id"]))
         if not user:
             return jsonify({"error": "User not found"}), 401
 
@@ -0,0 +1,103 @@
+"""
+middleware/cache.py — Per-user response caching for read-heavy routes
+
+    @subjects_bp.route("", methods=["GET"])
+    @token_required
+    @cached_response
+    def list_subjects(): ...
+
+    @subjects_bp.route("", methods=["POST"])
+    @token_required
+    @invalidates_cache
+    def create_subject(): ...
+
+A cached body is stored under the user's current generation number. Any
+successful write by that user bumps the generation, so the next read
+misses and recomputes. The bump happens after the write, so a read that
+raced it can only have filled the old generation, which is never read
+again. A cache outage just means every request is a miss.
+
+@conditional_response (outermost) adds a content ETag to 200 responses,
+cached or not, and answers a matching If-None-Match with 304.
+"""
+
+from functools import wraps
+from flask import current_app, make_response, request, g
+from config.cache import get_cache, generation_key
+from config import metrics
+from middleware.singleflight import forget
+
+
+def _bump(cache, user_id: str):
+    try:
+        cache.incr(generation_key(user_id))
+    except Exception as e:
+        metrics.incr("cache.errors")
+        current_app.logger.warning("cache generation bump failed: %s", e)
+
+
+def cached_response(f):
+    """Serve a 200 JSON response from the cache, keyed by user + generation + URL."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        cache = get_cache()
+        if cache is None:
+            return f(*args, **kwargs)
+
+        try:
+            generation = int(cache.get(generation_key(g.user_id)) or 0)
+            g.cache_generation = generation          # part of the @single_flight key
+            key        = f"nv:resp:{g.user_id}:{generation}:{request.full_path}"
+            body       = cache.get(key)
+        except Exception as e:
+            metrics.incr("cache.errors")
+            current_app.logger.warning("cache read failed: %s", e)
+            return f(*args, **kwargs)
+
+        if body is not None:
+            metrics.incr("cache.hits")
+            response = current_app.response_class(body, status=200, mimetype="application/json")
+            response.headers["X-Cache"] = "HIT"
+            return response
+
+        metrics.incr("cache.misses")
+        response = make_response(f(*args, **kwargs))
+        # A response with parts left out for lack of time is not kept
+        if response.status_code == 200 and response.is_json and "X-Degraded" not in response.headers:
+            try:
+                cache.set(key, response.get_data(), current_app.config.get("CACHE_TTL", 300))
+            except Exception as e:
+                metrics.incr("cache.errors")
+                current_app.logger.warning("cache write failed: %s", e)
+        response.headers["X-Cache"] = "MISS"
+        return response
+    return decorated
+
+
+def conditional_response(f):
+    """ETag 200 responses by content; 304 when the client already has them."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        response = make_response(f(*args, **kwargs))
+        if response.status_code == 200:
+            response.add_etag()
+            response.headers["Cache-Control"] = "private, no-cache"
+            response.make_conditional(request)
+            if response.status_code == 304:
+                metrics.incr("etag.not_modified")
+        return response
+    return decorated
+
+
+def invalidates_cache(f):
+    """Bump the user's generation after a successful (non-error) write."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        response = make_response(f(*args, **kwargs))
+        if response.status_code < 400:
+            forget(g.user_id)
+            cache = get_cache()
+            if cache is not None:
+                _bump(cache, g.user_id)
+        return response
+    return decorated
@@ -0,0 +1,218 @@
+"""
+middleware/deadline.py — Per-route query budgets and a database circuit breaker
+
+Every admission-controlled request (see middleware/admission.py) runs
+inside a time budget, chosen by endpoint name or else by route class:
+
+  auth   3000 ms      write  3000 ms      read  2000 ms      heavy  5000 ms
+
+Each database command issued while handling the request gets what is left
+of it (maxTimeMS for MongoDB, a progress handler for SQLite — see
+config/deadline.py), so a slow regex search or dashboard scan ends well
+before a serverless platform would kill the invocation. A request whose
+budget runs out gets 504 (503 if the database could not even be reached
+in time); handlers may instead leave optional parts out
+(DEGRADED_SECTIONS — the dashboard can drop its word count and tags).
+
+The circuit breaker counts requests that failed because the database was
+unreachable or too slow. When at least BREAKER_MIN_REQUESTS finished in
+the last BREAKER_WINDOW seconds and BREAKER_FAILURE_RATIO of them failed,
+it opens: for BREAKER_COOLDOWN seconds every request gets 503 +
+Retry-After at once, without touching the database. Then a single probe
+request is let through; if it succeeds the breaker closes, otherwise it
+opens again. Requests shed by admission control don't count either way.
+Like admission limits, the breaker is per worker process.
+
+    QUERY_BUDGETS=heavy=4000,notes.search_notes=1500   → override budgets (ms,
+                                                         0 = none) by class
+                                                         or endpoint
+    DEGRADED_SECTIONS=dashboard.words,dashboard.tags   → may be left out
+    BREAKER=0                                          → no circuit breaker
+
+Breaker state and open / timeout counts: GET /api/metrics.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import deque
+from flask import g, jsonify, request
+from pymongo.errors import ConnectionFailure, PyMongoError
+from config import deadline, metrics
+from middleware.admission import classify, get_controller
+
+# Milliseconds per route class; QUERY_BUDGETS may override them or set
+# budgets for single endpoints ("dashboard.get_stats=4000")
+BUDGETS = {
+    "auth":  3000,          # bcrypt is ~250 ms of it
+    "write": 3000,
+    "read":  2000,
+    "heavy": 5000,
+}
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+def parse_budgets(spec: str) -> dict:
+    """'heavy=4000,notes.search_notes=1500' → BUDGETS updated with those values."""
+    budgets = dict(BUDGETS)
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        name, _, ms = item.partition("=")
+        budgets[name.strip()] = int(ms)
+    return budgets
+
+
+def is_outage(exc: BaseException) -> bool:
+    """True if `exc` means the database is unreachable, overloaded or too slow."""
+    if deadline.is_timeout(exc):
+        return True
+    if isinstance(exc, ConnectionFailure):
+        return True
+    return isinstance(exc, sqlite3.OperationalError) and "locked" in str(exc)
+
+
+class CircuitBreaker:
+    def __init__(self, window: float = 10, min_requests: int = 20, failure_ratio: float = 0.5,
+                 cooldown: float = 15):
+        self.window        = window
+        self.min_requests  = min_requests
+        self.failure_ratio = failure_ratio
+        self.cooldown      = cooldown
+        self.state_name    = CLOSED
+        self.opened_at     = 0.0
+        self.probing       = False
+        self.opened        = 0
+        self._outcomes     = deque()           # (time, failed)
+        self._failures     = 0
+        self._lock         = threading.Lock()
+
+    def allow(self) -> bool:
+        """May a request go ahead? False while open (and while a probe is out)."""
+        with self._lock:
+            if self.state_name == CLOSED:
+                return True
+            if self.state_name == OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    return False
+                self.state_name = HALF_OPEN
+            if self.probing:
+                return False
+            self.probing = True
+            return True
+
+    def record(self, failed: bool):
+        now = time.monotonic()
+        with self._lock:
+            if self.state_name != CLOSED:
+                if self.probing:
+                    self.probing = False
+                    if failed:
+                        self._open(now)
+                    else:
+                        self.state_name = CLOSED
+                        self._outcomes.clear()
+                        self._failures = 0
+                return
+
+            self._outcomes.append((now, failed))
+            self._failures += failed
+            while self._outcomes and now - self._outcomes[0][0] > self.window:
+                self._failures -= self._outcomes.popleft()[1]
+            total = len(self._outcomes)
+            if total >= self.min_requests and self._failures >= self.failure_ratio * total:
+                self._open(now)
+
+    def _open(self, now: float):
+        self.state_name = OPEN
+        self.opened_at  = now
+        self.opened    += 1
+        metrics.incr("breaker.opened")
+
+    def release(self):
+        """A request allow() let through ended without reaching the database."""
+        with self._lock:
+            self.probing = False
+
+    def retry_after(self) -> int:
+        with self._lock:
+            return max(1, round(self.cooldown - (time.monotonic() - self.opened_at)))
+
+    def state(self) -> dict:
+        with self._lock:
+            total = len(self._outcomes)
+            return {
+                "state":         self.state_name,
+                "requests":      total,
+                "failure_ratio": round(self._failures / total, 3) if total else None,
+                "opened":        self.opened,
+            }
+
+
+# ── App wiring ────────────────────────────────────────────────────────────────
+
+breaker = None
+
+
+def init_deadlines(app):
+    """Give every API request a query budget; fail fast while the database is down."""
+    global breaker
+    budgets = parse_budgets(app.config.get("QUERY_BUDGETS", ""))
+    if app.config.get("BREAKER", True):
+        breaker = CircuitBreaker(
+            window=app.config.get("BREAKER_WINDOW", 10),
+            min_requests=app.config.get("BREAKER_MIN_REQUESTS", 20),
+            failure_ratio=app.config.get("BREAKER_FAILURE_RATIO", 0.5),
+            cooldown=app.config.get("BREAKER_COOLDOWN", 15),
+        )
+        metrics.gauge("breaker", breaker.state)
+
+    @app.before_request
+    def _start():
+        name = classify(request)
+        if name is None:
+            return None
+        if breaker is not None:
+            if not breaker.allow():
+                metrics.incr("breaker.rejected")
+                response = jsonify({"error": "The database is unavailable — please retry shortly"})
+                response.status_code = 503
+                response.headers["Retry-After"] = str(breaker.retry_after())
+                return response
+            g.breaker = True
+        ms = budgets.get(request.endpoint, budgets.get(name, 0))
+        if ms:
+            g.deadline = deadline.budget(ms / 1000)
+            g.deadline.__enter__()
+        return None
+
+    @app.teardown_request
+    def _finish(exc):
+        scope = g.pop("deadline", None)
+        if scope is not None:
+            scope.__exit__(None, None, None)
+        if g.pop("breaker", False):
+            # Shed by admission control: says nothing about the database
+            if g.get("admitted") or get_controller() is None:
+                breaker.record(g.pop("db_failed", False) or (exc is not None and is_outage(exc)))
+            else:
+                breaker.release()
+
+    @app.errorhandler(PyMongoError)
+    @app.errorhandler(sqlite3.OperationalError)
+    def _database_error(e):
+        if not is_outage(e):
+            raise e
+        g.db_failed = True
+        # Unreachable (even if only for the rest of the budget) → 503; the
+        # query itself ran out of time (maxTimeMS, interrupted) → 504
+        if isinstance(e, ConnectionFailure) or not deadline.is_timeout(e):
+            response = jsonify({"error": "The database is unavailable — please retry shortly"})
+            response.status_code = 503
+            response.headers["Retry-After"] = "1"
+            return response
+        metrics.incr("deadline.timeouts")
+        return jsonify({"error": "This took too long — please try again"}), 504
+
+
+def get_breaker():
+    return breaker
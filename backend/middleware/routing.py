@@ -0,0 +1,115 @@
+"""
+middleware/routing.py — Per-route read preferences, read-your-writes across requests
+
+On a MongoDB replica set (or sharded cluster) the expensive reads don't
+have to queue up on the primary behind autosaves. READ_PREFERENCES says,
+by endpoint name or route class (see middleware/admission.py), which
+members a request's reads may go to; everything not named reads from the
+primary, and writes always go there:
+
+    READ_PREFERENCES=heavy=secondaryPreferred,dashboard.get_activity=secondaryPreferred
+    MAX_STALENESS_SECONDS=90     → skip secondaries estimated further behind
+                                   (90 is the least MongoDB accepts; 0 = no bound)
+    READ_PREFERENCES=            → all reads from the primary, as before
+
+A secondary may not have replicated a write the user just made, so each
+request runs in a causally consistent session, and a response whose
+session got further than the position the request came with carries it:
+
+    X-Causal-Token: <the session's cluster + operation time, signed with SECRET_KEY>
+
+A request sending the token back (the frontend keeps the latest one)
+starts its session from there: its reads on a secondary wait until that
+member has caught up with the write (within the query budget, see
+middleware/deadline.py). Tokens expire after TOKEN_TTL seconds; invalid
+ones are ignored. Nothing is routed on SQLite or a standalone mongod.
+
+Reads per preference, and those made after a token: GET /api/metrics.
+"""
+
+import time
+import jwt
+from bson import json_util
+from flask import g, request
+from config import metrics
+from middleware.admission import classify
+from storage import get_repo
+
+# Where reads may go when READ_PREFERENCES is not set
+READ_PREFERENCES = "heavy=secondaryPreferred,dashboard.get_activity=secondaryPreferred"
+
+HEADER    = "X-Causal-Token"
+TOKEN_TTL = 600             # seconds; far longer than any replication lag worth waiting for
+
+MODES = {"primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest"}
+
+
+def parse_preferences(spec: str) -> dict:
+    """'heavy=secondaryPreferred,notes.search_notes=nearest' → {name: mode}."""
+    preferences = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        name, _, mode = item.partition("=")
+        if mode.strip() not in MODES:
+            raise ValueError(f"Unknown read preference for {name.strip()}: {mode.strip()}")
+        preferences[name.strip()] = mode.strip()
+    return preferences
+
+
+def encode_position(session, secret: str) -> str:
+    """A signed token of how far `session` has seen."""
+    position = json_util.dumps(
+        {"clusterTime": session.cluster_time, "operationTime": session.operation_time},
+        json_options=json_util.CANONICAL_JSON_OPTIONS,
+    )
+    return jwt.encode({"pos": position, "exp": int(time.time()) + TOKEN_TTL}, secret, algorithm="HS256")
+
+
+def decode_position(token: str, secret: str):
+    """The position in a token from encode_position(), or None if it isn't valid."""
+    try:
+        return json_util.loads(jwt.decode(token, secret, algorithms=["HS256"])["pos"])
+    except (jwt.InvalidTokenError, KeyError, ValueError):
+        return None
+
+
+# ── App wiring ────────────────────────────────────────────────────────────────
+
+def init_routing(app):
+    """Route each request's reads by its read preference, after the user's last write."""
+    preferences   = parse_preferences(app.config.get("READ_PREFERENCES", READ_PREFERENCES))
+    max_staleness = app.config.get("MAX_STALENESS_SECONDS", 90) or -1
+    secret        = app.config["SECRET_KEY"]
+
+    @app.before_request
+    def _route():
+        repo = get_repo()
+        if not preferences or repo is None or not repo.replicated:
+            return None
+        name = classify(request)
+        if name is None:
+            return None
+        mode  = preferences.get(request.endpoint, preferences.get(name, "primary"))
+        token = request.headers.get(HEADER)
+        after = decode_position(token, secret) if token else None
+        g.route    = repo.routed(mode, after, max_staleness)
+        g.session  = g.route.__enter__()
+        g.position = after
+        metrics.incr(f"reads.{mode}")
+        if after:
+            metrics.incr("reads.causal")
+        return None
+
+    @app.after_request
+    def _position(response):
+        session = g.get("session")
+        if session is not None and session.operation_time is not None:
+            seen = (g.position or {}).get("operationTime")
+            if seen is None or session.operation_time > seen:
+                response.headers[HEADER] = encode_position(session, secret)
+        return response
+
+    @app.teardown_request
+    def _end(exc):
+        route = g.pop("route", None)
+        if route is not None:
+            route.__exit__(None, None, None)
@@ -0,0 +1,112 @@
+"""
+middleware/singleflight.py — Coalesce identical concurrent requests
+
+    @dashboard_bp.route("/stats", methods=["GET"])
+    @token_required
+    @cached_response
+    @single_flight
+    def get_stats(): ...
+
+Requests with the same (user, endpoint, query args) that arrive while one
+is already being computed wait for it and get a copy of its 200 response
+instead of doing the work again — several open tabs, or a user hammering
+refresh, cost one computation. If SINGLE_FLIGHT_GRACE is set (seconds),
+the finished response also answers identical requests for that long.
+
+Coalescing is per worker process; the shared response cache covers the
+rest. A request only joins a flight that started after the user's last
+write: any successful write (see @invalidates_cache) bumps the user's
+write epoch in this process, and the response cache's generation (read by
+@cached_response) carries writes made through other workers; both are
+part of the flight key. The write also drops the user's finished entries
+so the grace period never hides it.
+"""
+
+import threading
+import time
+from functools import wraps
+from flask import current_app, make_response, request, g
+from config import metrics
+
+# A follower stops waiting and computes on its own after this long
+WAIT_TIMEOUT = 30.0
+# Expired grace entries are swept once this many flights are tracked
+SWEEP_AT     = 256
+
+
+class _Flight:
+    __slots__ = ("done", "response", "expires")
+
+    def __init__(self):
+        self.done     = threading.Event()
+        self.response = None                 # (body, status, mimetype) if shareable
+        self.expires  = 0.0
+
+
+_flights = {}
+_epochs  = {}                # user id → writes seen by this process (while they have flights)
+_lock    = threading.Lock()
+
+
+def _key() -> tuple:
+    args  = tuple(sorted((k, v.strip()) for k, v in request.args.items(multi=True)))
+    epoch = (_epochs.get(g.user_id, 0), g.get("cache_generation"))
+    return g.user_id, epoch, request.endpoint, args
+
+
+def forget(user_id: str):
+    """
+    Called after a user's write: later requests start new flights instead
+    of joining ones that began before it, and finished flights are dropped.
+    """
+    with _lock:
+        _epochs[user_id] = _epochs.get(user_id, 0) + 1
+        for key in [k for k, f in _flights.items() if k[0] == user_id and f.done.is_set()]:
+            del _flights[key]
+
+
+def single_flight(f):
+    """Share one in-flight (or, within the grace period, just finished) response."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        now = time.monotonic()
+        with _lock:
+            key    = _key()                  # under the lock: epochs may be swept below
+            flight = _flights.get(key)
+            if flight is not None and flight.done.is_set() and flight.expires <= now:
+                del _flights[key]
+                flight = None
+            leader = flight is None
+            if leader:
+                if len(_flights) >= SWEEP_AT:
+                    for stale in [k for k, f in _flights.items() if f.done.is_set() and f.expires <= now]:
+                        del _flights[stale]
+                    # An epoch only has to tell flights apart while the user has some
+                    flying = {k[0] for k in _flights}
+                    for user_id in [u for u in _epochs if u not in flying and u != key[0]]:
+                        del _epochs[user_id]
+                flight = _flights[key] = _Flight()
+
+        if not leader:
+            if flight.done.wait(WAIT_TIMEOUT) and flight.response is not None:
+                metrics.incr("singleflight.shared")
+                body, status, mimetype = flight.response
+                response = current_app.response_class(body, status=status, mimetype=mimetype)
+                response.headers["X-Single-Flight"] = "shared"
+                return response
+            return f(*args, **kwargs)        # the leader failed or is stuck
+
+        grace = float(current_app.config.get("SINGLE_FLIGHT_GRACE", 0) or 0)
+        try:
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                flight.response = (response.get_data(), 200, response.mimetype)
+            return response
+        finally:
+            flight.expires = time.monotonic() + grace
+            flight.done.set()
+            if not grace or flight.response is None:
+                with _lock:
+                    if _flights.get(key) is flight:
+                        del _flights[key]
+    return decorated
@@ -0,0 +1,30 @@
+"""
+migrations — one-off data migrations, run from the backend folder:
+
+    python -m migrations.<name>
+
+Each migration is idempotent and safe to re-run.
+"""
+
+import os
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+
+def connect():
+    """Return the database named in MONGO_URI (same defaults as the app)."""
+    load_dotenv()
+    uri    = os.environ.get("MONGO_URI", "mongodb://localhost:27017/notvault")
+    client = MongoClient(uri, serverSelectionTimeoutMS=5000)
+    return client.get_default_database(default="notvault")
+
+
+def collection_size(db, name: str) -> dict:
+    """Storage figures for a collection, as reported by collStats."""
+    stats = db.command("collStats", name)
+    return {
+        "count":        stats.get("count", 0),
+        "size":         stats.get("size", 0),
+        "storage_size": stats.get("storageSize", 0),
+        "avg_obj_size": stats.get("avgObjSize", 0),
+    }
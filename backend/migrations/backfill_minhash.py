@@ -0,0 +1,57 @@
+"""
+migrations/backfill_minhash.py — Give existing notes MinHash / LSH fields
+
+Notes saved before near-duplicate detection have no `minhash` signature or
+`lsh` band keys, so GET /api/notes/duplicates and the create-time check
+can't see them. This computes both from each note's text (the same
+`dedup_fields` every save uses). Notes are not re-stamped with a sync
+`seq`: clients never see these fields.
+
+    python -m migrations.backfill_minhash [--batch 500] [--dry-run]
+
+The SQLite backend fills them in itself when it opens an older database.
+"""
+
+import argparse
+import time
+from pymongo import UpdateOne
+from models.dedup import dedup_fields
+from models.note import note_text
+from migrations import connect
+
+
+def run(db, batch: int = 500, dry_run: bool = False) -> dict:
+    todo   = {"lsh": {"$exists": False}}
+    cursor = db.notes.find(todo, {"content": 1, "content_codec": 1, "content_text": 1}).batch_size(batch)
+
+    scanned = signed = 0
+    ops = []
+    for note in cursor:
+        scanned += 1
+        fields = dedup_fields(note_text(note))
+        signed += fields["minhash"] is not None
+        ops.append(UpdateOne({"_id": note["_id"]}, {"$set": fields}))
+        if len(ops) >= batch:
+            if not dry_run:
+                db.notes.bulk_write(ops, ordered=False)
+            ops = []
+    if ops and not dry_run:
+        db.notes.bulk_write(ops, ordered=False)
+
+    return {"scanned": scanned, "signed": signed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    start  = time.perf_counter()
+    result = run(connect(), args.batch, args.dry_run)
+    print(f"✅  Scanned {result['scanned']} notes, {result['signed']} long enough for a signature, "
+          f"in {time.perf_counter() - start:.1f}s{' (dry run)' if args.dry_run else ''}")
+
+
+if __name__ == "__main__":
+    main()
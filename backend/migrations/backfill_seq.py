@@ -0,0 +1,42 @@
+"""
+migrations/backfill_seq.py — Stamp existing documents with a sync `seq`
+
+Subjects, chapters and notes written before delta sync have no `seq` and
+would be invisible to GET /api/sync. This assigns one per document from
+each user's counter, oldest first.
+
+    python -m migrations.backfill_seq
+"""
+
+from pymongo import UpdateOne
+from storage.mongo import MongoRepository
+from migrations import connect
+
+
+def run(db) -> int:
+    repo    = MongoRepository(db)
+    stamped = 0
+    for user_id in db.users.distinct("_id"):
+        for coll in ("subjects", "chapters", "notes"):
+            ids = [d["_id"] for d in db[coll].find(
+                {"user_id": user_id, "seq": {"$exists": False}}, {"_id": 1}
+            ).sort("_id", 1)]
+            if not ids:
+                continue
+            last  = repo.next_seq(user_id, len(ids))
+            first = last - len(ids) + 1
+            db[coll].bulk_write([
+                UpdateOne({"_id": _id}, {"$set": {"seq": first + i}})
+                for i, _id in enumerate(ids)
+            ], ordered=False)
+            stamped += len(ids)
+    return stamped
+
+
+def main():
+    stamped = run(connect())
+    print(f"✅  Stamped {stamped} documents with a sync seq")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+migrations/compress_content.py — Compress large note content at rest
+
+Rewrites every note whose `content` is still a plain string through
+`pack_content`, which compresses content above CONTENT_COMPRESS_THRESHOLD
+and stores the HTML-stripped `content_text` that search, snippets and
+word counts use for compressed notes.
+
+    python -m migrations.compress_content [--batch 200] [--dry-run]
+
+Prints collStats for `notes` before and after so the storage saving is
+visible.
+"""
+
+import argparse
+import time
+from pymongo import UpdateOne
+from models.note import pack_content
+from migrations import connect, collection_size
+
+
+def run(db, batch: int = 200, dry_run: bool = False) -> dict:
+    todo = {"content_codec": {"$exists": False}}
+    cursor = db.notes.find(todo, {"content": 1}).batch_size(batch)
+
+    scanned = compressed = 0
+    ops = []
+    for note in cursor:
+        scanned += 1
+        content = note.get("content") or ""
+        if not isinstance(content, str):
+            continue
+        fields = pack_content(content)
+        if fields["content_codec"]:
+            compressed += 1
+        ops.append(UpdateOne({"_id": note["_id"]}, {"$set": fields}))
+        if len(ops) >= batch:
+            if not dry_run:
+                db.notes.bulk_write(ops, ordered=False)
+            ops = []
+    if ops and not dry_run:
+        db.notes.bulk_write(ops, ordered=False)
+
+    return {"scanned": scanned, "compressed": compressed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    db     = connect()
+    before = collection_size(db, "notes")
+    start  = time.perf_counter()
+    result = run(db, args.batch, args.dry_run)
+    took   = time.perf_counter() - start
+    after  = collection_size(db, "notes")
+
+    print(f"✅  Scanned {result['scanned']} notes, compressed {result['compressed']} "
+          f"in {took:.1f}s{' (dry run)' if args.dry_run else ''}")
+    for key in ("size", "storage_size", "avg_obj_size"):
+        print(f"   {key:<13} {before[key]:>14,} → {after[key]:>14,}")
+
+
+if __name__ == "__main__":
+    main()
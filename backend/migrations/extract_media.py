@@ -0,0 +1,78 @@
+"""
+migrations/extract_media.py — Move inline data-URL media into the media store
+
+Rewrites every note whose content still embeds `data:` URLs of a
+MEDIA_TYPES type so the blobs live in the configured media store
+(MEDIA_STORE=gridfs|local) and the note references them as
+`/api/media/<sha256>`. Other data URLs stay inline, as on save. Each
+rewritten note gets a new sync `seq`, so clients fetch the new content.
+
+    python -m migrations.extract_media [--dry-run]
+"""
+
+import argparse
+import os
+import re
+import time
+from config.media import make_media_store
+from models.media import MEDIA_TYPES, extract_media
+from models.note import pack_content, unpack_content
+from storage.mongo import MongoRepository
+from migrations import connect, collection_size
+
+_TODO_RX = "data:(" + "|".join(re.escape(t) for t in sorted(MEDIA_TYPES)) + ");base64,"
+
+
+class _Discard:
+    """Media store for --dry-run: keeps nothing."""
+
+    def put(self, digest, data, mimetype):
+        pass
+
+
+def run(db, store, dry_run: bool = False) -> dict:
+    # Compressed notes can't be matched by regex, so check them all
+    todo = {"$or": [
+        {"content": {"$regex": _TODO_RX, "$options": "i"}},
+        {"content_codec": {"$nin": [None]}},
+    ]}
+    repo    = MongoRepository(db)
+    scanned = rewritten = 0
+    for note in db.notes.find(todo, {"user_id": 1, "content": 1, "content_codec": 1}).batch_size(50):
+        scanned += 1
+        stored  = []
+        content = extract_media(unpack_content(note), _Discard() if dry_run else store, stored)
+        if not stored:
+            continue
+        rewritten += 1
+        if dry_run:
+            continue
+        fields = pack_content(content)
+        fields["seq"] = repo.next_seq(note["user_id"])
+        db.notes.update_one({"_id": note["_id"]}, {"$set": fields})
+    return {"scanned": scanned, "rewritten": rewritten}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    db    = connect()
+    store = make_media_store(os.environ.get("MEDIA_STORE", "gridfs"), db=db,
+                             root=os.environ.get("MEDIA_DIR", "media"))
+
+    before = collection_size(db, "notes")
+    start  = time.perf_counter()
+    result = run(db, store, args.dry_run)
+    took   = time.perf_counter() - start
+    after  = collection_size(db, "notes")
+
+    print(f"✅  Scanned {result['scanned']} notes, moved media out of "
+          f"{result['rewritten']} in {took:.1f}s{' (dry run)' if args.dry_run else ''}")
+    for key in ("size", "storage_size", "avg_obj_size"):
+        print(f"   {key:<13} {before[key]:>14,} → {after[key]:>14,}")
+
+
+if __name__ == "__main__":
+    main()
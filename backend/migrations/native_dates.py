@@ -0,0 +1,89 @@
+"""
+migrations/native_dates.py — Store timestamps as BSON dates, drop `modified`
+
+Before this, `created_at` / `updated_at` (and tombstones' `deleted_at`)
+were ISO strings, and every note carried `modified`, a pre-formatted
+display string that is now computed when a note is serialized. This
+converts the strings to native dates and removes `modified`. The app
+drops the old `modified` index and creates (chapter_id, updated_at) when
+it starts.
+
+Until this has run, range filters and sorting by date skip or misplace
+the documents still holding strings, so run it right after deploying.
+Responses look the same before and after, so documents are not
+re-stamped with a sync `seq`. Strings that don't parse are left alone
+and counted.
+
+    python -m migrations.native_dates [--batch 500] [--dry-run]
+
+SQLite keeps ISO text (it has no date type) and needs nothing.
+"""
+
+import argparse
+import time
+from pymongo import UpdateOne
+from models.note import as_datetime
+from migrations import connect
+
+FIELDS = {
+    "users":      ("created_at", "updated_at"),
+    "subjects":   ("created_at", "updated_at"),
+    "chapters":   ("created_at", "updated_at"),
+    "notes":      ("created_at", "updated_at"),
+    "tombstones": ("deleted_at",),
+}
+
+
+def run(db, batch: int = 500, dry_run: bool = False) -> dict:
+    result = {}
+    for coll, fields in FIELDS.items():
+        todo = [{f: {"$type": "string"}} for f in fields]
+        if coll == "notes":
+            todo.append({"modified": {"$exists": True}})
+        cursor = db[coll].find({"$or": todo}, {f: 1 for f in fields}).batch_size(batch)
+
+        converted = unparsed = 0
+        ops = []
+        for doc in cursor:
+            dates = {}
+            for f in fields:
+                if isinstance(doc.get(f), str):
+                    when = as_datetime(doc[f])
+                    if when is None:
+                        unparsed += 1
+                    else:
+                        dates[f] = when
+            update = {"$set": dates} if dates else {}
+            if coll == "notes":
+                update["$unset"] = {"modified": ""}
+            if not update:
+                continue
+            converted += 1
+            ops.append(UpdateOne({"_id": doc["_id"]}, update))
+            if len(ops) >= batch:
+                if not dry_run:
+                    db[coll].bulk_write(ops, ordered=False)
+                ops = []
+        if ops and not dry_run:
+            db[coll].bulk_write(ops, ordered=False)
+        result[coll] = {"converted": converted, "unparsed": unparsed}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    start  = time.perf_counter()
+    result = run(connect(), args.batch, args.dry_run)
+    print(f"✅  Converted timestamps in {time.perf_counter() - start:.1f}s"
+          f"{' (dry run)' if args.dry_run else ''}")
+    for coll, r in result.items():
+        print(f"   {coll:<11} {r['converted']:>10,} documents"
+              + (f"   {r['unparsed']:,} values not ISO dates, left as they were" if r["unparsed"] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+migrations/normalize_tags.py — Convert comma-separated tag strings to arrays
+
+Notes written before tags were arrays hold `tags` as a free-form string
+("exam, Lab,exam"). This rewrites each one through `normalize_tags` (so
+the multikey (user_id, tags) index and GET /api/notes?tag= see them),
+then rebuilds the per-user `tag_counts` collection from scratch.
+
+    python -m migrations.normalize_tags [--batch 500] [--dry-run]
+
+The SQLite backend converts its own rows when it opens an older database.
+"""
+
+import argparse
+import time
+from pymongo import UpdateOne
+from models.note import normalize_tags
+from storage.mongo import MongoRepository
+from migrations import connect
+
+
+def run(db, batch: int = 500, dry_run: bool = False) -> dict:
+    todo   = {"$or": [{"tags": {"$type": "string"}}, {"tags": {"$exists": False}}, {"tags": None}]}
+    cursor = db.notes.find(todo, {"tags": 1}).batch_size(batch)
+
+    converted = 0
+    ops = []
+    for note in cursor:
+        converted += 1
+        ops.append(UpdateOne({"_id": note["_id"]}, {"$set": {"tags": normalize_tags(note.get("tags"))}}))
+        if len(ops) >= batch:
+            if not dry_run:
+                db.notes.bulk_write(ops, ordered=False)
+            ops = []
+    if ops and not dry_run:
+        db.notes.bulk_write(ops, ordered=False)
+
+    if not dry_run:
+        MongoRepository(db).rebuild_tag_counts()
+    return {"converted": converted, "tags": db.tag_counts.count_documents({})}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    start  = time.perf_counter()
+    result = run(connect(), args.batch, args.dry_run)
+    print(f"✅  Converted {result['converted']} notes; {result['tags']} (user, tag) counts "
+          f"in {time.perf_counter() - start:.1f}s{' (dry run)' if args.dry_run else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+models/dedup.py — MinHash signatures and LSH band keys for near-duplicate notes
+
+A note's text is cut into overlapping word 3-grams ("shingles"). Its
+MinHash signature keeps, for each of NUM_PERM hash functions, the smallest
+hash of any shingle; the fraction of positions where two signatures agree
+estimates the Jaccard similarity of the two shingle sets.
+
+The signature is split into BANDS bands of ROWS values, each hashed to one
+integer key stored with the note (`lsh`). Two notes with similarity s share
+at least one key with probability 1 - (1 - s^ROWS)^BANDS — about 0.87 at
+s = 0.5 and 0.98 at s = 0.6 — so candidates come from an index lookup
+instead of comparing every pair, and are then checked on the signatures
+(which estimate s to within about ±0.035 near 0.8).
+
+Signatures are stable across processes and versions: fixed hash
+coefficients, crc32 shingle hashes. numpy speeds up long notes; the
+pure-Python path gives the same values.
+"""
+
+import random
+import re
+import struct
+import zlib
+
+try:
+    import numpy as np
+except ImportError:          # optional — same signatures, computed in Python
+    np = None
+
+NUM_PERM     = 128
+BANDS        = 32
+ROWS         = NUM_PERM // BANDS
+SHINGLE      = 3
+MIN_SHINGLES = 8               # shorter notes get no signature (every stub would match)
+
+_PRIME  = (1 << 61) - 1
+_rng    = random.Random(0x5EED)
+_A      = [_rng.randrange(1, 1 << 31) for _ in range(NUM_PERM)]
+_B      = [_rng.randrange(0, 1 << 31) for _ in range(NUM_PERM)]
+_WORDS  = re.compile(r"\w+")
+_MASK   = (1 << 32) - 1
+
+
+def shingles(text: str) -> set:
+    """crc32 hashes of the text's lower-cased word 3-grams."""
+    words = _WORDS.findall((text or "").lower())
+    return {
+        zlib.crc32(" ".join(words[i:i + SHINGLE]).encode())
+        for i in range(len(words) - SHINGLE + 1)
+    }
+
+
+def minhash(text: str):
+    """NUM_PERM-value signature of a note's text, or None if it is too short."""
+    hashes = shingles(text)
+    if len(hashes) < MIN_SHINGLES:
+        return None
+    if np is not None:
+        h = np.fromiter(hashes, np.uint64, len(hashes))
+        # (a·h + b) mod p fits in uint64: a, b < 2^31 and h < 2^32
+        a = np.array(_A, np.uint64)[:, None]
+        b = np.array(_B, np.uint64)[:, None]
+        return (((a * h + b) % np.uint64(_PRIME)) & np.uint64(_MASK)).min(axis=1).tolist()
+    return [min(((a * h + b) % _PRIME) & _MASK for h in hashes) for a, b in zip(_A, _B)]
+
+
+def lsh_keys(signature) -> list:
+    """One integer per band: band number in the high bits, crc32 of its rows below."""
+    if not signature:
+        return []
+    return [
+        (band << 32) | zlib.crc32(struct.pack(f"<{ROWS}I", *signature[band * ROWS:(band + 1) * ROWS]))
+        for band in range(BANDS)
+    ]
+
+
+def similarity(sig_a, sig_b) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    if not sig_a or not sig_b:
+        return 0.0
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+def dedup_fields(text: str) -> dict:
+    """The `minhash` / `lsh` fields stored with a note."""
+    signature = minhash(text)
+    return {"minhash": signature, "lsh": lsh_keys(signature)}
+
+
+def clusters(candidates: list, signatures: dict, threshold: float) -> list:
+    """
+    Group notes into near-duplicate clusters.
+
+    candidates: lists of note ids that share an LSH key; signatures: id →
+    signature. Pairs are verified on the signatures and linked with a
+    union-find, so a cluster is every note reachable through pairs at or
+    above `threshold`. Returns [(ids, lowest linking similarity)], largest
+    cluster first.
+    """
+    parent = {}
+
+    def find(x):
+        while parent.get(x, x) != x:
+            parent[x] = parent.get(parent[x], parent[x])
+            x = parent[x]
+        return x
+
+    weakest = {}
+    for bucket in candidates:
+        for i, a in enumerate(bucket):
+            for b in bucket[i + 1:]:
+                ra, rb = find(a), find(b)
+                if ra == rb:
+                    continue
+                score = similarity(signatures.get(a), signatures.get(b))
+                if score >= threshold:
+                    parent[rb] = ra
+                    weakest[ra] = min(score, weakest.get(ra, 1.0), weakest.get(rb, 1.0))
+
+    groups = {}
+    for x in parent:
+        groups.setdefault(find(x), []).append(x)
+    for root, members in groups.items():
+        if root not in members:
+            members.append(root)
+    result = [(members, weakest[root]) for root, members in groups.items()]
+    result.sort(key=lambda c: (-len(c[0]), -c[1]))
+    return result
@@ -0,0 +1,303 @@
+"""
+models/export.py — Zip archive writing and note renderers for GET /api/export
+
+ZipStream drives `zipfile` over a write-only sink that is emptied after
+every write, so an archive of any size goes out in small chunks: entries
+use data descriptors (sizes after the data) because the sink can't seek.
+Only the central directory — a few hundred bytes per file — is kept until
+the end.
+"""
+
+import html
+import json
+import mimetypes
+import re
+import zipfile
+from datetime import datetime
+from html.parser import HTMLParser
+from models.note import iso, human_time
+
+CHUNK = 256 * 1024
+
+# Already-compressed media is stored as is
+_STORED_TYPES = ("image/jpeg", "image/png", "image/gif", "image/webp", "video/", "audio/", "application/zip")
+
+_UNSAFE_RX = re.compile(r'[\x00-\x1f/\\:*?"<>|]+')
+
+
+class _Sink:
+    """Write-only file object for ZipFile; `drain` hands back what was written."""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class ZipStream:
+    """
+    Build a zip archive piece by piece; every method returns (or yields)
+    the bytes to send next.
+
+        z = ZipStream()
+        yield z.add("a/b.md", b"...")
+        yield from z.add_file("media/x.png", fileobj, "image/png")
+        yield z.close()
+    """
+
+    def __init__(self):
+        self.sink = _Sink()
+        self.zip  = zipfile.ZipFile(self.sink, "w", zipfile.ZIP_DEFLATED, compresslevel=6)
+
+    def add(self, name: str, data: bytes, mimetype: str = "") -> bytes:
+        self.zip.writestr(self._info(name, mimetype), data)
+        return self.sink.drain()
+
+    def add_file(self, name: str, fileobj, mimetype: str = "", size: int = 0):
+        """Copy a file-like object into the archive CHUNK bytes at a time."""
+        with self.zip.open(self._info(name, mimetype), "w", force_zip64=size > zipfile.ZIP64_LIMIT) as out:
+            while True:
+                chunk = fileobj.read(CHUNK)
+                if not chunk:
+                    break
+                out.write(chunk)
+                yield self.sink.drain()
+        yield self.sink.drain()
+
+    def _info(self, name: str, mimetype: str = "") -> zipfile.ZipInfo:
+        info = zipfile.ZipInfo(name, date_time=_now())
+        info.compress_type = zipfile.ZIP_STORED if mimetype.startswith(_STORED_TYPES) else zipfile.ZIP_DEFLATED
+        return info
+
+    def open(self, name: str):
+        """Writable entry for content produced bit by bit (close it before adding more)."""
+        return self.zip.open(self._info(name), "w", force_zip64=True)
+
+    def drain(self) -> bytes:
+        return self.sink.drain()
+
+    def close(self) -> bytes:
+        self.zip.close()
+        return self.sink.drain()
+
+
+def _now() -> tuple:
+    return datetime.now().timetuple()[:6]
+
+
+def safe_name(name: str, fallback: str = "Untitled", limit: int = 80) -> str:
+    """A subject / chapter / note name usable as a path segment on any OS."""
+    name = _UNSAFE_RX.sub("_", (name or "").strip()).strip(" .")
+    return name[:limit].rstrip(" .") or fallback
+
+
+def unique_name(name: str, ext: str, used: set) -> str:
+    """`name.ext`, or `name (2).ext` … if already taken in this folder."""
+    candidate, n = f"{name}{ext}", 1
+    while candidate.lower() in used:
+        n += 1
+        candidate = f"{name} ({n}){ext}"
+    used.add(candidate.lower())
+    return candidate
+
+
+def media_extension(mimetype: str) -> str:
+    return {"image/jpeg": ".jpg", "image/svg+xml": ".svg"}.get(mimetype) or mimetypes.guess_extension(mimetype or "") or ".bin"
+
+
+# ── Renderers ─────────────────────────────────────────────────────────────────
+
+def render_markdown(note: dict, content: str, subject: str, chapter: str) -> bytes:
+    front = [
+        "---",
+        f"title: {json.dumps(note.get('title') or 'Untitled', ensure_ascii=False)}",
+        f"subject: {json.dumps(subject, ensure_ascii=False)}",
+        f"chapter: {json.dumps(chapter, ensure_ascii=False)}",
+        f"tags: {json.dumps(note.get('tags') or [], ensure_ascii=False)}",
+        f"created: {iso(note.get('created_at')) or ''}",
+        f"updated: {iso(note.get('updated_at')) or ''}",
+        "---",
+        "",
+    ]
+    return ("\n".join(front) + html_to_markdown(content) + "\n").encode("utf-8")
+
+
+def render_html(note: dict, content: str, subject: str, chapter: str) -> bytes:
+    title = html.escape(note.get("title") or "Untitled")
+    tags  = " ".join(f"<span>#{html.escape(t)}</span>" for t in note.get("tags") or [])
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>body{{font-family:system-ui,sans-serif;max-width:46rem;margin:2rem auto;padding:0 1rem;line-height:1.6}}
+header p{{color:#666;font-size:.9rem}}header span{{margin-right:.5rem}}img,video{{max-width:100%}}</style>
+</head><body>
+<header><h1>{title}</h1><p>{html.escape(subject)} › {html.escape(chapter)} · updated {html.escape(human_time(note.get("updated_at")))}</p><p>{tags}</p></header>
+<article>
+{content}
+</article>
+</body></html>
+""".encode("utf-8")
+
+
+def render_json_line(note: dict, content: str, subject: str, chapter: str) -> bytes:
+    return (json.dumps({
+        "id":           str(note["_id"]),
+        "title":        note.get("title") or "Untitled",
+        "subject_id":   str(note.get("subject_id", "")),
+        "subject_name": subject,
+        "chapter_id":   str(note.get("chapter_id", "")),
+        "chapter_name": chapter,
+        "tags":         note.get("tags") or [],
+        "created_at":   iso(note.get("created_at")),
+        "updated_at":   iso(note.get("updated_at")),
+        "content":      content,
+    }, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+# ── HTML → Markdown ───────────────────────────────────────────────────────────
+
+class _Markdown(HTMLParser):
+    """Just enough Markdown for editor output: headings, emphasis, lists,
+    links, images / video, code, quotes, rules and simple tables."""
+
+    _INLINE = {"strong": "**", "b": "**", "em": "*", "i": "*", "s": "~~", "strike": "~~", "del": "~~"}
+    _BLOCKS = {"p", "div", "section", "article", "header", "footer", "figure", "table", "h1", "h2",
+               "h3", "h4", "h5", "h6", "ul", "ol", "pre", "blockquote", "hr"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out   = []
+        self.gap   = 0             # newlines owed before the next text …
+        self.gap_q = 0             # … and the quote depth of the blank lines among them
+        self.lists = []            # [kind, counter] per open list
+        self.links = []            # hrefs of open <a>
+        self.quote = 0
+        self.pre   = False
+        self.rows  = 0             # table rows so far / cells in the current one
+        self.cells = 0
+
+    # Output helpers
+    def _text(self, s: str):
+        if not s:
+            return
+        if self.gap:
+            if self.out:
+                self.out[-1] = self.out[-1].rstrip(" ")
+                blank = "\n" + ">" * self.gap_q
+                self.out.append(blank * (self.gap - 1) + "\n" + "> " * self.quote)
+            self.gap = 0
+        self.out.append(s)
+
+    def _break(self, lines: int = 2):
+        """End the current block: the next text starts `lines` newlines down."""
+        self.gap_q = min(self.gap_q, self.quote) if self.gap else self.quote
+        self.gap   = max(self.gap, lines)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in ("ul", "ol") and self.lists:
+            self._break(1)                          # nested list
+        elif tag in self._BLOCKS:
+            self._break()
+        if tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            self._text("#" * int(tag[1]) + " ")
+        elif tag in self._INLINE:
+            self._text(self._INLINE[tag])
+        elif tag == "code" and not self.pre:
+            self._text("`")
+        elif tag == "pre":
+            self.pre = True
+            self._text("```\n")
+        elif tag == "br":
+            self._text("  \n" + "> " * self.quote)
+        elif tag == "hr":
+            self._text("---")
+            self._break()
+        elif tag == "blockquote":
+            self.quote += 1
+        elif tag in ("ul", "ol"):
+            self.lists.append([tag, 0])
+        elif tag == "li":
+            self._break(1)
+            indent = "  " * max(0, len(self.lists) - 1)
+            if self.lists and self.lists[-1][0] == "ol":
+                self.lists[-1][1] += 1
+                self._text(f"{indent}{self.lists[-1][1]}. ")
+            else:
+                self._text(f"{indent}- ")
+        elif tag == "a":
+            self.links.append(attrs.get("href") or "")
+            self._text("[")
+        elif tag == "img":
+            self._text(f"![{attrs.get('alt') or ''}]({attrs.get('src') or ''})")
+        elif tag in ("video", "audio", "source", "iframe") and attrs.get("src"):
+            self._text(f"[{tag}]({attrs['src']})")
+        elif tag == "table":
+            self.rows = 0
+        elif tag == "tr":
+            self.cells = 0
+            self._break(1)
+            self._text("|")
+        elif tag in ("td", "th"):
+            self.cells += 1
+            self._text(" ")
+
+    def handle_endtag(self, tag):
+        if tag in self._INLINE:
+            self._text(self._INLINE[tag])
+        elif tag == "code" and not self.pre:
+            self._text("`")
+        elif tag == "pre":
+            self.pre = False
+            self._text("\n```")
+            self._break()
+        elif tag == "a" and self.links:
+            self._text(f"]({self.links.pop()})")
+        elif tag == "blockquote":
+            self._break()
+            self.quote = max(0, self.quote - 1)
+        elif tag in ("ul", "ol"):
+            if self.lists:
+                self.lists.pop()
+            if not self.lists:
+                self._break()
+        elif tag in ("td", "th"):
+            self._text(" |")
+        elif tag == "tr":
+            self.rows += 1
+            if self.rows == 1:                      # Markdown tables need a header rule
+                self._break(1)
+                self._text("|" + " --- |" * self.cells)
+        elif tag in self._BLOCKS:
+            self._break()
+
+    def handle_data(self, data):
+        if self.pre:
+            self._text(data)
+            return
+        data = re.sub(r"\s+", " ", data)
+        if self.gap or not self.out or self.out[-1].endswith((" ", "\n")):
+            data = data.lstrip(" ")
+        self._text(data)
+
+
+def html_to_markdown(content: str) -> str:
+    parser = _Markdown()
+    parser.feed(content or "")
+    parser.close()
+    text = "".join(parser.out)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
@@ -0,0 +1,61 @@
+"""
+models/media.py — Pull inline data-URL media out of note HTML
+
+The editor embeds uploads as `data:<mime>;base64,...` URLs. On write they
+are stored once in the media store and replaced by `/api/media/<sha256>`,
+so autosaves, searches and stats never carry the bytes again.
+
+Only MEDIA_TYPES are extracted: the media URL is public and served from
+the API's origin, so a blob must never be something a browser would run
+(HTML, SVG, JavaScript...). Other data URLs stay inline in the note.
+"""
+
+import base64
+import binascii
+import hashlib
+import re
+
+MEDIA_URL = "/api/media/"
+
+_DATA_URL_RX = re.compile(r"data:([\w.+-]+/[\w.+-]+);base64,([A-Za-z0-9+/=]+)")
+_DIGEST_RX   = re.compile(r"^[0-9a-f]{64}$")
+
+# Raster images, audio and video; no image/svg+xml (it can carry scripts)
+MEDIA_TYPES = frozenset({
+    "image/png", "image/jpeg", "image/gif", "image/webp", "image/avif", "image/bmp",
+    "audio/mpeg", "audio/mp4", "audio/aac", "audio/ogg", "audio/wav", "audio/webm", "audio/flac",
+    "video/mp4", "video/webm", "video/ogg", "video/quicktime",
+})
+
+
+def is_media_type(mimetype: str) -> bool:
+    return (mimetype or "").lower() in MEDIA_TYPES
+
+
+def is_digest(value: str) -> bool:
+    return bool(_DIGEST_RX.match(value or ""))
+
+
+def extract_media(content: str, store, stored: list = None) -> str:
+    """
+    Store every data-URL blob in `content` and rewrite it to a media URL.
+    The digests of the blobs rewritten are appended to `stored` if given.
+    """
+    if not content or "data:" not in content:
+        return content
+
+    def _replace(match):
+        mimetype, payload = match.group(1).lower(), match.group(2)
+        if mimetype not in MEDIA_TYPES:
+            return match.group(0)
+        try:
+            data = base64.b64decode(payload, validate=True)
+        except (binascii.Error, ValueError):
+            return match.group(0)
+        digest = hashlib.sha256(data).hexdigest()
+        store.put(digest, data, mimetype)
+        if stored is not None:
+            stored.append(digest)
+        return MEDIA_URL + digest
+
+    return _DATA_URL_RX.sub(_replace, content)
@@ -4,13 +4,144 @@ models/note.py — Document builders and serializers for
 """
 
 from datetime import datetime
-from bson import ObjectId
+from bson import ObjectId, Binary
+import os
+import re
+import zlib
+from models.dedup import dedup_fields
+
+try:
+    import zstandard
+except ImportError:          # optional — falls back to zlib
+    zstandard = None
+
+
+# Content larger than this (UTF-8 bytes) is stored compressed.
+COMPRESS_THRESHOLD = int(os.environ.get("CONTENT_COMPRESS_THRESHOLD", 8192))
+
+_TAG_RX      = re.compile(r"<[^>]+>")
+_OPEN_TAG_RX = re.compile(r"<[^>]*$")
+
+# Listings that show a snippet read only this much of a note's text/HTML.
+SNIPPET_SOURCE_CHARS = 1000
+
+MAX_TAGS    = 20
+MAX_TAG_LEN = 40
+
+DATE_FIELDS = ("created_at", "updated_at", "deleted_at")
+
+
+# ── Content codec ─────────────────────────────────────────────────────────────
+
+def strip_html(html: str) -> str:
+    """Drop HTML tags (and with them any inline data-URL media)."""
+    return _TAG_RX.sub("", html or "")
+
+
+def make_snippet(text: str, length: int = 120) -> str:
+    return text[:length] + ("…" if len(text) > length else "")
+
+
+def prefix_snippet(prefix: str, length: int = 120) -> str:
+    """Snippet from the first SNIPPET_SOURCE_CHARS of a note's text or HTML,
+    which may end inside a tag."""
+    return make_snippet(strip_html(_OPEN_TAG_RX.sub("", prefix or "")), length)
+
+
+def pack_content(content: str) -> dict:
+    """
+    Build the stored content fields for a note.
+
+    Content above COMPRESS_THRESHOLD is stored as a compressed BSON binary
+    marked with `content_codec`. Compressed notes also keep their
+    HTML-stripped text in `content_text`, so search, snippets and word
+    counts never need to decompress; for plain notes it stays None and
+    readers fall back to `content`.
+
+    Every note also gets its `minhash` signature and `lsh` band keys for
+    near-duplicate detection (models/dedup.py).
+    """
+    content = content or ""
+    text    = strip_html(content)
+    fields  = {"content": content, "content_codec": None, "content_text": None, **dedup_fields(text)}
+
+    raw = content.encode("utf-8")
+    if len(raw) < COMPRESS_THRESHOLD:
+        return fields
+
+    # Text-heavy notes gain little once the stripped text is stored beside
+    # them — only compress when the pair is clearly smaller than the HTML.
+    budget = len(raw) * 0.9 - len(text.encode("utf-8"))
+    if budget <= 0:
+        return fields
+
+    if zstandard is not None:
+        packed, codec = zstandard.ZstdCompressor(level=3).compress(raw), "zstd"
+    else:
+        packed, codec = zlib.compress(raw, 6), "zlib"
+
+    if len(packed) < budget:
+        fields.update(content=Binary(packed), content_codec=codec, content_text=text)
+    return fields
+
+
+def unpack_content(doc: dict) -> str:
+    """Return a note's content as a string, decompressing it if needed."""
+    content = doc.get("content") or ""
+    codec   = doc.get("content_codec")
+    if not codec:
+        return content
+    if codec == "zlib":
+        return zlib.decompress(content).decode("utf-8")
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Note content is zstd-compressed but `zstandard` is not installed")
+        return zstandard.ZstdDecompressor().decompress(content).decode("utf-8")
+    raise ValueError(f"Unknown content codec: {codec}")
+
+
+def note_text(doc: dict) -> str:
+    """HTML-stripped text of a note, without decompressing when possible."""
+    if doc.get("content_text") is not None:
+        return doc["content_text"]
+    return strip_html(unpack_content(doc))
+
+
+# ── Timestamps ────────────────────────────────────────────────────────────────
+
+def utcnow() -> datetime:
+    """Now, as stored: naive UTC cut to the millisecond (all a BSON date keeps)."""
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def as_datetime(value):
+    """A stored timestamp as a datetime. Documents written before dates were
+    native hold ISO strings until migrations/native_dates.py has run."""
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return value
+
+
+def iso(value):
+    """Timestamp as the API returns it: ISO 8601, UTC, no offset."""
+    value = as_datetime(value)
+    return value.isoformat() if value else None
+
+
+def human_time(value) -> str:
+    """Display form the web app shows, e.g. '05 Mar 2025, 02:14 PM'."""
+    value = as_datetime(value)
+    return value.strftime("%d %b %Y, %I:%M %p") if value else ""
 
 
 # ── Serializers ───────────────────────────────────────────────────────────────
 
 def serialize_id(doc: dict) -> dict:
-    """Convert _id ObjectId → string 'id' field."""
+    """Convert _id ObjectId → string 'id' field, and timestamps → ISO strings."""
     if doc and "_id" in doc:
         doc = dict(doc)
         doc["id"] = str(doc.pop("_id"))
@@ -18,6 +149,9 @@ def serialize_id(doc: dict) -> dict:
         for key in ("user_id", "subject_id", "chapter_id"):
             if key in doc and isinstance(doc[key], ObjectId):
                 doc[key] = str(doc[key])
+        for key in DATE_FIELDS:
+            if key in doc:
+                doc[key] = iso(doc[key])
     return doc
 
 
@@ -32,14 +166,45 @@ def serialize_chapter(doc: dict) -> dict:
 
 
 def serialize_note(doc: dict) -> dict:
+    """Serialize a note; content is decompressed only if it was fetched."""
     d = serialize_id(dict(doc))
+    if "updated_at" in doc:
+        d["modified"] = human_time(doc["updated_at"])
+    if "content" in d:
+        d["content"] = unpack_content(d)
+    if "tags" in d:
+        d["tags"] = normalize_tags(d["tags"])
+    d.pop("content_codec", None)
+    d.pop("content_text",  None)
+    d.pop("minhash",       None)
+    d.pop("lsh",           None)
     return d
 
 
+# ── Tags ──────────────────────────────────────────────────────────────────────
+
+def normalize_tags(tags) -> list:
+    """
+    Comma-separated string or list → unique, trimmed, lower-case tags in
+    their original order. Notes written before tags were arrays still hold
+    the string form until migrations/normalize_tags.py has run.
+    """
+    if not tags:
+        return []
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    result = []
+    for tag in tags:
+        tag = " ".join(str(tag).split()).lower()[:MAX_TAG_LEN]
+        if tag and tag not in result:
+            result.append(tag)
+    return result[:MAX_TAGS]
+
+
 # ── Document builders ─────────────────────────────────────────────────────────
 
 def new_subject_doc(user_id: str, name: str, color: str = "#6C63FF", icon: str = "📚") -> dict:
-    now = datetime.utcnow().isoformat()
+    now = utcnow()
     return {
         "user_id":    ObjectId(user_id),
         "name":       name.strip(),
@@ -51,7 +216,7 @@ def new_subject_doc(user_id: str, name: str, color: str = "#6C63FF", icon: str =
 
 
 def new_chapter_doc(user_id: str, subject_id: str, name: str, icon: str = "📑") -> dict:
-    now = datetime.utcnow().isoformat()
+    now = utcnow()
     return {
         "user_id":    ObjectId(user_id),
         "subject_id": ObjectId(subject_id),
@@ -63,20 +228,15 @@ def new_chapter_doc(user_id: str, subject_id: str, name: str, icon: str = "📑"
 
 
 def new_note_doc(user_id: str, subject_id: str, chapter_id: str,
-                 title: str = "New Note", content: str = "", tags: str = "") -> dict:
-    now = datetime.utcnow().isoformat()
+                 title: str = "New Note", content: str = "", tags=None) -> dict:
+    now = utcnow()
     return {
         "user_id":    ObjectId(user_id),
         "subject_id": ObjectId(subject_id),
         "chapter_id": ObjectId(chapter_id),
         "title":      title.strip() or "Untitled",
-        "content":    content,
-        "tags":       tags,
+        **pack_content(content),
+        "tags":       normalize_tags(tags),
         "created_at": now,
         "updated_at": now,
-        "modified":   _human_time(),
     }
-
-
-def _human_time() -> str:
-    return datetime.utcnow().strftime("%d %b %Y, %I:%M %p")
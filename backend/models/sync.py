@@ -0,0 +1,66 @@
+"""
+models/sync.py — Tombstones for delta sync
+
+Every subject, chapter and note write is stamped with `seq`, drawn from a
+per-user counter (Repository.next_seq), and every delete leaves a
+tombstone with its own `seq`. A client that has seen everything up to N
+asks for `seq > N`.
+
+Seqs are reserved before the write that carries them commits, so two
+writes in flight can become visible out of order: N+1 before N. A
+client must not be told it has seen everything up to N+1 then, or it
+would never ask for N. resume_point() keeps the cursor handed out below
+any seq reserved in the last IN_FLIGHT_SECONDS that the client hasn't
+received, so changes after it may be sent again; clients dedupe by id
+and seq.
+"""
+
+from bson import ObjectId
+from config.events import publish_change
+from models.note import utcnow
+
+# A reserved seq not visible for longer than this was never written (the
+# request failed, or a later write to the same document replaced it);
+# far longer than a write's query budget. Writes that match nothing
+# release their seq at once (Repository.release_seq).
+IN_FLIGHT_SECONDS = 10
+
+
+def resume_point(repo, user_id, since: int, seen) -> int:
+    """
+    The cursor to hand a client that had everything up to `since` and has
+    now been sent the changes with seqs `seen`: the highest of them, unless
+    a seq below that was reserved recently and not sent — then just below it.
+    """
+    seen = set(seen)
+    last = max(seen, default=since)
+    for first, end in repo.reserved_seqs(ObjectId(user_id), IN_FLIGHT_SECONDS):
+        for seq in range(max(first, since + 1), min(end, last) + 1):
+            if seq not in seen:
+                last = seq - 1
+                break
+    return last
+
+
+def write_tombstones(repo, user_id: str, deleted: list):
+    """
+    Record deletions, given as (kind, ObjectId) pairs, for delta sync and
+    announce them to open event streams.
+    """
+    if not deleted:
+        return
+    last = repo.next_seq(ObjectId(user_id), len(deleted))
+    now  = utcnow()
+    tombstones = [
+        {
+            "user_id":    ObjectId(user_id),
+            "kind":       kind,
+            "ref_id":     ref_id,
+            "seq":        last - len(deleted) + 1 + i,
+            "deleted_at": now,
+        }
+        for i, (kind, ref_id) in enumerate(deleted)
+    ]
+    repo.insert_tombstones(tombstones)
+    for t in tombstones:
+        publish_change(user_id, t["kind"], t["ref_id"], t["seq"], "delete")
@@ -7,6 +7,7 @@ import jwt
 import os
 from datetime import datetime, timedelta
 from bson import ObjectId
+from models.note import utcnow, iso
 
 
 def hash_password(plain: str) -> str:
@@ -35,18 +36,19 @@ def serialize_user(user: dict) -> dict:
         "id":         str(user["_id"]),
         "username":   user.get("username", ""),
         "email":      user.get("email", ""),
-        "created_at": user.get("created_at", ""),
+        "created_at": iso(user.get("created_at")) or "",
         "avatar":     user.get("avatar", "🎓"),
     }
 
 
 def new_user_doc(username: str, email: str, password: str) -> dict:
     """Build a new user document ready to insert into MongoDB."""
+    now = utcnow()
     return {
         "username":   username.strip(),
         "email":      email.strip().lower(),
         "password":   hash_password(password),
         "avatar":     "🎓",
-        "created_at": datetime.utcnow().isoformat(),
-        "updated_at": datetime.utcnow().isoformat(),
+        "created_at": now,
+        "updated_at": now,
     }
@@ -8,12 +8,12 @@ routes/auth.py — User Authentication
 """
 
 from flask import Blueprint, request, jsonify, current_app, g
-from pymongo.errors import DuplicateKeyError
 from models.user import (
     new_user_doc, verify_password, generate_token, serialize_user
 )
+from models.note import utcnow
 from middleware.auth import token_required
-from config.db import get_db
+from storage import get_repo, DuplicateError
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -43,14 +43,13 @@ def signup():
     if errors:
         return jsonify({"error": "Validation failed", "details": errors}), 400
 
-    db = get_db()
+    repo = get_repo()
     try:
-        doc    = new_user_doc(data["username"], data["email"], data["password"])
-        result = db.users.insert_one(doc)
-        user   = db.users.find_one({"_id": result.inserted_id})
+        doc     = new_user_doc(data["username"], data["email"], data["password"])
+        user_id = repo.insert_user(doc)
 
         token = generate_token(
-            str(result.inserted_id),
+            str(user_id),
             current_app.config["SECRET_KEY"],
             current_app.config.get("JWT_EXPIRY_HOURS", 24),
         )
@@ -58,11 +57,11 @@ def signup():
         return jsonify({
             "message": "Account created successfully! 🎉",
             "token":   token,
-            "user":    serialize_user(user),
+            "user":    serialize_user(doc),
         }), 201
 
-    except DuplicateKeyError as e:
-        field = "email" if "email" in str(e) else "username"
+    except DuplicateError as e:
+        field = "email" if e.field == "email" else "username"
         return jsonify({"error": f"That {field} is already registered"}), 409
 
     except Exception as e:
@@ -80,8 +79,7 @@ def login():
     if not email or not password:
         return jsonify({"error": "Email and password are required"}), 400
 
-    db   = get_db()
-    user = db.users.find_one({"email": email})
+    user = get_repo().find_user_by_email(email)
 
     if not user or not verify_password(password, user["password"]):
         return jsonify({"error": "Invalid email or password"}), 401
@@ -111,7 +109,7 @@ def get_profile():
 def update_profile():
     """Update the current user's username or avatar."""
     data = request.get_json(silent=True) or {}
-    db   = get_db()
+    repo = get_repo()
 
     updates = {}
     if "username" in data and len(data["username"].strip()) >= 3:
@@ -122,11 +120,12 @@ def update_profile():
     if not updates:
         return jsonify({"error": "No valid fields to update"}), 400
 
-    from datetime import datetime
-    updates["updated_at"] = datetime.utcnow().isoformat()
+    updates["updated_at"] = utcnow()
 
-    db.users.update_one({"_id": g.user["_id"]}, {"$set": updates})
-    updated = db.users.find_one({"_id": g.user["_id"]})
+    try:
+        updated = repo.update_user(g.user["_id"], updates)
+    except DuplicateError:
+        return jsonify({"error": "That username is already taken"}), 409
 
     return jsonify({
         "message": "Profile updated!",
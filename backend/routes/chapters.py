@@ -9,11 +9,12 @@ routes/chapters.py — Chapter CRUD
 from flask import Blueprint, request, jsonify, g
 from bson import ObjectId
 from bson.errors import InvalidId
-from pymongo.errors import DuplicateKeyError
-from datetime import datetime
 from middleware.auth import token_required
-from models.note import new_chapter_doc, serialize_chapter
-from config.db import get_db
+from middleware.cache import invalidates_cache
+from models.note import new_chapter_doc, serialize_chapter, utcnow
+from models.sync import write_tombstones
+from config.events import publish_change
+from storage import get_repo, DuplicateError
 
 chapters_bp = Blueprint("chapters", __name__)
 
@@ -37,17 +38,17 @@ def list_chapters():
     if not sid:
         return jsonify({"error": "Invalid subject_id"}), 400
 
-    db = get_db()
+    repo = get_repo()
     # Verify subject belongs to user
-    subj = db.subjects.find_one({"_id": sid, "user_id": ObjectId(g.user_id)})
+    subj = repo.find_subject(sid, ObjectId(g.user_id))
     if not subj:
         return jsonify({"error": "Subject not found"}), 404
 
-    chapters = list(db.chapters.find({"subject_id": sid}).sort("name", 1))
+    chapters = repo.list_chapters(sid)
     result = []
     for ch in chapters:
         c = serialize_chapter(ch)
-        c["note_count"] = db.notes.count_documents({"chapter_id": ch["_id"]})
+        c["note_count"] = repo.count_notes(chapter_id=ch["_id"])
         result.append(c)
 
     return jsonify({"chapters": result, "total": len(result)}), 200
@@ -55,6 +56,7 @@ def list_chapters():
 
 @chapters_bp.route("", methods=["POST"])
 @token_required
+@invalidates_cache
 def create_chapter():
     """Create a new chapter inside a subject."""
     data       = request.get_json(silent=True) or {}
@@ -73,34 +75,33 @@ def create_chapter():
     if not sid:
         return jsonify({"error": "Invalid subject_id"}), 400
 
-    db = get_db()
-    subj = db.subjects.find_one({"_id": sid, "user_id": ObjectId(g.user_id)})
+    repo = get_repo()
+    subj = repo.find_subject(sid, ObjectId(g.user_id))
     if not subj:
         return jsonify({"error": "Subject not found"}), 404
 
     try:
-        doc    = new_chapter_doc(g.user_id, subject_id, name, icon)
-        result = db.chapters.insert_one(doc)
-        created = serialize_chapter(db.chapters.find_one({"_id": result.inserted_id}))
+        doc        = new_chapter_doc(g.user_id, subject_id, name, icon)
+        doc["seq"] = repo.next_seq(ObjectId(g.user_id))
+        chapter_id = repo.insert_chapter(doc)
+        publish_change(g.user_id, "chapter", chapter_id, doc["seq"])
+        created = serialize_chapter(doc)
         created["note_count"] = 0
         return jsonify({"message": f'Chapter "{name}" created! 📑', "chapter": created}), 201
-    except DuplicateKeyError:
+    except DuplicateError:
+        repo.release_seq(ObjectId(g.user_id), doc["seq"])
         return jsonify({"error": f'Chapter "{name}" already exists in this subject'}), 409
 
 
 @chapters_bp.route("/<chapter_id>", methods=["PUT"])
 @token_required
+@invalidates_cache
 def update_chapter(chapter_id):
     """Update a chapter's name or icon."""
     cid = _valid_id(chapter_id)
     if not cid:
         return jsonify({"error": "Invalid chapter ID"}), 400
 
-    db = get_db()
-    ch = db.chapters.find_one({"_id": cid, "user_id": ObjectId(g.user_id)})
-    if not ch:
-        return jsonify({"error": "Chapter not found"}), 404
-
     data    = request.get_json(silent=True) or {}
     updates = {}
     if "name" in data and data["name"].strip():
@@ -111,31 +112,42 @@ def update_chapter(chapter_id):
     if not updates:
         return jsonify({"error": "Nothing to update"}), 400
 
-    updates["updated_at"] = datetime.utcnow().isoformat()
+    repo = get_repo()
+    uid  = ObjectId(g.user_id)
+    updates["updated_at"] = utcnow()
+    updates["seq"]        = repo.next_seq(uid)
 
     try:
-        db.chapters.update_one({"_id": cid}, {"$set": updates})
-        updated = serialize_chapter(db.chapters.find_one({"_id": cid}))
-        return jsonify({"message": "Chapter updated!", "chapter": updated}), 200
-    except DuplicateKeyError:
+        # Ownership is part of the update's filter: no separate lookup
+        ch = repo.update_chapter(cid, updates, uid)
+        if not ch:
+            repo.release_seq(uid, updates["seq"])
+            return jsonify({"error": "Chapter not found"}), 404
+        publish_change(g.user_id, "chapter", cid, updates["seq"])
+        return jsonify({"message": "Chapter updated!", "chapter": serialize_chapter(ch)}), 200
+    except DuplicateError:
+        repo.release_seq(uid, updates["seq"])
         return jsonify({"error": f'Chapter "{updates.get("name")}" already exists'}), 409
 
 
 @chapters_bp.route("/<chapter_id>", methods=["DELETE"])
 @token_required
+@invalidates_cache
 def delete_chapter(chapter_id):
     """Delete a chapter and all its notes."""
     cid = _valid_id(chapter_id)
     if not cid:
         return jsonify({"error": "Invalid chapter ID"}), 400
 
-    db = get_db()
-    ch = db.chapters.find_one({"_id": cid, "user_id": ObjectId(g.user_id)})
+    repo = get_repo()
+    ch   = repo.find_chapter(cid, ObjectId(g.user_id))
     if not ch:
         return jsonify({"error": "Chapter not found"}), 404
 
-    notes_del = db.notes.delete_many({"chapter_id": cid}).deleted_count
-    db.chapters.delete_one({"_id": cid})
+    note_ids  = repo.delete_chapter(cid)
+    notes_del = len(note_ids)
+
+    write_tombstones(repo, g.user_id, [("note", i) for i in note_ids] + [("chapter", cid)])
 
     return jsonify({
         "message":       f'Chapter "{ch["name"]}" deleted',
@@ -4,18 +4,23 @@ routes/dashboard.py — Dashboard analytics API
   GET /api/dashboard/activity → Last 35 days of activity heatmap data
 """
 
-from flask import Blueprint, jsonify, g
+from flask import Blueprint, current_app, jsonify, g
 from bson import ObjectId
+from config import deadline
 from datetime import datetime, timedelta
 from middleware.auth import token_required
-from config.db import get_db
-import re
+from middleware.cache import cached_response
+from middleware.singleflight import single_flight
+from models.note import note_text, make_snippet, strip_html, normalize_tags, iso, human_time
+from storage import get_repo
 
 dashboard_bp = Blueprint("dashboard", __name__)
 
 
 @dashboard_bp.route("/stats", methods=["GET"])
 @token_required
+@cached_response
+@single_flight
 def get_stats():
     """
     Return comprehensive dashboard stats:
@@ -25,42 +30,31 @@ def get_stats():
       - top tags
       - 35-day activity heatmap
       - streak info
+    Out of query budget, the word count and tags may be left out and
+    named in `degraded` (DEGRADED_SECTIONS, middleware/deadline.py).
     """
-    db  = get_db()
-    uid = ObjectId(g.user_id)
+    repo = get_repo()
+    uid  = ObjectId(g.user_id)
 
     # ── Counts ────────────────────────────────────────────────────────────────
-    total_subjects = db.subjects.count_documents({"user_id": uid})
-    total_chapters = db.chapters.count_documents({"user_id": uid})
-    total_notes    = db.notes.count_documents({"user_id": uid})
-
-    # ── Word count ────────────────────────────────────────────────────────────
-    all_notes  = list(db.notes.find({"user_id": uid}, {"content": 1}))
-    total_words = 0
-    for n in all_notes:
-        plain = re.sub(r"<[^>]+>", "", n.get("content", ""))
-        words = plain.strip().split()
-        total_words += len(words) if words else 0
+    total_subjects = repo.count_subjects(uid)
+    total_chapters = repo.count_chapters(user_id=uid)
+    total_notes    = repo.count_notes(user_id=uid)
 
     # ── Recent notes ──────────────────────────────────────────────────────────
-    recent_raw = list(
-        db.notes.find({"user_id": uid})
-                .sort("updated_at", -1)
-                .limit(7)
-    )
+    recent_raw   = repo.recent_notes(uid, 7)
     recent_notes = []
     for note in recent_raw:
-        subj = db.subjects.find_one({"_id": note.get("subject_id")}, {"name": 1})
-        ch   = db.chapters.find_one({"_id": note.get("chapter_id")},  {"name": 1})
-        plain   = re.sub(r"<[^>]+>", "", note.get("content", ""))
-        snippet = plain[:120] + ("…" if len(plain) > 120 else "")
+        subj = repo.find_subject(note.get("subject_id"))
+        ch   = repo.find_chapter(note.get("chapter_id"))
+        snippet = make_snippet(note_text(note))
         recent_notes.append({
             "id":           str(note["_id"]),
             "title":        note.get("title", "Untitled"),
             "snippet":      snippet,
-            "tags":         note.get("tags", ""),
-            "modified":     note.get("modified", ""),
-            "updated_at":   note.get("updated_at", ""),
+            "tags":         normalize_tags(note.get("tags")),
+            "modified":     human_time(note.get("updated_at")),
+            "updated_at":   iso(note.get("updated_at")) or "",
             "subject_id":   str(note.get("subject_id", "")),
             "subject_name": subj["name"] if subj else "Unknown",
             "chapter_id":   str(note.get("chapter_id", "")),
@@ -68,11 +62,11 @@ def get_stats():
         })
 
     # ── Subject breakdown ─────────────────────────────────────────────────────
-    subjects_raw = list(db.subjects.find({"user_id": uid}).sort("name", 1))
+    subjects_raw = repo.list_subjects(uid)
     subject_breakdown = []
     for subj in subjects_raw:
-        note_count = db.notes.count_documents({"subject_id": subj["_id"]})
-        ch_count   = db.chapters.count_documents({"subject_id": subj["_id"]})
+        note_count = repo.count_notes(subject_id=subj["_id"])
+        ch_count   = repo.count_chapters(subject_id=subj["_id"])
         subject_breakdown.append({
             "id":            str(subj["_id"]),
             "name":          subj["name"],
@@ -82,26 +76,12 @@ def get_stats():
             "chapter_count": ch_count,
         })
 
-    # ── Top tags ──────────────────────────────────────────────────────────────
-    tag_freq: dict = {}
-    all_tags_raw = list(db.notes.find({"user_id": uid}, {"tags": 1}))
-    for n in all_tags_raw:
-        for tag in (n.get("tags") or "").split(","):
-            tag = tag.strip()
-            if tag:
-                tag_freq[tag] = tag_freq.get(tag, 0) + 1
-    top_tags = sorted(tag_freq.items(), key=lambda x: x[1], reverse=True)[:12]
-    top_tags = [{"tag": t, "count": c} for t, c in top_tags]
-
     # ── Activity heatmap (last 35 days) ───────────────────────────────────────
     end_date   = datetime.utcnow()
     start_date = end_date - timedelta(days=34)
     start_str  = start_date.strftime("%Y-%m-%d")
 
-    activity_raw = list(db.activity.find({
-        "user_id": uid,
-        "date":    {"$gte": start_str},
-    }))
+    activity_raw = repo.activity_since(uid, start_str)
     activity_map = {a["date"]: a["count"] for a in activity_raw}
 
     heatmap = []
@@ -121,7 +101,27 @@ def get_stats():
         else:
             break
 
-    return jsonify({
+    # ── Optional: tags, word count ────────────────────────────────────────────
+    # Computed last (the word count reads every note); once the budget runs
+    # out they are left out — empty / null and named in `degraded` — rather
+    # than failing the whole dashboard
+    allowed  = current_app.config.get("DEGRADED_SECTIONS", ())
+    degraded = []
+
+    top_tags, unique_tags = deadline.optional(
+        "dashboard.tags", lambda: (repo.tag_counts(uid, 12), repo.count_tags(uid)),
+        degraded, allowed, fallback=([], None),
+    )
+
+    def _words():
+        total = 0
+        for text in repo.note_texts(uid):
+            total += len(strip_html(text).split())
+        return total
+
+    total_words = deadline.optional("dashboard.words", _words, degraded, allowed)
+
+    response = jsonify({
         "stats": {
             "total_subjects": total_subjects,
             "total_chapters": total_chapters,
@@ -133,20 +133,17 @@ def get_stats():
         "top_tags":          top_tags,
         "heatmap":           heatmap,
         "streak_days":       streak,
-        "unique_tags":       len(tag_freq),
-    }), 200
+        "unique_tags":       unique_tags,
+        "degraded":          [name.split(".")[1] for name in degraded],
+    })
+    if degraded:
+        response.headers["X-Degraded"] = ",".join(degraded)
+    return response, 200
 
 
 @dashboard_bp.route("/activity", methods=["GET"])
 @token_required
 def get_activity():
     """Return full activity log for the current user."""
-    db  = get_db()
-    uid = ObjectId(g.user_id)
-
-    activity = list(
-        db.activity.find({"user_id": uid}, {"_id": 0, "user_id": 0})
-                   .sort("date", -1)
-                   .limit(365)
-    )
+    activity = get_repo().activity_log(ObjectId(g.user_id), 365)
     return jsonify({"activity": activity, "total_days": len(activity)}), 200
@@ -0,0 +1,113 @@
+"""
+routes/events.py — Server-Sent Events push of note changes
+  GET /api/events?token=<jwt>   → text/event-stream of change notifications
+
+Each event is `{"kind", "id", "version", "op"}` with the change's sync seq
+as `version`. The SSE event id is a sync cursor (models/sync.py
+resume_point: the seq the client has everything up to, kept below
+writes still in flight), so a reconnecting EventSource (which sends
+Last-Event-ID) first replays whatever it missed; that may repeat events
+it already had, so apply them by id and version. A `reset` event means
+the client fell too far behind and should call /api/sync.
+
+EventSource can't set headers, so pass the JWT as ?token=.
+"""
+
+import json
+import queue
+from collections import deque
+from flask import Blueprint, Response, request, stream_with_context, g
+from bson import ObjectId
+from middleware.auth import token_required
+from storage import get_repo
+from config.events import get_hub, make_event
+from models.sync import resume_point
+
+events_bp = Blueprint("events", __name__)
+
+HEARTBEAT_SECONDS = 20
+MAX_REPLAY        = 500
+
+_KINDS = {"subjects": "subject", "chapters": "chapter", "notes": "note"}
+
+
+def _format(event: dict, cursor: int = None) -> str:
+    """An SSE message; without `cursor` it leaves the client's last event id as it was."""
+    if event.get("reset"):
+        return "event: reset\ndata: {}\n\n"
+    head = f"id: {cursor}\n" if cursor is not None else ""
+    return f"{head}event: change\ndata: {json.dumps(event)}\n\n"
+
+
+def _replay(repo, uid: ObjectId, since: int):
+    """Changes after `since`, oldest first, or None if there are too many."""
+    changes = repo.changes_since(uid, since, MAX_REPLAY, full=False)
+    if len(changes) > MAX_REPLAY:
+        return None
+    events = []
+    for seq, coll, doc in changes:
+        if coll == "tombstones":
+            events.append(make_event(doc["kind"], doc["ref_id"], seq, "delete"))
+        else:
+            events.append(make_event(_KINDS[coll], doc["_id"], seq, "upsert"))
+    return events
+
+
+@events_bp.route("", methods=["GET"])
+@token_required
+def stream_events():
+    """Stream the current user's subject / chapter / note changes."""
+    user_id = g.user_id
+    try:
+        last_id = int(request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or 0)
+    except ValueError:
+        last_id = 0
+
+    hub = get_hub()
+    repo = get_repo()
+
+    def generate():
+        sub  = hub.subscribe(user_id)  # before replay, so nothing slips between
+        seen = deque(maxlen=1024)      # change stream + local publish may overlap
+        cursor  = last_id
+        pending = set()                # versions sent above the cursor
+        try:
+            yield "retry: 3000\n: connected\n\n"
+            if last_id:
+                missed = _replay(repo, ObjectId(user_id), last_id)
+                if missed is None:
+                    yield _format({"reset": True})
+                elif missed:
+                    # Only the last replayed event moves the client's cursor
+                    pending.update(e["version"] for e in missed)
+                    cursor  = resume_point(repo, user_id, cursor, pending)
+                    pending = {v for v in pending if v > cursor}
+                    for i, event in enumerate(missed):
+                        seen.append(event["version"])
+                        yield _format(event, cursor if i == len(missed) - 1 else None)
+
+            while True:
+                try:
+                    event = sub.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                if event is None:          # shutting down
+                    return
+                if event.get("reset"):
+                    yield _format(event)
+                    continue
+                if event["version"] in seen:
+                    continue
+                seen.append(event["version"])
+                pending.add(event["version"])
+                cursor  = resume_point(repo, user_id, cursor, pending)
+                pending = {v for v in pending if v > cursor}
+                yield _format(event, cursor)
+        finally:
+            hub.unsubscribe(user_id, sub)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+        "Cache-Control":     "no-cache",
+        "X-Accel-Buffering": "no",
+    })
@@ -0,0 +1,204 @@
+"""
+routes/export.py — Library export as a zip download
+  GET /api/export?subject_id=<id>&format=md|html|ndjson   → One subject, or the whole library
+
+md and html write one file per note, in <subject>/<chapter>/ folders
+(names that only differ in characters a path can't hold get " (2)"…);
+ndjson writes every note as one line of notes.ndjson. Media a note
+references is written once to media/<sha256>.<ext> and its links point
+there, including data-URL media still inline in older notes (md / html).
+
+The archive is built while it downloads: notes come from a server-side
+cursor a batch at a time and every entry leaves as soon as it is
+compressed, so memory stays flat however big the library is. Each worker
+runs at most EXPORT_CONCURRENCY exports; more get 503 + Retry-After.
+Browsers can't set headers on a download link, so pass the JWT as ?token=.
+"""
+
+import base64
+import binascii
+import hashlib
+import re
+import threading
+from datetime import datetime
+from urllib.parse import quote
+from flask import Blueprint, Response, request, jsonify, g, current_app, stream_with_context
+from bson import ObjectId
+from bson.errors import InvalidId
+from middleware.auth import token_required
+from config.media import get_media_store
+from config import metrics
+from models.export import (CHUNK, ZipStream, safe_name, unique_name, media_extension,
+                           render_markdown, render_html, render_json_line)
+from models.note import unpack_content
+from storage import get_repo
+
+export_bp = Blueprint("export", __name__)
+
+FORMATS = {
+    "md":     (render_markdown, ".md"),
+    "html":   (render_html, ".html"),
+    "ndjson": (render_json_line, None),
+}
+
+_MEDIA_RX    = re.compile(r"(?:https?://[^\s\"'()<>]*?)?/api/media/([0-9a-f]{64})")
+_DATA_URL_RX = re.compile(r"data:([\w.+-]+/[\w.+-]+);base64,([A-Za-z0-9+/=]+)")
+
+_lock   = threading.Lock()
+_active = 0
+
+
+def _valid_id(id_str):
+    try:
+        return ObjectId(id_str)
+    except (InvalidId, TypeError):
+        return None
+
+
+@export_bp.route("", methods=["GET"])
+@token_required
+def export_library():
+    """Stream a zip of the current user's notes."""
+    global _active
+    fmt = request.args.get("format", "md")
+    if fmt not in FORMATS:
+        return jsonify({"error": "format must be md, html or ndjson"}), 400
+
+    repo    = get_repo()
+    user_id = ObjectId(g.user_id)
+    if request.args.get("subject_id"):
+        sid     = _valid_id(request.args["subject_id"])
+        subject = repo.find_subject(sid, user_id) if sid else None
+        if not subject:
+            return jsonify({"error": "Subject not found"}), 404
+        subjects, label = [subject], safe_name(subject.get("name"), "subject")
+    else:
+        subjects, label = repo.list_subjects(user_id), "library"
+
+    with _lock:
+        if _active >= current_app.config["EXPORT_CONCURRENCY"]:
+            metrics.incr("export.rejected")
+            rv = jsonify({"error": "Too many exports running, try again shortly"})
+            rv.headers["Retry-After"] = str(current_app.config["ADMISSION_RETRY_AFTER"])
+            return rv, 503
+        _active += 1
+    metrics.incr("export.started")
+
+    def generate():
+        global _active
+        try:
+            yield from _coalesce(_archive(repo, get_media_store(), subjects, fmt))
+        finally:
+            with _lock:
+                _active -= 1
+
+    filename = f"notevault-{label}-{datetime.now():%Y%m%d}.zip"
+    fallback = filename.encode("ascii", "replace").decode().replace("?", "_").replace('"', "_")
+    return Response(stream_with_context(generate()), mimetype="application/zip", headers={
+        "Content-Disposition": f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}",
+        "Cache-Control":       "no-store",
+        "X-Accel-Buffering":   "no",
+    })
+
+
+# ── Archive ───────────────────────────────────────────────────────────────────
+
+def _archive(repo, store, subjects: list, fmt: str):
+    """Yield the zip's bytes: subjects → chapters → notes, then media."""
+    render, ext = FORMATS[fmt]
+    z       = ZipStream()
+    media   = {}                    # digest → path in the archive, None if missing
+    pending = []                    # ndjson: media written after notes.ndjson is closed
+    lines   = z.open("notes.ndjson") if fmt == "ndjson" else None
+    folders = set()                 # names that differ can still sanitize alike ("A/B", "A:B")
+
+    for subj in subjects:
+        sname    = unique_name(safe_name(subj.get("name")), "", folders)
+        chapters = set()
+        for ch in repo.list_chapters(subj["_id"]):
+            cname = unique_name(safe_name(ch.get("name")), "", chapters)
+            used  = set()
+            for note in repo.iter_notes(ch["_id"]):
+                content = unpack_content(note)
+                if lines is None:
+                    content = yield from _with_media(z, store, media, content, "../../")
+                    path    = unique_name(safe_name(note.get("title")), ext, used)
+                    yield z.add(f"{sname}/{cname}/{path}", render(note, content, subj.get("name", ""), ch.get("name", "")))
+                else:
+                    content = yield from _with_media(z, store, media, content, "", pending)
+                    lines.write(render_json_line(note, content, subj.get("name", ""), ch.get("name", "")))
+                    yield z.drain()
+
+    if lines is not None:
+        lines.close()
+        yield z.drain()
+        for digest in pending:
+            found = store.open(digest)
+            if found:
+                yield from _copy(z, media[digest], *found)
+    yield z.close()
+
+
+def _with_media(z, store, media: dict, content: str, prefix: str, pending: list = None):
+    """
+    Write the media `content` links to (first sighting only) and return
+    the content with its links pointing into the archive. With `pending`,
+    blobs are queued instead of written (an entry is still open), and
+    data URLs stay inline.
+    """
+    for digest in set(_MEDIA_RX.findall(content or "")):
+        if digest in media:
+            continue
+        found = store.open(digest)
+        if not found:
+            media[digest] = None
+            continue
+        media[digest] = f"media/{digest}{media_extension(found[2])}"
+        if pending is None:
+            yield from _copy(z, media[digest], *found)
+        else:
+            found[0].close()
+            pending.append(digest)
+
+    def _link(match):
+        path = media.get(match.group(1))
+        return prefix + path if path else match.group(0)
+
+    def _inline(match):
+        try:
+            data = base64.b64decode(match.group(2), validate=True)
+        except (binascii.Error, ValueError):
+            return match.group(0)
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in media:
+            media[digest] = f"media/{digest}{media_extension(match.group(1))}"
+            written.append(z.add(media[digest], data, match.group(1)))
+        return prefix + media[digest]
+
+    content = _MEDIA_RX.sub(_link, content or "")
+    if pending is None and "data:" in content:
+        written = []
+        content = _DATA_URL_RX.sub(_inline, content)
+        yield from written
+    return content
+
+
+def _copy(z, path: str, file, length: int, mimetype: str):
+    try:
+        yield from z.add_file(path, file, mimetype, length)
+    finally:
+        file.close()
+
+
+def _coalesce(chunks, size: int = CHUNK):
+    """Regroup many small pieces into writes of about `size` bytes."""
+    buf, n = [], 0
+    for chunk in chunks:
+        if chunk:
+            buf.append(chunk)
+            n += len(chunk)
+            if n >= size:
+                yield b"".join(buf)
+                buf, n = [], 0
+    if buf:
+        yield b"".join(buf)
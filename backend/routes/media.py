@@ -0,0 +1,47 @@
+"""
+routes/media.py — Content-addressed media
+  GET /api/media/<sha256>   → Raw image / video bytes (supports Range)
+
+Not token-protected: <img>/<video> tags can't send an Authorization
+header, and a blob's URL is the SHA-256 of its bytes, so it can only be
+known by someone who already has the file or the note referencing it.
+
+Served from the API's origin, so every response is nosniff and
+sandboxed, and a blob whose stored type is not an allowed media type
+(stored before the allowlist existed) is only offered as a download.
+"""
+
+from flask import Blueprint, Response, jsonify, request
+from werkzeug.wsgi import wrap_file
+from config.media import get_media_store
+from models.media import is_digest, is_media_type
+
+media_bp = Blueprint("media", __name__)
+
+# Content never changes for a given digest
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@media_bp.route("/<digest>", methods=["GET"])
+def get_media(digest):
+    """Stream a media blob with immutable caching and byte-range support."""
+    if not is_digest(digest):
+        return jsonify({"error": "Invalid media ID"}), 400
+
+    found = get_media_store().open(digest)
+    if not found:
+        return jsonify({"error": "Media not found"}), 404
+
+    file, length, mimetype = found
+    inline = is_media_type(mimetype)
+    rv = Response(wrap_file(request.environ, file),
+                  mimetype=mimetype if inline else "application/octet-stream",
+                  direct_passthrough=True)
+    rv.content_length = length
+    rv.headers["X-Content-Type-Options"]  = "nosniff"
+    rv.headers["Content-Security-Policy"] = "sandbox"
+    if not inline:
+        rv.headers["Content-Disposition"] = f'attachment; filename="{digest}"'
+    rv.headers["Cache-Control"] = CACHE_CONTROL
+    rv.set_etag(digest)
+    return rv.make_conditional(request, accept_ranges=True, complete_length=length)
@@ -1,23 +1,62 @@
 """
 routes/notes.py — Notes CRUD + full-text search
   GET    /api/notes?chapter_id=<id>     → List notes in a chapter
+  GET    /api/notes?tag=<tag>           → List notes with a tag (chapter_id optional)
+                                          (both take updated_after / updated_before)
   GET    /api/notes/search?q=<query>    → Full-text search across all user notes
+  GET    /api/notes/browse?...          → Filtered, paginated note list + facet counts
+  GET    /api/notes/duplicates          → Clusters of near-duplicate notes (MinHash / LSH)
   POST   /api/notes                     → Create a note
+  POST   /api/notes/bulk                → Move, retag or delete many notes at once
+  GET    /api/notes/batch?ids=a,b,c     → Many notes in one query, streamed
+  POST   /api/notes/batch               → Same, ids (and fields) in the body
   GET    /api/notes/<id>                → Get a single note
+  GET    /api/notes/<id>/related?k=10   → Most similar notes (TF-IDF cosine), any subject
   PUT    /api/notes/<id>                → Update note (title, content, tags)
   DELETE /api/notes/<id>                → Delete a note
+
+Inline data-URL media in note content is moved to the media store on
+create/update (see models/media.py); the response's "media" lists the
+sha256 digests of the blobs that were, so a client can swap in their URLs. Tags may be sent as a list or a
+comma-separated string and are stored as a normalized array. Creating a
+note with "check_duplicates": true also returns existing notes it nearly
+duplicates.
 """
 
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, Response, request, jsonify, g, current_app, stream_with_context
 from bson import ObjectId
 from bson.errors import InvalidId
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from itertools import chain
 from middleware.auth import token_required
-from models.note import new_note_doc, serialize_note
-from config.db import get_db
+from middleware.cache import invalidates_cache
+from middleware.singleflight import single_flight
+from models.note import (
+    new_note_doc, serialize_note, pack_content, note_text, make_snippet, normalize_tags,
+    utcnow, iso, as_datetime
+)
+from models.media import extract_media
+from models.dedup import similarity, clusters
+from models.sync import write_tombstones
+from config.events import publish_change
+from config.media import get_media_store
+from config.related import get_related
+from storage import get_repo
 
 notes_bp = Blueprint("notes", __name__)
 
+MAX_BULK_IDS = 10_000
+MAX_BATCH_IDS = 500
+BATCH_FIELDS = ("title", "content", "tags", "subject_id", "chapter_id", "created_at", "updated_at")
+BULK_OPS     = ("move", "add_tags", "remove_tags", "delete")
+MAX_RELATED  = 50
+# Estimated Jaccard similarity of word 3-grams; LSH finds pairs from ~0.5 up
+DUPLICATE_THRESHOLD = 0.8
+MIN_THRESHOLD       = 0.5
+DATE_RANGE_ERROR    = "updated_after / updated_before must be YYYY-MM-DD or ISO datetimes"
+TAGS_ERROR          = "tags must be a comma-separated string or a list of strings"
+TEXT_ERROR          = "title and content must be strings"
+
 
 def _valid_id(id_str):
     try:
@@ -26,85 +65,255 @@ def _valid_id(id_str):
         return None
 
 
-def _human_now():
-    return datetime.utcnow().strftime("%d %b %Y, %I:%M %p")
+def _valid_tags(tags) -> bool:
+    """Tags may be missing, a comma-separated string or a list of strings."""
+    if tags is None or isinstance(tags, str):
+        return True
+    return isinstance(tags, list) and all(isinstance(t, str) for t in tags)
+
+
+def _id_list(name: str):
+    """Repeated and/or comma-separated ids → [ObjectId]; None if any is invalid."""
+    raw = [s.strip() for v in request.args.getlist(name) for s in v.split(",") if s.strip()]
+    ids = [_valid_id(s) for s in raw]
+    return None if None in ids else ids
+
+
+def _date_arg(name: str):
+    """YYYY-MM-DD or ISO datetime → naive UTC datetime (as stored); False if invalid."""
+    value = (request.args.get(name) or "").strip()
+    if not value:
+        return None
+    try:
+        when = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when
+
+
+def _date_range():
+    """(updated_after, updated_before) from the query string; False if either is invalid."""
+    after, before = _date_arg("updated_after"), _date_arg("updated_before")
+    if after is False or before is False:
+        return False
+    return after, before
+
+
+def _update_windows(now: datetime) -> list:
+    """The `updated` facet: notes changed since each of these points."""
+    return [
+        ("today", now.replace(hour=0, minute=0, second=0, microsecond=0)),
+        ("week",  now - timedelta(days=7)),
+        ("month", now - timedelta(days=30)),
+    ]
+
 
 
 # ── Routes ────────────────────────────────────────────────────────────────────
 
 @notes_bp.route("/search", methods=["GET"])
 @token_required
+@single_flight
 def search_notes():
     """
     Full-text search across all notes belonging to the current user.
-    Uses MongoDB $text index on title + content + tags.
-    Falls back to regex if no text index match.
+    Ranked by the backend's text index (MongoDB $text, or SQLite FTS5)
+    over title + content + tags.
     """
     query = (request.args.get("q") or "").strip()
     if not query:
         return jsonify({"error": "Query parameter 'q' is required"}), 400
 
     limit = min(int(request.args.get("limit", 20)), 50)
-    db    = get_db()
-    uid   = ObjectId(g.user_id)
-
-    # Try MongoDB full-text search first
-    try:
-        raw = list(db.notes.find(
-            {"$text": {"$search": query}, "user_id": uid},
-            {"score": {"$meta": "textScore"}}
-        ).sort([("score", {"$meta": "textScore"})]).limit(limit))
-    except Exception:
-        # Fallback: case-insensitive regex across title, content, tags
-        rx  = {"$regex": query, "$options": "i"}
-        raw = list(db.notes.find({
-            "user_id": uid,
-            "$or": [{"title": rx}, {"content": rx}, {"tags": rx}]
-        }).sort("updated_at", -1).limit(limit))
+    repo  = get_repo()
+    raw   = repo.search_notes(ObjectId(g.user_id), query, limit)
 
     # Enrich with subject + chapter names
     results = []
     for note in raw:
         n = serialize_note(note)
-        subj = db.subjects.find_one({"_id": note.get("subject_id")})
-        ch   = db.chapters.find_one({"_id": note.get("chapter_id")})
+        subj = repo.find_subject(note.get("subject_id"))
+        ch   = repo.find_chapter(note.get("chapter_id"))
         n["subject_name"] = subj["name"] if subj else "Unknown"
         n["chapter_name"] = ch["name"]   if ch   else "Unknown"
-        # Trim content for snippet
-        import re
-        plain = re.sub(r"<[^>]+>", "", n.get("content", ""))
-        n["snippet"] = plain[:150] + ("…" if len(plain) > 150 else "")
+        n["snippet"]      = make_snippet(note_text(note), 150)
         results.append(n)
 
     return jsonify({"results": results, "total": len(results), "query": query}), 200
 
 
+@notes_bp.route("/browse", methods=["GET"])
+@token_required
+@single_flight
+def browse_notes():
+    """
+    Filtered, paginated notes (without content) plus facet counts, e.g.
+        /api/notes/browse?subject_id=<id>&tag=exam&updated=week&page=2
+
+    Filters (all optional, combined with AND):
+      subject_id, chapter_id   one or more ids (repeated or comma-separated; any of)
+      tag                      one or more tags (all required)
+      updated_after / updated_before   YYYY-MM-DD or ISO datetime, [after, before)
+      updated                  today | week | month — shorthand for updated_after
+      q                        full-text query
+    sort: relevance (default with q) | updated (default) | title
+    page (1-based), limit (default 20, max 100)
+
+    facets.subjects / chapters / updated are counted with every filter
+    except their own, so other values of that dimension stay selectable;
+    facets.tags applies all filters (top 50).
+    """
+    subject_ids = _id_list("subject_id")
+    chapter_ids = _id_list("chapter_id")
+    if subject_ids is None or chapter_ids is None:
+        return jsonify({"error": "Invalid subject_id or chapter_id"}), 400
+
+    span = _date_range()
+    if span is False:
+        return jsonify({"error": DATE_RANGE_ERROR}), 400
+    after, before = span
+
+    windows = _update_windows(utcnow())
+    updated = request.args.get("updated")
+    if updated:
+        since = dict(windows).get(updated)
+        if since is None:
+            return jsonify({"error": "updated must be one of: today, week, month"}), 400
+        after = max(after or since, since)
+
+    q    = (request.args.get("q") or "").strip()
+    sort = request.args.get("sort") or ("relevance" if q else "updated")
+    if sort not in ("relevance", "updated", "title"):
+        return jsonify({"error": "sort must be relevance, updated or title"}), 400
+
+    try:
+        page  = max(int(request.args.get("page", 1)), 1)
+        limit = min(max(int(request.args.get("limit", 20)), 1), 100)
+    except ValueError:
+        return jsonify({"error": "page and limit must be integers"}), 400
+
+    filters = {
+        "q":              q,
+        "tags":           normalize_tags(",".join(request.args.getlist("tag"))),
+        "subject_ids":    subject_ids,
+        "chapter_ids":    chapter_ids,
+        "updated_after":  after,
+        "updated_before": before,
+    }
+    result = get_repo().browse_notes(ObjectId(g.user_id), filters, windows, sort,
+                                     (page - 1) * limit, limit)
+
+    notes = []
+    for note in result["notes"]:
+        note.pop("score", None)
+        notes.append(serialize_note(note))
+
+    facets = result["facets"]
+    for f in facets["subjects"] + facets["chapters"]:
+        f["id"] = str(f["id"])
+        if "subject_id" in f:
+            f["subject_id"] = str(f["subject_id"]) if f["subject_id"] else None
+
+    total = result["total"]
+    return jsonify({
+        "notes":  notes,
+        "total":  total,
+        "page":   page,
+        "pages":  (total + limit - 1) // limit,
+        "limit":  limit,
+        "facets": facets,
+    }), 200
+
+
+@notes_bp.route("/duplicates", methods=["GET"])
+@token_required
+@single_flight
+def duplicate_notes():
+    """
+    Clusters of near-duplicate notes, largest first:
+        /api/notes/duplicates?threshold=0.8
+    Candidate pairs come from shared LSH band keys, so the cost grows with
+    the number of duplicates rather than the square of the library.
+    """
+    try:
+        threshold = float(request.args.get("threshold", DUPLICATE_THRESHOLD))
+    except ValueError:
+        return jsonify({"error": "threshold must be a number"}), 400
+    if not MIN_THRESHOLD <= threshold <= 1:
+        return jsonify({"error": f"threshold must be between {MIN_THRESHOLD} and 1"}), 400
+
+    repo    = get_repo()
+    user_id = ObjectId(g.user_id)
+    buckets = repo.lsh_buckets(user_id)
+    ids     = {i for bucket in buckets for i in bucket}
+    notes   = {
+        n["_id"]: n
+        for n in repo.find_notes(list(ids), user_id,
+                                 ("title", "subject_id", "chapter_id", "created_at", "updated_at", "minhash"))
+    }
+    found = clusters(buckets, {i: n.get("minhash") for i, n in notes.items()}, threshold)
+
+    result = []
+    for members, score in found:
+        group = sorted((notes[i] for i in members if i in notes), key=lambda n: as_datetime(n.get("created_at")) or datetime.min)
+        result.append({
+            "similarity": round(score, 3),
+            "notes": [{
+                "id":         str(n["_id"]),
+                "title":      n.get("title", ""),
+                "subject_id": str(n["subject_id"]),
+                "chapter_id": str(n["chapter_id"]),
+                "created_at": iso(n.get("created_at")),
+                "updated_at": iso(n.get("updated_at")),
+            } for n in group],
+        })
+
+    return jsonify({
+        "clusters":   result,
+        "total":      len(result),
+        "duplicates": sum(len(c["notes"]) - 1 for c in result),
+        "threshold":  threshold,
+    }), 200
+
+
 @notes_bp.route("", methods=["GET"])
 @token_required
 def list_notes():
-    """List all notes in a chapter, sorted by last modified."""
+    """
+    List notes in a chapter and/or with a tag, most recently updated first.
+    updated_after / updated_before (YYYY-MM-DD or ISO datetime) keep those
+    updated in [after, before).
+    """
     chapter_id = request.args.get("chapter_id")
-    if not chapter_id:
-        return jsonify({"error": "chapter_id query param is required"}), 400
-
-    cid = _valid_id(chapter_id)
-    if not cid:
-        return jsonify({"error": "Invalid chapter_id"}), 400
-
-    db = get_db()
+    tag        = normalize_tags(request.args.get("tag", ""))
+    if not chapter_id and not tag:
+        return jsonify({"error": "chapter_id or tag query param is required"}), 400
+
+    cid = None
+    if chapter_id:
+        cid = _valid_id(chapter_id)
+        if not cid:
+            return jsonify({"error": "Invalid chapter_id"}), 400
+    span = _date_range()
+    if span is False:
+        return jsonify({"error": DATE_RANGE_ERROR}), 400
+
+    repo = get_repo()
+    uid  = ObjectId(g.user_id)
     # Verify chapter belongs to user
-    ch = db.chapters.find_one({"_id": cid, "user_id": ObjectId(g.user_id)})
-    if not ch:
+    if cid and not repo.find_chapter(cid, uid):
         return jsonify({"error": "Chapter not found"}), 404
 
-    notes = list(db.notes.find({"chapter_id": cid}).sort("updated_at", -1))
+    if tag:
+        notes = repo.notes_by_tag(uid, tag[0], cid, *span)
+    else:
+        notes = repo.list_notes(cid, *span)
     result = []
     for note in notes:
         n = serialize_note(note)
-        # Trim content to snippet
-        import re
-        plain     = re.sub(r"<[^>]+>", "", n.get("content", ""))
-        n["snippet"] = plain[:120] + ("…" if len(plain) > 120 else "")
+        n["snippet"] = make_snippet(note_text(note))
         result.append(n)
 
     return jsonify({"notes": result, "total": len(result)}), 200
@@ -112,36 +321,218 @@ def list_notes():
 
 @notes_bp.route("", methods=["POST"])
 @token_required
+@invalidates_cache
 def create_note():
     """Create a new note."""
     data       = request.get_json(silent=True) or {}
     chapter_id = data.get("chapter_id", "")
     subject_id = data.get("subject_id", "")
-    title      = (data.get("title") or "New Note").strip()
-    content    = data.get("content", "")
-    tags       = data.get("tags", "")
+    title      = data.get("title") or "New Note"
+    content    = data.get("content") or ""
+    tags       = data.get("tags")
 
     if not chapter_id or not subject_id:
         return jsonify({"error": "chapter_id and subject_id are required"}), 400
+    if not isinstance(title, str) or not isinstance(content, str):
+        return jsonify({"error": TEXT_ERROR}), 400
+    title = title.strip()
+    if not _valid_tags(tags):
+        return jsonify({"error": TAGS_ERROR}), 400
 
     cid = _valid_id(chapter_id)
     sid = _valid_id(subject_id)
     if not cid or not sid:
         return jsonify({"error": "Invalid chapter_id or subject_id"}), 400
 
-    db = get_db()
-    ch = db.chapters.find_one({"_id": cid, "user_id": ObjectId(g.user_id)})
-    if not ch:
+    repo = get_repo()
+    # Owned, and in the subject given: one indexed lookup, only subject_id back
+    ch   = repo.find_chapter(cid, ObjectId(g.user_id), fields=("subject_id",))
+    if not ch or ch["subject_id"] != sid:
         return jsonify({"error": "Chapter not found"}), 404
 
-    doc    = new_note_doc(g.user_id, subject_id, chapter_id, title, content, tags)
-    result = db.notes.insert_one(doc)
+    media   = []
+    content = extract_media(content, get_media_store(), media)
+    doc     = new_note_doc(g.user_id, subject_id, chapter_id, title, content, tags)
+    similar = _near_duplicates(repo, doc) if data.get("check_duplicates") else None
+    doc["seq"] = repo.next_seq(ObjectId(g.user_id))
+    note_id = repo.insert_note(doc)
+    publish_change(g.user_id, "note", note_id, doc["seq"])
 
     # Record activity
-    _record_activity(db, g.user_id)
-
-    created = serialize_note(db.notes.find_one({"_id": result.inserted_id}))
-    return jsonify({"message": f'Note "{title}" created! 📝', "note": created}), 201
+    _record_activity(repo, g.user_id)
+
+    body = {"message": f'Note "{title}" created! 📝', "note": serialize_note(doc), "media": media}
+    if similar is not None:
+        body["duplicates"] = similar
+        if similar:
+            body["warning"] = f'This note looks like a copy of "{similar[0]["title"]}"'
+    return jsonify(body), 201
+
+
+def _near_duplicates(repo, doc: dict) -> list:
+    """Existing notes at or above DUPLICATE_THRESHOLD similarity to `doc`, closest first."""
+    found = []
+    for note in repo.lsh_candidates(doc["user_id"], doc["lsh"], ("title", "subject_id", "chapter_id")):
+        score = similarity(doc["minhash"], note.get("minhash"))
+        if score >= DUPLICATE_THRESHOLD:
+            found.append({
+                "id":         str(note["_id"]),
+                "title":      note.get("title", ""),
+                "subject_id": str(note["subject_id"]),
+                "chapter_id": str(note["chapter_id"]),
+                "similarity": round(score, 3),
+            })
+    found.sort(key=lambda n: -n["similarity"])
+    return found
+
+
+@notes_bp.route("/bulk", methods=["POST"])
+@token_required
+@invalidates_cache
+def bulk_notes():
+    """
+    Apply one operation to many notes:
+        {"ids": [...], "op": "move",        "chapter_id": "..."}
+        {"ids": [...], "op": "move",        "subject_id": "..."}   → its first chapter by name
+        {"ids": [...], "op": "add_tags",    "tags": "exam, lab"}
+        {"ids": [...], "op": "remove_tags", "tags": ["lab"]}
+        {"ids": [...], "op": "delete"}
+
+    Ownership is checked with one query and the writes go out as one
+    batch. Ids that are unknown or belong to someone else are returned in
+    `not_found`; notes the operation would not change are left untouched.
+    """
+    data = request.get_json(silent=True) or {}
+    op   = data.get("op")
+    raw  = data.get("ids")
+    if op not in BULK_OPS:
+        return jsonify({"error": f"op must be one of: {', '.join(BULK_OPS)}"}), 400
+    if not isinstance(raw, list) or not raw:
+        return jsonify({"error": "ids must be a non-empty list"}), 400
+    if len(raw) > MAX_BULK_IDS:
+        return jsonify({"error": f"At most {MAX_BULK_IDS} ids per request"}), 400
+
+    ids = list(dict.fromkeys(_valid_id(i) for i in raw))
+    if None in ids:
+        return jsonify({"error": "Invalid note ID in ids"}), 400
+
+    repo = get_repo()
+    uid  = ObjectId(g.user_id)
+
+    target, tags = None, []
+    if op == "move":
+        target = _move_target(repo, uid, data)
+        if isinstance(target, tuple):
+            return target
+    elif op in ("add_tags", "remove_tags"):
+        if not _valid_tags(data.get("tags")):
+            return jsonify({"error": TAGS_ERROR}), 400
+        tags = normalize_tags(data.get("tags"))
+        if not tags:
+            return jsonify({"error": "tags are required"}), 400
+
+    notes     = repo.find_notes(ids, uid, ("tags", "subject_id", "chapter_id"))
+    found     = {n["_id"] for n in notes}
+    not_found = [str(i) for i in ids if i not in found]
+
+    if op == "delete":
+        repo.delete_notes(notes)
+        write_tombstones(repo, g.user_id, [("note", n["_id"]) for n in notes])
+        return jsonify({
+            "message":   f"{len(notes)} note(s) deleted",
+            "changed":   len(notes),
+            "not_found": not_found,
+        }), 200
+
+    changed, updates = [], []
+    for note in notes:
+        current = normalize_tags(note.get("tags"))
+        if op == "move":
+            if note["chapter_id"] == target["_id"]:
+                continue
+            update = {"chapter_id": target["_id"], "subject_id": target["subject_id"]}
+        elif op == "add_tags":
+            new = normalize_tags(current + tags)
+            if new == current:
+                continue
+            update = {"tags": new}
+        else:
+            new = [t for t in current if t not in tags]
+            if new == current:
+                continue
+            update = {"tags": new}
+        changed.append(note)
+        updates.append(update)
+
+    if changed:
+        now  = utcnow()
+        last = repo.next_seq(uid, len(changed))
+        for i, update in enumerate(updates):
+            update.update({"updated_at": now, "seq": last - len(changed) + 1 + i})
+        repo.bulk_update_notes(changed, updates)
+        for note, update in zip(changed, updates):
+            publish_change(g.user_id, "note", note["_id"], update["seq"])
+        _record_activity(repo, g.user_id)
+
+    return jsonify({
+        "message":   f"{len(changed)} note(s) updated",
+        "changed":   len(changed),
+        "not_found": not_found,
+    }), 200
+
+
+@notes_bp.route("/batch", methods=["GET", "POST"])
+@token_required
+def batch_notes():
+    """
+    Many notes at once, e.g. to restore open notes or prefetch a chapter:
+        GET  /api/notes/batch?ids=a,b,c&fields=title,tags
+        POST /api/notes/batch   {"ids": [...], "fields": ["title", "tags"]}
+
+    One owner-scoped `$in` query for up to MAX_BATCH_IDS ids. `fields`
+    (any of BATCH_FIELDS) limits each note to `id` and those; without it
+    notes look as in GET /api/notes/<id>. The response is written while
+    the cursor is read, so memory stays flat however large the notes:
+        {"notes": [...], "not_found": [...]}
+    Notes come in no particular order; ids that are unknown or belong to
+    someone else are listed in `not_found`.
+    """
+    if request.method == "POST":
+        data   = request.get_json(silent=True) or {}
+        raw    = data.get("ids")
+        fields = data.get("fields")
+        if not isinstance(raw, list) or (fields is not None and not isinstance(fields, list)):
+            return jsonify({"error": "ids (and fields, if given) must be lists"}), 400
+    else:
+        raw    = [s.strip() for v in request.args.getlist("ids") for s in v.split(",") if s.strip()]
+        fields = [f.strip() for v in request.args.getlist("fields") for f in v.split(",") if f.strip()] or None
+
+    if not raw:
+        return jsonify({"error": "ids are required"}), 400
+    ids = list(dict.fromkeys(_valid_id(i) for i in raw))
+    if None in ids:
+        return jsonify({"error": "Invalid note ID in ids"}), 400
+    if len(ids) > MAX_BATCH_IDS:
+        return jsonify({"error": f"At most {MAX_BATCH_IDS} ids per request"}), 400
+    if fields is not None:
+        if any(f not in BATCH_FIELDS for f in fields):
+            return jsonify({"error": f"fields must be among: {', '.join(BATCH_FIELDS)}"}), 400
+        fields = list(dict.fromkeys(fields)) + (["content_codec"] if "content" in fields else [])
+
+    notes = get_repo().iter_notes_by_id(ids, ObjectId(g.user_id), fields)
+    # Run the query before the 200 goes out, so its errors still get a status
+    first = next(notes, None)
+    dumps = current_app.json.dumps
+
+    def generate():
+        found = set()
+        yield '{"notes":['
+        for i, note in enumerate(chain([first], notes) if first else ()):
+            found.add(note["_id"])
+            yield ("," if i else "") + dumps(serialize_note(note))
+        yield '],"not_found":' + dumps([str(i) for i in ids if i not in found]) + "}"
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
 
 
 @notes_bp.route("/<note_id>", methods=["GET"])
@@ -152,78 +543,157 @@ def get_note(note_id):
     if not nid:
         return jsonify({"error": "Invalid note ID"}), 400
 
-    db   = get_db()
-    note = db.notes.find_one({"_id": nid, "user_id": ObjectId(g.user_id)})
+    note = get_repo().find_note(nid, ObjectId(g.user_id))
     if not note:
         return jsonify({"error": "Note not found"}), 404
 
     return jsonify({"note": serialize_note(note)}), 200
 
 
+@notes_bp.route("/<note_id>/related", methods=["GET"])
+@token_required
+def related_notes(note_id):
+    """
+    The k notes most similar to this one by TF-IDF cosine similarity over
+    title, text and tags, best first, from any subject or chapter.
+    """
+    nid = _valid_id(note_id)
+    if not nid:
+        return jsonify({"error": "Invalid note ID"}), 400
+    index = get_related()
+    if index is None:
+        return jsonify({"error": "Related notes are unavailable on this server"}), 503
+    try:
+        k = max(1, min(int(request.args.get("k", 10)), MAX_RELATED))
+    except ValueError:
+        return jsonify({"error": "k must be a number"}), 400
+
+    repo    = get_repo()
+    user_id = ObjectId(g.user_id)
+    if not repo.find_notes([nid], user_id, ()):
+        return jsonify({"error": "Note not found"}), 404
+
+    scored  = index.related(g.user_id, str(nid), k)
+    headers = {
+        str(n["_id"]): n
+        for n in repo.find_notes([ObjectId(i) for i, _ in scored], user_id,
+                                 ("title", "subject_id", "chapter_id", "tags", "updated_at"))
+    }
+    subjects = {str(s["_id"]): s["name"] for s in repo.list_subjects(user_id)}
+    chapters = {}
+    results  = []
+    for rid, score in scored:
+        note = headers.get(rid)
+        if note is None:                     # deleted since the index caught up
+            continue
+        cid = str(note["chapter_id"])
+        if cid not in chapters:
+            ch = repo.find_chapter(note["chapter_id"])
+            chapters[cid] = ch["name"] if ch else "Unknown"
+        results.append({
+            "id":           rid,
+            "title":        note.get("title", ""),
+            "subject_id":   str(note["subject_id"]),
+            "chapter_id":   cid,
+            "subject_name": subjects.get(str(note["subject_id"]), "Unknown"),
+            "chapter_name": chapters[cid],
+            "tags":         normalize_tags(note.get("tags")),
+            "updated_at":   iso(note.get("updated_at")),
+            "score":        round(score, 4),
+        })
+
+    return jsonify({"note_id": str(nid), "related": results}), 200
+
+
 @notes_bp.route("/<note_id>", methods=["PUT"])
 @token_required
+@invalidates_cache
 def update_note(note_id):
     """Update a note's title, content, and/or tags."""
     nid = _valid_id(note_id)
     if not nid:
         return jsonify({"error": "Invalid note ID"}), 400
 
-    db   = get_db()
-    note = db.notes.find_one({"_id": nid, "user_id": ObjectId(g.user_id)})
-    if not note:
-        return jsonify({"error": "Note not found"}), 404
-
     data    = request.get_json(silent=True) or {}
     updates = {}
+    media   = []
 
+    if not all(isinstance(data.get(f) or "", str) for f in ("title", "content")):
+        return jsonify({"error": TEXT_ERROR}), 400
     if "title" in data:
         updates["title"]   = (data["title"] or "Untitled").strip()
     if "content" in data:
-        updates["content"] = data["content"]
+        content = extract_media(data["content"] or "", get_media_store(), media)
+        updates.update(pack_content(content))
     if "tags" in data:
-        updates["tags"]    = data["tags"]
+        if not _valid_tags(data["tags"]):
+            return jsonify({"error": TAGS_ERROR}), 400
+        updates["tags"]    = normalize_tags(data["tags"])
 
     if not updates:
         return jsonify({"error": "Nothing to update"}), 400
 
-    now = datetime.utcnow().isoformat()
-    updates["updated_at"] = now
-    updates["modified"]   = _human_now()
+    repo = get_repo()
+    uid  = ObjectId(g.user_id)
+    updates["updated_at"] = utcnow()
+    updates["seq"]        = repo.next_seq(uid)
 
-    db.notes.update_one({"_id": nid}, {"$set": updates})
+    # Ownership is part of the update's filter: no separate lookup
+    note = repo.update_note(nid, updates, uid)
+    if not note:
+        repo.release_seq(uid, updates["seq"])
+        return jsonify({"error": "Note not found"}), 404
+    publish_change(g.user_id, "note", nid, updates["seq"])
 
     # Record activity
-    _record_activity(db, g.user_id)
+    _record_activity(repo, g.user_id)
 
-    updated = serialize_note(db.notes.find_one({"_id": nid}))
-    return jsonify({"message": "Note saved! 💾", "note": updated}), 200
+    return jsonify({"message": "Note saved! 💾", "note": serialize_note(note), "media": media}), 200
 
 
 @notes_bp.route("/<note_id>", methods=["DELETE"])
 @token_required
+@invalidates_cache
 def delete_note(note_id):
     """Delete a note."""
     nid = _valid_id(note_id)
     if not nid:
         return jsonify({"error": "Invalid note ID"}), 400
 
-    db   = get_db()
-    note = db.notes.find_one({"_id": nid, "user_id": ObjectId(g.user_id)})
+    repo = get_repo()
+    note = repo.find_note(nid, ObjectId(g.user_id))
     if not note:
         return jsonify({"error": "Note not found"}), 404
 
-    db.notes.delete_one({"_id": nid})
+    repo.delete_note(nid)
+    write_tombstones(repo, g.user_id, [("note", nid)])
 
     return jsonify({"message": f'Note "{note.get("title","Note")}" deleted'}), 200
 
 
 # ── Internal helpers ──────────────────────────────────────────────────────────
 
-def _record_activity(db, user_id: str):
-    """Increment the save count for today in the activity collection."""
+def _move_target(repo, uid, data: dict):
+    """The chapter a bulk move goes to, or an error response tuple."""
+    chapter_id, subject_id = data.get("chapter_id"), data.get("subject_id")
+    if chapter_id:
+        cid = _valid_id(chapter_id)
+        chapter = cid and repo.find_chapter(cid, uid)
+        if not chapter:
+            return jsonify({"error": "Chapter not found"}), 404
+        return chapter
+    if subject_id:
+        sid = _valid_id(subject_id)
+        if not sid or not repo.find_subject(sid, uid):
+            return jsonify({"error": "Subject not found"}), 404
+        chapters = repo.list_chapters(sid)
+        if not chapters:
+            return jsonify({"error": "Subject has no chapters to move notes into"}), 400
+        return chapters[0]
+    return jsonify({"error": "chapter_id or subject_id is required for move"}), 400
+
+
+def _record_activity(repo, user_id: str):
+    """Increment the save count for today in the activity log."""
     today = datetime.utcnow().strftime("%Y-%m-%d")
-    db.activity.update_one(
-        {"user_id": ObjectId(user_id), "date": today},
-        {"$inc": {"count": 1}},
-        upsert=True,
-    )
+    repo.record_activity(ObjectId(user_id), today)
@@ -10,10 +10,12 @@ routes/subjects.py — Subject CRUD
 from flask import Blueprint, request, jsonify, g
 from bson import ObjectId
 from bson.errors import InvalidId
-from pymongo.errors import DuplicateKeyError
 from middleware.auth import token_required
-from models.note import new_subject_doc, serialize_subject
-from config.db import get_db
+from middleware.cache import cached_response, invalidates_cache
+from models.note import new_subject_doc, serialize_subject, utcnow
+from models.sync import write_tombstones
+from config.events import publish_change
+from storage import get_repo, DuplicateError
 
 subjects_bp = Blueprint("subjects", __name__)
 
@@ -29,20 +31,21 @@ def _valid_id(id_str):
 
 @subjects_bp.route("", methods=["GET"])
 @token_required
+@cached_response
 def list_subjects():
     """Return all subjects for the current user, with chapter & note counts."""
-    db = get_db()
-    uid = ObjectId(g.user_id)
+    repo = get_repo()
+    uid  = ObjectId(g.user_id)
 
-    subjects = list(db.subjects.find({"user_id": uid}).sort("name", 1))
+    subjects = repo.list_subjects(uid)
 
     result = []
     for subj in subjects:
         s = serialize_subject(subj)
         # Count chapters
-        s["chapter_count"] = db.chapters.count_documents({"subject_id": subj["_id"]})
+        s["chapter_count"] = repo.count_chapters(subject_id=subj["_id"])
         # Count notes
-        s["note_count"] = db.notes.count_documents({"subject_id": subj["_id"]})
+        s["note_count"] = repo.count_notes(subject_id=subj["_id"])
         result.append(s)
 
     return jsonify({"subjects": result, "total": len(result)}), 200
@@ -50,6 +53,7 @@ def list_subjects():
 
 @subjects_bp.route("", methods=["POST"])
 @token_required
+@invalidates_cache
 def create_subject():
     """Create a new subject."""
     data  = request.get_json(silent=True) or {}
@@ -62,63 +66,62 @@ def create_subject():
     if len(name) > 80:
         return jsonify({"error": "Subject name must be under 80 characters"}), 400
 
-    db = get_db()
+    repo = get_repo()
     try:
-        doc    = new_subject_doc(g.user_id, name, color, icon)
-        result = db.subjects.insert_one(doc)
-        created = db.subjects.find_one({"_id": result.inserted_id})
-        s = serialize_subject(created)
+        doc        = new_subject_doc(g.user_id, name, color, icon)
+        doc["seq"] = repo.next_seq(ObjectId(g.user_id))
+        subject_id = repo.insert_subject(doc)
+        publish_change(g.user_id, "subject", subject_id, doc["seq"])
+        s = serialize_subject(doc)
         s["chapter_count"] = 0
         s["note_count"]    = 0
         return jsonify({"message": f'Subject "{name}" created! 🎓', "subject": s}), 201
 
-    except DuplicateKeyError:
+    except DuplicateError:
+        repo.release_seq(ObjectId(g.user_id), doc["seq"])
         return jsonify({"error": f'Subject "{name}" already exists'}), 409
 
 
 @subjects_bp.route("/<subject_id>", methods=["GET"])
 @token_required
+@cached_response
 def get_subject(subject_id):
     """Get a single subject with all its chapters and their note counts."""
     oid = _valid_id(subject_id)
     if not oid:
         return jsonify({"error": "Invalid subject ID"}), 400
 
-    db = get_db()
-    subj = db.subjects.find_one({"_id": oid, "user_id": ObjectId(g.user_id)})
+    repo = get_repo()
+    subj = repo.find_subject(oid, ObjectId(g.user_id))
     if not subj:
         return jsonify({"error": "Subject not found"}), 404
 
     s = serialize_subject(subj)
 
     # Attach chapters
-    chapters = list(db.chapters.find({"subject_id": oid}).sort("name", 1))
+    chapters = repo.list_chapters(oid)
     chs = []
     for ch in chapters:
         c = serialize_subject(ch)   # same serializer works
-        c["note_count"] = db.notes.count_documents({"chapter_id": ch["_id"]})
+        c["note_count"] = repo.count_notes(chapter_id=ch["_id"])
         chs.append(c)
 
     s["chapters"]      = chs
     s["chapter_count"] = len(chs)
-    s["note_count"]    = db.notes.count_documents({"subject_id": oid})
+    s["note_count"]    = repo.count_notes(subject_id=oid)
 
     return jsonify({"subject": s}), 200
 
 
 @subjects_bp.route("/<subject_id>", methods=["PUT"])
 @token_required
+@invalidates_cache
 def update_subject(subject_id):
     """Update a subject's name, color, or icon."""
     oid = _valid_id(subject_id)
     if not oid:
         return jsonify({"error": "Invalid subject ID"}), 400
 
-    db   = get_db()
-    subj = db.subjects.find_one({"_id": oid, "user_id": ObjectId(g.user_id)})
-    if not subj:
-        return jsonify({"error": "Subject not found"}), 404
-
     data    = request.get_json(silent=True) or {}
     updates = {}
     if "name"  in data and data["name"].strip():
@@ -131,34 +134,47 @@ def update_subject(subject_id):
     if not updates:
         return jsonify({"error": "Nothing to update"}), 400
 
-    from datetime import datetime
-    updates["updated_at"] = datetime.utcnow().isoformat()
+    repo = get_repo()
+    uid  = ObjectId(g.user_id)
+    updates["updated_at"] = utcnow()
+    updates["seq"]        = repo.next_seq(uid)
 
     try:
-        db.subjects.update_one({"_id": oid}, {"$set": updates})
-        updated = serialize_subject(db.subjects.find_one({"_id": oid}))
-        return jsonify({"message": "Subject updated!", "subject": updated}), 200
-    except DuplicateKeyError:
+        # Ownership is part of the update's filter: no separate lookup
+        subj = repo.update_subject(oid, updates, uid)
+        if not subj:
+            repo.release_seq(uid, updates["seq"])
+            return jsonify({"error": "Subject not found"}), 404
+        publish_change(g.user_id, "subject", oid, updates["seq"])
+        return jsonify({"message": "Subject updated!", "subject": serialize_subject(subj)}), 200
+    except DuplicateError:
+        repo.release_seq(uid, updates["seq"])
         return jsonify({"error": f'Subject "{updates.get("name")}" already exists'}), 409
 
 
 @subjects_bp.route("/<subject_id>", methods=["DELETE"])
 @token_required
+@invalidates_cache
 def delete_subject(subject_id):
     """Delete a subject and cascade-delete all its chapters and notes."""
     oid = _valid_id(subject_id)
     if not oid:
         return jsonify({"error": "Invalid subject ID"}), 400
 
-    db   = get_db()
-    subj = db.subjects.find_one({"_id": oid, "user_id": ObjectId(g.user_id)})
+    repo = get_repo()
+    subj = repo.find_subject(oid, ObjectId(g.user_id))
     if not subj:
         return jsonify({"error": "Subject not found"}), 404
 
-    # Cascade delete
-    notes_del    = db.notes.delete_many({"subject_id": oid}).deleted_count
-    chapters_del = db.chapters.delete_many({"subject_id": oid}).deleted_count
-    db.subjects.delete_one({"_id": oid})
+    # Cascade delete, leaving tombstones for delta sync
+    deleted      = repo.delete_subject(oid)
+    notes_del    = len(deleted["note_ids"])
+    chapters_del = len(deleted["chapter_ids"])
+
+    write_tombstones(repo, g.user_id,
+                     [("note", i) for i in deleted["note_ids"]] +
+                     [("chapter", i) for i in deleted["chapter_ids"]] +
+                     [("subject", oid)])
 
     return jsonify({
         "message":          f'Subject "{subj["name"]}" deleted',
@@ -0,0 +1,76 @@
+"""
+routes/sync.py — Incremental delta sync for multi-device clients
+  GET /api/sync?since=<token>&limit=<n>   → Subjects, chapters, notes and
+                                            deletions changed since `token`
+
+Start with no `since` for a full sync, then keep passing back `next`.
+While `has_more` is true, request again straight away for the next page.
+While another write is still committing, `next` stays below it, so the
+following page may repeat changes already received: apply them by id
+(skipping any whose seq is not newer than the copy held).
+"""
+
+import base64
+from flask import Blueprint, request, jsonify, g
+from bson import ObjectId
+from middleware.auth import token_required
+from models.note import serialize_subject, serialize_chapter, serialize_note
+from models.sync import resume_point
+from storage import get_repo
+
+sync_bp = Blueprint("sync", __name__)
+
+MAX_PAGE = 1000
+
+_SERIALIZERS = {
+    "subjects": serialize_subject,
+    "chapters": serialize_chapter,
+    "notes":    serialize_note,
+}
+
+
+def _encode_token(seq: int) -> str:
+    return base64.urlsafe_b64encode(f"v1:{seq}".encode()).decode().rstrip("=")
+
+
+def _decode_token(token: str) -> int:
+    """The sequence number in a sync token (0 for none). Raises ValueError if malformed."""
+    if not token:
+        return 0
+    # binascii.Error and UnicodeDecodeError are ValueErrors too
+    raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+    version, seq = raw.split(":", 1)
+    if version != "v1":
+        raise ValueError(f"Unknown sync token version: {version}")
+    return int(seq)
+
+
+@sync_bp.route("", methods=["GET"])
+@token_required
+def delta_sync():
+    """Return everything that changed after the client's sync token."""
+    try:
+        since = _decode_token(request.args.get("since", ""))
+    except ValueError:
+        return jsonify({"error": "Invalid sync token"}), 400
+    try:
+        limit = max(1, min(int(request.args.get("limit", 500)), MAX_PAGE))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    changes = get_repo().changes_since(ObjectId(g.user_id), since, limit)
+
+    has_more = len(changes) > limit
+    page     = changes[:limit]
+
+    result = {"subjects": [], "chapters": [], "notes": [], "deleted": []}
+    for _, coll, doc in page:
+        if coll == "tombstones":
+            result["deleted"].append({"kind": doc["kind"], "id": str(doc["ref_id"])})
+        else:
+            result[coll].append(_SERIALIZERS[coll](doc))
+
+    last = resume_point(get_repo(), g.user_id, since, [seq for seq, _, _ in page])
+    if page and last < page[-1][0]:
+        has_more = False        # the rest waits for the write in flight; ask again on the next poll
+    return jsonify({**result, "next": _encode_token(last), "has_more": has_more}), 200
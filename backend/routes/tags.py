@@ -0,0 +1,27 @@
+"""
+routes/tags.py — Tag listing
+  GET /api/tags?limit=<n>   → The user's tags with note counts, most used first
+
+Counts come from the `tag_counts` collection, which every note write keeps
+current; list the notes for one tag with GET /api/notes?tag=<tag>.
+"""
+
+from flask import Blueprint, request, jsonify, g
+from bson import ObjectId
+from middleware.auth import token_required
+from storage import get_repo
+
+tags_bp = Blueprint("tags", __name__)
+
+
+@tags_bp.route("", methods=["GET"])
+@token_required
+def list_tags():
+    """Return the current user's tags and how many notes carry each."""
+    try:
+        limit = max(0, int(request.args.get("limit", 0)))
+    except ValueError:
+        return jsonify({"error": "limit must be a number"}), 400
+
+    tags = get_repo().tag_counts(ObjectId(g.user_id), limit)
+    return jsonify({"tags": tags, "total": len(tags)}), 200
@@ -0,0 +1,64 @@
+"""
+routes/tree.py — The whole library in one request
+  GET /api/tree?depth=<1-3>&notes=<n>   → Subjects → chapters → note headers, with counts
+
+depth 1 is subjects with chapter and note counts, 2 adds their chapters
+(with note counts) and 3, the default, adds each chapter's `notes` most
+recently updated note headers (id, title, updated_at, snippet; default 50).
+
+Responses carry an ETag; send it back in If-None-Match to get an empty
+304 while nothing in the library has changed.
+"""
+
+from flask import Blueprint, request, jsonify, g
+from bson import ObjectId
+from middleware.auth import token_required
+from middleware.cache import cached_response, conditional_response
+from models.note import serialize_subject, serialize_chapter, serialize_id, prefix_snippet
+from storage import get_repo
+
+tree_bp = Blueprint("tree", __name__)
+
+MAX_NOTES_PER_CHAPTER = 500
+
+
+@tree_bp.route("", methods=["GET"])
+@token_required
+@conditional_response
+@cached_response
+def get_tree():
+    """Return the current user's subjects → chapters → note headers."""
+    try:
+        depth = int(request.args.get("depth", 3))
+        notes = int(request.args.get("notes", 50))
+    except ValueError:
+        return jsonify({"error": "depth and notes must be numbers"}), 400
+    if depth not in (1, 2, 3):
+        return jsonify({"error": "depth must be 1, 2 or 3"}), 400
+    notes = max(1, min(notes, MAX_NOTES_PER_CHAPTER))
+
+    subjects = get_repo().library_tree(ObjectId(g.user_id), depth, notes)
+
+    result = []
+    for subj in subjects:
+        chapters = subj.pop("chapters", None)
+        s = serialize_subject(subj)
+        if chapters is not None:
+            s["chapters"] = []
+            for ch in chapters:
+                headers = ch.pop("notes", None)
+                c = serialize_chapter(ch)
+                if headers is not None:
+                    c["notes"] = [
+                        {**serialize_id({k: v for k, v in n.items() if k != "text"}),
+                         "snippet": prefix_snippet(n.get("text"))}
+                        for n in headers
+                    ]
+                s["chapters"].append(c)
+        result.append(s)
+
+    return jsonify({
+        "subjects":    result,
+        "depth":       depth,
+        "total_notes": sum(s["note_count"] for s in result),
+    }), 200
@@ -0,0 +1,167 @@
+"""
+serve.py — Production server for self-hosting (anywhere but Vercel)
+
+    pip install gunicorn                          # + gevent for --worker-class gevent
+    python serve.py                               # threaded, one worker per CPU
+    python serve.py --worker-class gevent --workers 2
+    python serve.py --worker-class sync --workers 9 --preload
+
+Worker models
+  sync      One request at a time per process; lowest per-request overhead.
+            Every open /api/events stream pins a whole worker, so only use
+            it when clients don't hold live event streams.
+  threaded  gunicorn gthread: --threads requests per process (default).
+            Each event stream holds one thread.
+  gevent    Greenlets: --worker-connections requests per process. Best when
+            many clients keep /api/events open. Needs `pip install gevent`.
+
+The app is always connected after the fork (PyMongo clients are not
+fork-safe), so --preload only shares imported code between workers. Each
+worker's Mongo pool is sized to its concurrency unless MONGO_MAX_POOL_SIZE
+is set; the server opens up to workers × pool connections in total.
+
+On SIGTERM each worker ends its open event streams, finishes in-flight
+requests (up to --graceful-timeout), then closes its connections.
+
+Without gunicorn (e.g. on Windows) this runs Werkzeug's threaded server in
+a single process instead.
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import threading
+
+# Build the module-level app without connecting; workers connect after fork
+os.environ["NOTEVAULT_DEFER_CONNECT"] = "1"
+
+WORKER_CLASSES = {"sync": "sync", "threaded": "gthread", "gevent": "gevent"}
+
+
+def worker_concurrency(worker_class: str, threads: int, worker_connections: int) -> int:
+    """Requests one worker can run at once."""
+    return {
+        "sync":     1,
+        "threaded": threads,
+        "gevent":   worker_connections,
+    }[worker_class]
+
+
+def pool_size(worker_class: str, threads: int, worker_connections: int) -> int:
+    """Mongo connections one worker can use at once (+1 for the change stream)."""
+    return min(worker_concurrency(worker_class, threads, worker_connections), 100) + 1
+
+
+# ── Worker hooks ──────────────────────────────────────────────────────────────
+
+def _end_streams():
+    from config.events import get_hub
+    hub = get_hub()
+    if hub is not None:
+        hub.close()
+
+
+def post_worker_init(worker):
+    from app import init_services
+    init_services(worker.wsgi)
+
+    # Event streams never finish on their own; end them as soon as a
+    # graceful shutdown starts so in-flight requests can drain.
+    graceful = signal.getsignal(signal.SIGTERM)
+
+    def handle_term(sig, frame):
+        # gevent runs signal handlers in its hub, which must not block
+        if worker.__class__.__module__.endswith("ggevent"):
+            import gevent
+            gevent.spawn(_end_streams)
+        else:
+            threading.Thread(target=_end_streams, daemon=True).start()
+        graceful(sig, frame)
+
+    signal.signal(signal.SIGTERM, handle_term)
+
+
+def worker_exit(server, worker):
+    from app import close_services
+    close_services(worker.wsgi)
+
+
+# ── Runners ───────────────────────────────────────────────────────────────────
+
+def run_gunicorn(options: dict):
+    from gunicorn.app.base import BaseApplication
+
+    class NoteVaultServer(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import app
+            return app
+
+    NoteVaultServer().run()
+
+
+def run_werkzeug(host: str, port: int):
+    from app import app, init_services, close_services
+    init_services(app)
+    print(f"\n🚀  NoteVault API → http://{host}:{port}  (werkzeug, threaded)\n")
+    try:
+        app.run(host=host, port=port, threaded=True, debug=False)
+    finally:
+        close_services(app)
+
+
+def main():
+    cpus   = multiprocessing.cpu_count()
+    parser = argparse.ArgumentParser(description="NoteVault production server")
+    parser.add_argument("--bind", default=f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+    parser.add_argument("--worker-class", choices=WORKER_CLASSES,
+                        default=os.environ.get("WORKER_CLASS", "threaded"))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 0)),
+                        help="default: 2×CPU+1 for sync, CPU count otherwise")
+    parser.add_argument("--threads", type=int, default=8, help="per worker (threaded)")
+    parser.add_argument("--worker-connections", type=int, default=1000, help="per worker (gevent)")
+    parser.add_argument("--preload", action="store_true", help="import the app once, before forking")
+    parser.add_argument("--timeout", type=int, default=30)
+    parser.add_argument("--graceful-timeout", type=int, default=20)
+    parser.add_argument("--max-requests", type=int, default=0, help="recycle workers after N requests")
+    args = parser.parse_args()
+
+    workers = args.workers or (2 * cpus + 1 if args.worker_class == "sync" else cpus)
+    pool    = pool_size(args.worker_class, args.threads, args.worker_connections)
+    os.environ.setdefault("MONGO_MAX_POOL_SIZE", str(pool))
+    os.environ["WORKER_CONCURRENCY"] = str(                # sizes admission control's reserve
+        worker_concurrency(args.worker_class, args.threads, args.worker_connections))
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        print("⚠️  gunicorn is not installed — falling back to a single threaded process")
+        host, _, port = args.bind.rpartition(":")
+        run_werkzeug(host or "0.0.0.0", int(port))
+        return
+
+    print(f"🚀  NoteVault API → {args.bind}  ({args.worker_class} × {workers} workers, "
+          f"Mongo pool {os.environ['MONGO_MAX_POOL_SIZE']}/worker)")
+    run_gunicorn({
+        "bind":               args.bind,
+        "worker_class":       WORKER_CLASSES[args.worker_class],
+        "workers":            workers,
+        "threads":            args.threads,
+        "worker_connections": args.worker_connections,
+        "preload_app":        args.preload,
+        "timeout":            args.timeout,
+        "graceful_timeout":   args.graceful_timeout,
+        "max_requests":       args.max_requests,
+        "max_requests_jitter": args.max_requests // 10,
+        "post_worker_init":   post_worker_init,
+        "worker_exit":        worker_exit,
+        "accesslog":          "-" if os.environ.get("ACCESS_LOG") == "1" else None,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+storage — Repository layer between the blueprints and the database
+
+STORAGE_BACKEND selects the implementation:
+  mongo   → MongoDB via PyMongo (default; what Vercel / Atlas deployments use)
+  sqlite  → one embedded SQLite file (WAL + FTS5) for small single-node setups
+"""
+
+from storage.base import Repository, DuplicateError
+
+# Global repository used across the app
+repo = None
+
+
+def init_storage(app):
+    """Open the configured backend and attach it to the app + global scope."""
+    global repo
+
+    backend = app.config.get("STORAGE_BACKEND", "mongo")
+    if backend == "mongo":
+        from config.db import init_db, get_db
+        from storage.mongo import MongoRepository
+        init_db(app)
+        repo = MongoRepository(get_db())
+    elif backend == "sqlite":
+        from storage.sqlite import SQLiteRepository
+        path = app.config.get("SQLITE_PATH", "notevault.db")
+        repo = SQLiteRepository(path)
+        print(f"✅  SQLite storage → {path}")
+    else:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+    app.repo = repo
+
+
+def get_repo() -> Repository:
+    """Return the active repository."""
+    return repo
@@ -0,0 +1,298 @@
+"""
+storage/base.py — Repository interface used by the blueprints
+
+Documents go in and come out shaped like the MongoDB documents built in
+models/ (`_id`, `user_id`, ... as ObjectIds; `created_at`, `updated_at`,
+`deleted_at` as naive UTC datetimes), so serializers work the same
+whatever backend is configured.
+"""
+
+from contextlib import nullcontext
+
+
+class DuplicateError(Exception):
+    """A unique constraint was violated; `field` names it when known."""
+
+    def __init__(self, field: str = ""):
+        super().__init__(field)
+        self.field = field
+
+
+# How long next_seq reservations are remembered (well over IN_FLIGHT_SECONDS
+# in models/sync.py)
+RESERVATION_SECONDS = 300
+
+
+class Repository:
+    name = "base"
+    replicated = False          # True when reads may be routed to other members
+
+    # ── Users ─────────────────────────────────────────────────────────────────
+
+    # Inserts set `_id` on the document passed in (so it can be returned to
+    # the client as is) and return it. Updates apply $set-style `updates`,
+    # only if the document is owned by `user_id` when one is given, and
+    # return the document as updated, or None if there was no match — one
+    # round trip in place of a check, the write and a re-read.
+
+    def insert_user(self, doc: dict):
+        """Insert a user and return its _id. Raises DuplicateError."""
+        raise NotImplementedError
+
+    def find_user(self, user_id):
+        raise NotImplementedError
+
+    def find_user_by_email(self, email: str):
+        raise NotImplementedError
+
+    def update_user(self, user_id, updates: dict):
+        """The updated user, or None. Raises DuplicateError."""
+        raise NotImplementedError
+
+    # ── Subjects ──────────────────────────────────────────────────────────────
+
+    def list_subjects(self, user_id) -> list:
+        """All of a user's subjects, sorted by name."""
+        raise NotImplementedError
+
+    def find_subject(self, subject_id, user_id=None):
+        """A subject, or None; owned by `user_id` when given."""
+        raise NotImplementedError
+
+    def insert_subject(self, doc: dict):
+        raise NotImplementedError
+
+    def update_subject(self, subject_id, updates: dict, user_id=None):
+        """The updated subject, or None. Raises DuplicateError."""
+        raise NotImplementedError
+
+    def delete_subject(self, subject_id) -> dict:
+        """
+        Delete a subject with its chapters and notes.
+        Returns {"note_ids": [...], "chapter_ids": [...]} of what went.
+        """
+        raise NotImplementedError
+
+    def count_subjects(self, user_id) -> int:
+        raise NotImplementedError
+
+    # ── Chapters ──────────────────────────────────────────────────────────────
+
+    def list_chapters(self, subject_id) -> list:
+        """A subject's chapters, sorted by name."""
+        raise NotImplementedError
+
+    def find_chapter(self, chapter_id, user_id=None, fields=None):
+        """A chapter, or None; owned by `user_id` when given; only `_id` and
+        `fields` when given."""
+        raise NotImplementedError
+
+    def insert_chapter(self, doc: dict):
+        raise NotImplementedError
+
+    def update_chapter(self, chapter_id, updates: dict, user_id=None):
+        """The updated chapter, or None. Raises DuplicateError."""
+        raise NotImplementedError
+
+    def delete_chapter(self, chapter_id) -> list:
+        """Delete a chapter and its notes; returns the deleted note ids."""
+        raise NotImplementedError
+
+    def count_chapters(self, **by) -> int:
+        """Count chapters by `user_id` or `subject_id`."""
+        raise NotImplementedError
+
+    # ── Notes ─────────────────────────────────────────────────────────────────
+    # Every note write (including cascades) keeps the per-user tag counts
+    # returned by tag_counts() in step with the notes' `tags` arrays.
+
+    def iter_notes(self, chapter_id, batch: int = 100):
+        """Yield a chapter's notes from a server-side cursor, `batch` at a time."""
+        raise NotImplementedError
+
+    def list_notes(self, chapter_id, updated_after=None, updated_before=None) -> list:
+        """A chapter's notes, most recently updated first; optionally only
+        those updated in [updated_after, updated_before)."""
+        raise NotImplementedError
+
+    def recent_notes(self, user_id, limit: int) -> list:
+        raise NotImplementedError
+
+    def find_note(self, note_id, user_id=None):
+        raise NotImplementedError
+
+    def insert_note(self, doc: dict):
+        raise NotImplementedError
+
+    def update_note(self, note_id, updates: dict, user_id=None):
+        """The updated note, or None."""
+        raise NotImplementedError
+
+    def delete_note(self, note_id):
+        raise NotImplementedError
+
+    def find_notes(self, note_ids: list, user_id, fields=("tags",)) -> list:
+        """
+        The notes among `note_ids` that belong to `user_id`, in one query,
+        with only `_id`, `user_id` and `fields`.
+        """
+        raise NotImplementedError
+
+    def iter_notes_by_id(self, note_ids: list, user_id, fields=None, batch: int = 100):
+        """
+        Yield the notes among `note_ids` that belong to `user_id`, from one
+        `$in` query read `batch` at a time, in no particular order. With
+        `fields`, only `_id` and those; otherwise all but the derived search
+        / dedup fields.
+        """
+        raise NotImplementedError
+
+    def bulk_update_notes(self, notes: list, updates: list):
+        """
+        Apply `updates[i]` ($set-style) to `notes[i]` in one batch. `notes`
+        come from find_notes() with their tags, so tag counts can follow.
+        """
+        raise NotImplementedError
+
+    def delete_notes(self, notes: list):
+        """Delete notes from find_notes() (with their tags) in one batch."""
+        raise NotImplementedError
+
+    def count_notes(self, **by) -> int:
+        """Count notes by `user_id`, `subject_id` or `chapter_id`."""
+        raise NotImplementedError
+
+    def search_notes(self, user_id, query: str, limit: int) -> list:
+        """Full-text search over title, text and tags, best match first."""
+        raise NotImplementedError
+
+    def note_texts(self, user_id):
+        """Yield each note's searchable text (may still contain HTML)."""
+        raise NotImplementedError
+
+    def notes_by_tag(self, user_id, tag: str, chapter_id=None,
+                     updated_after=None, updated_before=None) -> list:
+        """A user's notes carrying `tag`, most recently updated first;
+        optionally only those updated in [updated_after, updated_before)."""
+        raise NotImplementedError
+
+    def browse_notes(self, user_id, filters: dict, windows: list, sort: str,
+                     skip: int, limit: int) -> dict:
+        """
+        One page of a user's notes (without content) plus facet counts.
+
+        filters: q (text), tags (all required), subject_ids / chapter_ids
+        (any of), updated_after / updated_before (datetimes, [after, before)).
+        windows: [(name, since)] — the `updated` facet counts notes
+        updated on or after each `since`.
+        sort: "relevance" (needs q), "updated" or "title".
+
+        Subject, chapter and updated facets ignore their own filter, so a
+        client can offer the other values of a dimension alongside the
+        selected one; the tags facet applies every filter.
+
+        Returns {"notes": [...], "total": n, "facets": {
+            "subjects": [{"id", "name", "count"}], "chapters": [{"id", "name",
+            "subject_id", "count"}], "tags": [{"tag", "count"}],
+            "updated": [{"window", "count"}]}}
+        """
+        raise NotImplementedError
+
+    def library_tree(self, user_id, depth: int, notes_per_chapter: int) -> list:
+        """
+        A user's subjects (by name) with `chapter_count` and `note_count`.
+        depth >= 2 adds `chapters` (by name, each with `note_count`); depth 3
+        adds each chapter's `notes`: its `notes_per_chapter` most recently
+        updated headers — _id, title, updated_at and `text`, the first
+        SNIPPET_SOURCE_CHARS of the stored text or HTML.
+        """
+        raise NotImplementedError
+
+    # ── Near-duplicates ───────────────────────────────────────────────────────
+
+    def lsh_candidates(self, user_id, keys: list, fields=("title",)) -> list:
+        """A user's notes sharing at least one LSH band key, with `minhash` + fields."""
+        raise NotImplementedError
+
+    def lsh_buckets(self, user_id) -> list:
+        """[[note _id, ...]] for every LSH band key shared by two or more notes."""
+        raise NotImplementedError
+
+    # ── Tags ──────────────────────────────────────────────────────────────────
+
+    def tag_counts(self, user_id, limit: int = 0) -> list:
+        """[{"tag", "count"}], most used first; all of them when limit is 0."""
+        raise NotImplementedError
+
+    def count_tags(self, user_id) -> int:
+        """Number of distinct tags in use."""
+        raise NotImplementedError
+
+    def rebuild_tag_counts(self, user_id=None):
+        """Recompute tag counts from the notes (one user, or everyone)."""
+        raise NotImplementedError
+
+    # ── Activity ──────────────────────────────────────────────────────────────
+
+    def record_activity(self, user_id, date: str):
+        """Increment the save count for `date` (YYYY-MM-DD)."""
+        raise NotImplementedError
+
+    def activity_since(self, user_id, date: str) -> list:
+        """[{"date", "count"}] for days on or after `date`."""
+        raise NotImplementedError
+
+    def activity_log(self, user_id, limit: int) -> list:
+        """[{"date", "count"}], newest first."""
+        raise NotImplementedError
+
+    # ── Delta sync ────────────────────────────────────────────────────────────
+
+    def next_seq(self, user_id, n: int = 1) -> int:
+        """
+        Reserve `n` sequence numbers for a user; returns the highest. The
+        reservation is remembered (for RESERVATION_SECONDS) so that
+        reserved_seqs() can tell which changes may not be committed yet.
+        """
+        raise NotImplementedError
+
+    def release_seq(self, user_id, seq: int):
+        """
+        Forget the next_seq reservation ending at `seq` when its write found
+        nothing to change (a missing or foreign id, a duplicate name), so
+        it doesn't hold back the user's sync cursors.
+        """
+        raise NotImplementedError
+
+    def reserved_seqs(self, user_id, within: float) -> list:
+        """(first, last) seq ranges reserved by next_seq in the last `within` seconds."""
+        raise NotImplementedError
+
+    def insert_tombstones(self, docs: list):
+        raise NotImplementedError
+
+    def changes_since(self, user_id, since: int, limit: int, full: bool = True) -> list:
+        """
+        The first `limit + 1` changes with seq > since, as (seq, collection,
+        doc) sorted by seq; collection is subjects / chapters / notes /
+        tombstones. With full=False, docs carry only `_id` and `seq`
+        (plus `kind` and `ref_id` for tombstones).
+        """
+        raise NotImplementedError
+
+    # ── Read routing ──────────────────────────────────────────────────────────
+
+    def routed(self, mode: str = "primary", after: dict = None, max_staleness: int = -1):
+        """
+        Context manager for a request's queries: reads go to members
+        matching the read preference `mode` (MongoDB mode names, at most
+        `max_staleness` seconds behind, -1 = no bound) and all of them run
+        in one causally consistent session, yielded. `after`, a position
+        ({"clusterTime", "operationTime"}) from an earlier session, makes
+        its reads wait until they can see what it wrote. A backend without
+        replicas has nothing to route; this does nothing and yields None.
+        """
+        return nullcontext()
+
+    def close(self):
+        """Release connections (on worker shutdown)."""
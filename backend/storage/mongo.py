@@ -0,0 +1,632 @@
+"""
+storage/mongo.py — Repository backed by MongoDB (the default)
+
+Inside routed() (see middleware/routing.py) `self.db` is the database with
+the request's read preference, and every operation on it runs in the
+request's causally consistent session.
+"""
+
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+from pymongo import ReturnDocument, UpdateOne, read_preferences
+from pymongo.collection import Collection
+from pymongo.topology_description import TopologyDescription
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from models.note import normalize_tags, SNIPPET_SOURCE_CHARS
+from storage.base import Repository, DuplicateError, RESERVATION_SECONDS
+
+
+def _duplicate(e: DuplicateKeyError) -> DuplicateError:
+    """Name the offending field — the last key of the unique index."""
+    key = (e.details or {}).get("keyValue") or {}
+    return DuplicateError(list(key)[-1] if key else ("email" if "email" in str(e) else ""))
+
+
+def _owned(_id, user_id) -> dict:
+    """Filter for `_id`, and for its owner when `user_id` is given."""
+    return {"_id": _id} if user_id is None else {"_id": _id, "user_id": user_id}
+
+
+# next_seq reservations kept on a user's counter document (the newest ones)
+RESERVATIONS_KEPT = 100
+
+# Topologies with members a read may be routed to
+REPLICATED = {"ReplicaSetWithPrimary", "ReplicaSetNoPrimary", "Sharded"}
+
+# Collection methods that take a session (those this module calls)
+_SESSION_METHODS = {
+    "aggregate", "bulk_write", "count_documents", "delete_many", "delete_one", "find",
+    "find_one", "find_one_and_delete", "find_one_and_update", "insert_many", "insert_one",
+    "update_one",
+}
+
+_route = ContextVar("mongo_route", default=None)       # _SessionDatabase inside routed()
+
+
+class _SessionDatabase:
+    """A Database whose collections pass `session` to every operation."""
+
+    def __init__(self, db, session):
+        self._db      = db
+        self._session = session
+
+    def __getattr__(self, name):
+        attr = getattr(self._db, name)
+        return _SessionCollection(attr, self._session) if isinstance(attr, Collection) else attr
+
+    def __getitem__(self, name):
+        return _SessionCollection(self._db[name], self._session)
+
+
+class _SessionCollection:
+    def __init__(self, coll, session):
+        self._coll    = coll
+        self._session = session
+
+    def __getattr__(self, name):
+        attr = getattr(self._coll, name)
+        return partial(attr, session=self._session) if name in _SESSION_METHODS else attr
+
+
+def _read_preference(mode: str, max_staleness: int):
+    """'secondaryPreferred', 90 → the PyMongo read preference (-1 = no staleness bound)."""
+    if mode == "primary":
+        return read_preferences.Primary()
+    modes = {
+        "primaryPreferred":   read_preferences.PrimaryPreferred,
+        "secondary":          read_preferences.Secondary,
+        "secondaryPreferred": read_preferences.SecondaryPreferred,
+        "nearest":            read_preferences.Nearest,
+    }
+    if mode not in modes:
+        raise ValueError(f"Unknown read preference: {mode}")
+    return modes[mode](max_staleness=max_staleness)
+
+
+def _updated(after, before) -> dict:
+    """`updated_at` condition for [after, before); empty when neither is set."""
+    span = {}
+    if after is not None:
+        span["$gte"] = after
+    if before is not None:
+        span["$lt"] = before
+    return {"updated_at": span} if span else {}
+
+
+class MongoRepository(Repository):
+    name = "mongo"
+
+    def __init__(self, db):
+        self._db     = db
+        self._routes = {}                     # (mode, max_staleness) → Database
+        topology = getattr(db.client, "topology_description", None)
+        self.replicated = (isinstance(topology, TopologyDescription)
+                           and topology.topology_type_name in REPLICATED)
+
+    @property
+    def db(self):
+        route = _route.get()
+        return self._db if route is None else route
+
+    @contextmanager
+    def routed(self, mode="primary", after=None, max_staleness=-1):
+        key = (mode, max_staleness)
+        if key not in self._routes:
+            self._routes[key] = self._db.with_options(read_preference=_read_preference(mode, max_staleness))
+        session = self._db.client.start_session(causal_consistency=True)
+        try:
+            if after:
+                session.advance_cluster_time(after["clusterTime"])
+                session.advance_operation_time(after["operationTime"])
+            token = _route.set(_SessionDatabase(self._routes[key], session))
+            try:
+                yield session
+            finally:
+                _route.reset(token)
+        finally:
+            session.end_session()
+
+    # ── Users ─────────────────────────────────────────────────────────────────
+
+    def insert_user(self, doc):
+        try:
+            return self.db.users.insert_one(doc).inserted_id
+        except DuplicateKeyError as e:
+            raise _duplicate(e)
+
+    def find_user(self, user_id):
+        return self.db.users.find_one({"_id": user_id})
+
+    def find_user_by_email(self, email):
+        return self.db.users.find_one({"email": email})
+
+    def update_user(self, user_id, updates):
+        try:
+            return self.db.users.find_one_and_update(
+                {"_id": user_id}, {"$set": updates}, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError as e:
+            raise _duplicate(e)
+
+    # ── Subjects ──────────────────────────────────────────────────────────────
+
+    def list_subjects(self, user_id):
+        return list(self.db.subjects.find({"user_id": user_id}).sort("name", 1))
+
+    def find_subject(self, subject_id, user_id=None):
+        query = {"_id": subject_id}
+        if user_id is not None:
+            query["user_id"] = user_id
+        return self.db.subjects.find_one(query)
+
+    def insert_subject(self, doc):
+        try:
+            return self.db.subjects.insert_one(doc).inserted_id
+        except DuplicateKeyError as e:
+            raise _duplicate(e)
+
+    def update_subject(self, subject_id, updates, user_id=None):
+        try:
+            return self.db.subjects.find_one_and_update(
+                _owned(subject_id, user_id), {"$set": updates}, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError as e:
+            raise _duplicate(e)
+
+    def delete_subject(self, subject_id):
+        notes       = list(self.db.notes.find({"subject_id": subject_id}, {"user_id": 1, "tags": 1}))
+        note_ids    = [n["_id"] for n in notes]
+        chapter_ids = [c["_id"] for c in self.db.chapters.find({"subject_id": subject_id}, {"_id": 1})]
+
+        self.db.notes.delete_many({"subject_id": subject_id})
+        self._untag(notes)
+        self.db.chapters.delete_many({"subject_id": subject_id})
+        self.db.subjects.delete_one({"_id": subject_id})
+        return {"note_ids": note_ids, "chapter_ids": chapter_ids}
+
+    def count_subjects(self, user_id):
+        return self.db.subjects.count_documents({"user_id": user_id})
+
+    # ── Chapters ──────────────────────────────────────────────────────────────
+
+    def list_chapters(self, subject_id):
+        return list(self.db.chapters.find({"subject_id": subject_id}).sort("name", 1))
+
+    def find_chapter(self, chapter_id, user_id=None, fields=None):
+        projection = {f: 1 for f in fields} if fields is not None else None
+        return self.db.chapters.find_one(_owned(chapter_id, user_id), projection)
+
+    def insert_chapter(self, doc):
+        try:
+            return self.db.chapters.insert_one(doc).inserted_id
+        except DuplicateKeyError as e:
+            raise _duplicate(e)
+
+    def update_chapter(self, chapter_id, updates, user_id=None):
+        try:
+            return self.db.chapters.find_one_and_update(
+                _owned(chapter_id, user_id), {"$set": updates}, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError as e:
+            raise _duplicate(e)
+
+    def delete_chapter(self, chapter_id):
+        notes = list(self.db.notes.find({"chapter_id": chapter_id}, {"user_id": 1, "tags": 1}))
+        self.db.notes.delete_many({"chapter_id": chapter_id})
+        self.db.chapters.delete_one({"_id": chapter_id})
+        self._untag(notes)
+        return [n["_id"] for n in notes]
+
+    def count_chapters(self, **by):
+        return self.db.chapters.count_documents(by)
+
+    # ── Notes ─────────────────────────────────────────────────────────────────
+
+    def iter_notes(self, chapter_id, batch=100):
+        yield from self.db.notes.find({"chapter_id": chapter_id}).batch_size(batch)
+
+    def list_notes(self, chapter_id, updated_after=None, updated_before=None):
+        query = {"chapter_id": chapter_id, **_updated(updated_after, updated_before)}
+        return list(self.db.notes.find(query).sort("updated_at", -1))       # (chapter_id, updated_at)
+
+    def recent_notes(self, user_id, limit):
+        return list(self.db.notes.find({"user_id": user_id}).sort("updated_at", -1).limit(limit))
+
+    def find_note(self, note_id, user_id=None):
+        query = {"_id": note_id}
+        if user_id is not None:
+            query["user_id"] = user_id
+        return self.db.notes.find_one(query)
+
+    def insert_note(self, doc):
+        note_id = self.db.notes.insert_one(doc).inserted_id
+        self._adjust_tags(doc["user_id"], Counter(doc.get("tags") or []))
+        return note_id
+
+    def update_note(self, note_id, updates, user_id=None):
+        # The old tags are needed for the tag counts, and the new values of
+        # everything else are in `updates`: fetch the note as it was, minus
+        # the fields being replaced (often the whole content), and merge
+        before = self.db.notes.find_one_and_update(
+            _owned(note_id, user_id), {"$set": updates},
+            projection={f: 0 for f in updates if f != "tags"} or None,
+        )
+        if before is None:
+            return None
+        if "tags" in updates:
+            delta = Counter(updates["tags"])
+            delta.subtract(normalize_tags(before.get("tags")))
+            self._adjust_tags(before["user_id"], delta)
+        return {**before, **updates}
+
+    def delete_note(self, note_id):
+        before = self.db.notes.find_one_and_delete({"_id": note_id}, projection={"user_id": 1, "tags": 1})
+        if before:
+            self._untag([before])
+
+    def find_notes(self, note_ids, user_id, fields=("tags",)):
+        projection = {"user_id": 1, **{f: 1 for f in fields}}
+        return list(self.db.notes.find({"_id": {"$in": list(note_ids)}, "user_id": user_id}, projection))
+
+    def iter_notes_by_id(self, note_ids, user_id, fields=None, batch=100):
+        projection = {f: 1 for f in fields} if fields is not None else {"content_text": 0, "minhash": 0, "lsh": 0}
+        yield from self.db.notes.find({"_id": {"$in": list(note_ids)}, "user_id": user_id},
+                                      projection).batch_size(batch)
+
+    def bulk_update_notes(self, notes, updates):
+        if not notes:
+            return
+        self.db.notes.bulk_write(
+            [UpdateOne({"_id": n["_id"]}, {"$set": u}) for n, u in zip(notes, updates)],
+            ordered=False,
+        )
+        deltas = {}
+        for n, u in zip(notes, updates):
+            if "tags" in u:
+                delta = deltas.setdefault(n["user_id"], Counter())
+                delta.update(u["tags"])
+                delta.subtract(normalize_tags(n.get("tags")))
+        for user_id, delta in deltas.items():
+            self._adjust_tags(user_id, delta)
+
+    def delete_notes(self, notes):
+        if not notes:
+            return
+        self.db.notes.delete_many({"_id": {"$in": [n["_id"] for n in notes]}})
+        self._untag(notes)
+
+    def count_notes(self, **by):
+        return self.db.notes.count_documents(by)
+
+    def search_notes(self, user_id, query, limit):
+        # Try MongoDB full-text search first
+        try:
+            return list(self.db.notes.find(
+                {"$text": {"$search": query}, "user_id": user_id},
+                {"score": {"$meta": "textScore"}}
+            ).sort([("score", {"$meta": "textScore"})]).limit(limit))
+        except Exception:
+            # Fallback: case-insensitive regex across title, text, tags
+            rx = {"$regex": query, "$options": "i"}
+            return list(self.db.notes.find({
+                "user_id": user_id,
+                "$or": [{"title": rx}, {"content": rx}, {"content_text": rx}, {"tags": rx}]
+            }).sort("updated_at", -1).limit(limit))
+
+    def note_texts(self, user_id):
+        # Compressed notes carry their stripped text; plain ones are small
+        for n in self.db.notes.aggregate([
+            {"$match":   {"user_id": user_id}},
+            {"$project": {"text": {"$ifNull": ["$content_text", "$content"]}}},
+        ]):
+            yield n.get("text") or ""
+
+    def notes_by_tag(self, user_id, tag, chapter_id=None, updated_after=None, updated_before=None):
+        query = {"user_id": user_id, "tags": tag,      # multikey (user_id, tags) index
+                 **_updated(updated_after, updated_before)}
+        if chapter_id is not None:
+            query["chapter_id"] = chapter_id
+        return list(self.db.notes.find(query).sort("updated_at", -1))
+
+    def browse_notes(self, user_id, filters, windows, sort, skip, limit):
+        # Filters every facet shares go in the leading $match, the only
+        # stage that can use an index: (user_id, tags) or the text index.
+        first = {"user_id": user_id}
+        if filters.get("tags"):
+            first["tags"] = {"$all": filters["tags"]}
+        if filters.get("q"):
+            first["$text"] = {"$search": filters["q"]}
+
+        own = {}                                    # dimension → its own filter
+        if filters.get("subject_ids"):
+            own["subject"] = {"subject_id": {"$in": filters["subject_ids"]}}
+        if filters.get("chapter_ids"):
+            own["chapter"] = {"chapter_id": {"$in": filters["chapter_ids"]}}
+        span = _updated(filters.get("updated_after"), filters.get("updated_before"))
+        if span:
+            own["updated"] = span
+
+        def match(skip_dim=None):
+            query = {}
+            for dim, f in own.items():
+                if dim != skip_dim:
+                    query.update(f)
+            return [{"$match": query}] if query else []
+
+        def named(coll: str, extra: dict) -> list:
+            return [
+                {"$lookup":  {"from": coll, "localField": "_id", "foreignField": "_id", "as": "ref"}},
+                {"$project": {"count": 1, "name": {"$arrayElemAt": ["$ref.name", 0]}, **extra}},
+            ]
+
+        fields = {"title": 1, "tags": 1, "subject_id": 1, "chapter_id": 1,
+                  "user_id": 1, "created_at": 1, "updated_at": 1, "seq": 1}
+        if filters.get("q"):
+            fields["score"] = {"$meta": "textScore"}
+        order = {
+            "relevance": {"score": -1, "updated_at": -1},
+            "updated":   {"updated_at": -1, "_id": -1},
+            "title":     {"title": 1, "_id": 1},
+        }[sort]
+        by_count = {"$sort": {"count": -1, "_id": 1}}
+
+        pipeline = [
+            {"$match": first},
+            {"$project": fields},                   # content never enters the facets
+            {"$facet": {
+                "notes": match() + [{"$sort": order}, {"$skip": skip}, {"$limit": limit}],
+                "total": match() + [{"$count": "n"}],
+                "subjects": match("subject") + [
+                    {"$group": {"_id": "$subject_id", "count": {"$sum": 1}}}, by_count,
+                ] + named("subjects", {}),
+                "chapters": match("chapter") + [
+                    {"$group": {"_id": "$chapter_id", "count": {"$sum": 1}}}, by_count,
+                ] + named("chapters", {"subject_id": {"$arrayElemAt": ["$ref.subject_id", 0]}}),
+                "tags": match() + [
+                    {"$unwind": "$tags"},
+                    {"$group": {"_id": "$tags", "count": {"$sum": 1}}}, by_count, {"$limit": 50},
+                ],
+                "updated": match("updated") + [{"$group": {"_id": None, **{
+                    name: {"$sum": {"$cond": [{"$gte": ["$updated_at", since]}, 1, 0]}}
+                    for name, since in windows
+                }}}],
+            }},
+        ]
+        try:
+            out, = self.db.notes.aggregate(pipeline)
+        except OperationFailure:
+            if "$text" not in first:
+                raise
+            # No text index yet — fall back to a regex, newest first
+            rx = {"$regex": filters["q"], "$options": "i"}
+            first.pop("$text")
+            first["$or"] = [{"title": rx}, {"tags": rx}, {"content_text": rx}]
+            fields.pop("score")
+            pipeline[2]["$facet"]["notes"] = match() + [
+                {"$sort": {"updated_at": -1, "_id": -1} if sort == "relevance" else order},
+                {"$skip": skip}, {"$limit": limit},
+            ]
+            out, = self.db.notes.aggregate(pipeline)
+
+        windows_row = out["updated"][0] if out["updated"] else {}
+        return {
+            "notes": out["notes"],
+            "total": out["total"][0]["n"] if out["total"] else 0,
+            "facets": {
+                "subjects": [{"id": f["_id"], "name": f.get("name"), "count": f["count"]}
+                             for f in out["subjects"]],
+                "chapters": [{"id": f["_id"], "name": f.get("name"), "subject_id": f.get("subject_id"),
+                              "count": f["count"]} for f in out["chapters"]],
+                "tags":     [{"tag": f["_id"], "count": f["count"]} for f in out["tags"]],
+                "updated":  [{"window": name, "count": windows_row.get(name, 0)} for name, _ in windows],
+            },
+        }
+
+    def library_tree(self, user_id, depth, notes_per_chapter):
+        # One aggregation; each $lookup joins on an indexed foreign field
+        # (chapters.subject_id, notes.subject_id / chapter_id).
+        count = [{"$count": "n"}]
+        if depth == 1:
+            below = [
+                {"$lookup": {"from": "chapters", "localField": "_id", "foreignField": "subject_id",
+                             "pipeline": count, "as": "chapter_count"}},
+                {"$lookup": {"from": "notes", "localField": "_id", "foreignField": "subject_id",
+                             "pipeline": count, "as": "note_count"}},
+            ]
+        else:
+            notes = count if depth == 2 else [{"$facet": {
+                "count": count,
+                "notes": [
+                    {"$sort": {"updated_at": -1}},
+                    {"$limit": notes_per_chapter},
+                    {"$project": {"title": 1, "updated_at": 1, "text": {"$substrCP": [
+                        {"$ifNull": ["$content_text", "$content"]}, 0, SNIPPET_SOURCE_CHARS,
+                    ]}}},
+                ],
+            }}]
+            below = [{"$lookup": {
+                "from": "chapters", "localField": "_id", "foreignField": "subject_id", "as": "chapters",
+                "pipeline": [
+                    {"$sort": {"name": 1}},
+                    {"$lookup": {"from": "notes", "localField": "_id", "foreignField": "chapter_id",
+                                 "pipeline": notes, "as": "notes"}},
+                ],
+            }}]
+
+        subjects = list(self.db.subjects.aggregate(
+            [{"$match": {"user_id": user_id}}, {"$sort": {"name": 1}}] + below
+        ))
+
+        n = lambda rows: rows[0]["n"] if rows else 0       # $count yields nothing for 0
+        for s in subjects:
+            if depth == 1:
+                s["chapter_count"], s["note_count"] = n(s["chapter_count"]), n(s["note_count"])
+                continue
+            for ch in s["chapters"]:
+                if depth == 2:
+                    ch["note_count"] = n(ch.pop("notes"))
+                else:
+                    facet, = ch["notes"]
+                    ch["note_count"], ch["notes"] = n(facet["count"]), facet["notes"]
+            s["chapter_count"] = len(s["chapters"])
+            s["note_count"]    = sum(ch["note_count"] for ch in s["chapters"])
+        return subjects
+
+    # ── Near-duplicates ───────────────────────────────────────────────────────
+
+    def lsh_candidates(self, user_id, keys, fields=("title",)):
+        if not keys:
+            return []
+        projection = {"minhash": 1, **{f: 1 for f in fields}}
+        return list(self.db.notes.find({"user_id": user_id, "lsh": {"$in": list(keys)}}, projection))
+
+    def lsh_buckets(self, user_id):
+        # Only band keys reach the $group; notes without a signature have none
+        return [b["ids"] for b in self.db.notes.aggregate([
+            {"$match": {"user_id": user_id}},
+            {"$project": {"lsh": 1}},
+            {"$unwind": "$lsh"},
+            {"$group": {"_id": "$lsh", "ids": {"$push": "$_id"}}},
+            {"$match": {"ids.1": {"$exists": True}}},
+        ], allowDiskUse=True)]
+
+    # ── Tags ──────────────────────────────────────────────────────────────────
+
+    def _adjust_tags(self, user_id, delta: Counter):
+        ops = [
+            UpdateOne({"user_id": user_id, "tag": tag}, {"$inc": {"count": n}}, upsert=True)
+            for tag, n in delta.items() if n
+        ]
+        if not ops:
+            return
+        self.db.tag_counts.bulk_write(ops, ordered=False)
+        if any(n < 0 for n in delta.values()):
+            self.db.tag_counts.delete_many({"user_id": user_id, "count": {"$lte": 0}})
+
+    def _untag(self, notes: list):
+        """Decrement counts for deleted notes (fetched with user_id + tags)."""
+        by_user = {}
+        for n in notes:
+            by_user.setdefault(n["user_id"], Counter()).update(normalize_tags(n.get("tags")))
+        for user_id, counts in by_user.items():
+            self._adjust_tags(user_id, Counter({t: -c for t, c in counts.items()}))
+
+    def tag_counts(self, user_id, limit=0):
+        cursor = self.db.tag_counts.find(
+            {"user_id": user_id}, {"_id": 0, "tag": 1, "count": 1}
+        ).sort([("count", -1), ("tag", 1)]).limit(limit)
+        return list(cursor)
+
+    def count_tags(self, user_id):
+        return self.db.tag_counts.count_documents({"user_id": user_id})
+
+    def rebuild_tag_counts(self, user_id=None):
+        match = {"tags.0": {"$exists": True}}
+        scope = {}
+        if user_id is not None:
+            match["user_id"] = scope["user_id"] = user_id
+        counts = list(self.db.notes.aggregate([
+            {"$match":   match},
+            {"$unwind":  "$tags"},
+            {"$group":   {"_id": {"user_id": "$user_id", "tag": "$tags"}, "count": {"$sum": 1}}},
+            {"$project": {"_id": 0, "user_id": "$_id.user_id", "tag": "$_id.tag", "count": 1}},
+        ]))
+        self.db.tag_counts.delete_many(scope)
+        if counts:
+            self.db.tag_counts.insert_many(counts, ordered=False)
+
+    # ── Activity ──────────────────────────────────────────────────────────────
+
+    def record_activity(self, user_id, date):
+        self.db.activity.update_one(
+            {"user_id": user_id, "date": date},
+            {"$inc": {"count": 1}},
+            upsert=True,
+        )
+
+    def activity_since(self, user_id, date):
+        return list(self.db.activity.find(
+            {"user_id": user_id, "date": {"$gte": date}},
+            {"_id": 0, "date": 1, "count": 1},
+        ))
+
+    def activity_log(self, user_id, limit):
+        return list(
+            self.db.activity.find({"user_id": user_id}, {"_id": 0, "user_id": 0})
+                            .sort("date", -1)
+                            .limit(limit)
+        )
+
+    # ── Delta sync ────────────────────────────────────────────────────────────
+
+    def next_seq(self, user_id, n=1):
+        # [time, n] pairs in reservation order, in the same atomic update as the
+        # $inc: the last one ends at `seq`, each one before where the next began
+        counter = self.db.counters.find_one_and_update(
+            {"_id": user_id},
+            {"$inc": {"seq": n},
+             "$push": {"reserved": {"$each": [[time.time(), n]], "$slice": -RESERVATIONS_KEPT}}},
+            projection={"seq": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return counter["seq"]
+
+    def release_seq(self, user_id, seq):
+        # Expire the reservation in place (ranges are positional); the filter on
+        # `seq` makes sure no next_seq has shifted the array meanwhile
+        for _ in range(3):
+            counter = self.db.counters.find_one({"_id": user_id})
+            if not counter:
+                return
+            reserved, end = counter.get("reserved", []), counter["seq"]
+            for i in range(len(reserved) - 1, -1, -1):
+                if end == seq:
+                    break
+                end -= reserved[i][1]
+            else:
+                return
+            result = self.db.counters.update_one(
+                {"_id": user_id, "seq": counter["seq"]}, {"$set": {f"reserved.{i}.0": 0}}
+            )
+            if result.matched_count:
+                return
+
+    def reserved_seqs(self, user_id, within):
+        counter = self.db.counters.find_one({"_id": user_id})
+        if not counter:
+            return []
+        cutoff = time.time() - min(within, RESERVATION_SECONDS)
+        ranges, end = [], counter["seq"]
+        for at, n in reversed(counter.get("reserved", [])):
+            if at >= cutoff:
+                ranges.append((end - n + 1, end))
+            end -= n
+        return ranges
+
+    def insert_tombstones(self, docs):
+        self.db.tombstones.insert_many(docs)
+
+    def changes_since(self, user_id, since, limit, full=True):
+        match = {"user_id": user_id, "seq": {"$gt": since}}
+        heads = {
+            "subjects":   {"seq": 1},
+            "chapters":   {"seq": 1},
+            "notes":      {"seq": 1},
+            "tombstones": {"seq": 1, "kind": 1, "ref_id": 1},
+        }
+        # Each collection is seq-ordered, so the first `limit + 1` changes
+        # overall are among the first `limit + 1` of each.
+        changes = []
+        for coll, head in heads.items():
+            projection = None if full else head
+            for doc in self.db[coll].find(match, projection).sort("seq", 1).limit(limit + 1):
+                changes.append((doc["seq"], coll, doc))
+        changes.sort(key=lambda c: c[0])
+        return changes[:limit + 1]
+
+    def close(self):
+        self._db.client.close()
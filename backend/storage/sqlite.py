@@ -0,0 +1,869 @@
+"""
+storage/sqlite.py — Embedded SQLite backend for single-node deployments
+
+One database file in WAL mode (readers never block the writer), FTS5 for
+note search. ObjectIds are kept as 24-char hex strings so ids and API
+responses look the same as with MongoDB; timestamps as fixed-width ISO
+text, which sorts and compares like the datetimes it comes back as.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from bson import ObjectId
+from config import deadline
+from models.note import strip_html, normalize_tags, note_text, SNIPPET_SOURCE_CHARS, DATE_FIELDS, as_datetime
+from models.dedup import dedup_fields
+from storage.base import Repository, DuplicateError, RESERVATION_SECONDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id          TEXT PRIMARY KEY,
+    username    TEXT NOT NULL UNIQUE,
+    email       TEXT NOT NULL UNIQUE,
+    password    TEXT NOT NULL,
+    avatar      TEXT,
+    created_at  TEXT,
+    updated_at  TEXT
+);
+
+CREATE TABLE IF NOT EXISTS subjects (
+    id          TEXT PRIMARY KEY,
+    user_id     TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    color       TEXT,
+    icon        TEXT,
+    created_at  TEXT,
+    updated_at  TEXT,
+    seq         INTEGER,
+    UNIQUE (user_id, name)
+);
+CREATE INDEX IF NOT EXISTS subjects_user_seq ON subjects (user_id, seq);
+
+CREATE TABLE IF NOT EXISTS chapters (
+    id          TEXT PRIMARY KEY,
+    user_id     TEXT NOT NULL,
+    subject_id  TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    icon        TEXT,
+    created_at  TEXT,
+    updated_at  TEXT,
+    seq         INTEGER,
+    UNIQUE (subject_id, name)
+);
+CREATE INDEX IF NOT EXISTS chapters_user_seq ON chapters (user_id, seq);
+
+CREATE TABLE IF NOT EXISTS notes (
+    id            TEXT PRIMARY KEY,
+    user_id       TEXT NOT NULL,
+    subject_id    TEXT NOT NULL,
+    chapter_id    TEXT NOT NULL,
+    title         TEXT,
+    content,                          -- TEXT, or BLOB when content_codec is set
+    content_codec TEXT,
+    content_text  TEXT,
+    tags          TEXT,               -- JSON array
+    created_at    TEXT,
+    updated_at    TEXT,
+    seq           INTEGER,
+    minhash       TEXT,               -- JSON array (models/dedup.py)
+    lsh           TEXT                -- JSON array of band keys, mirrored in note_lsh
+);
+CREATE INDEX IF NOT EXISTS notes_chapter_updated ON notes (chapter_id, updated_at);
+CREATE INDEX IF NOT EXISTS notes_subject ON notes (subject_id);
+CREATE INDEX IF NOT EXISTS notes_user_updated ON notes (user_id, updated_at);
+CREATE INDEX IF NOT EXISTS notes_user_seq ON notes (user_id, seq);
+-- Covers the browse facets and counts without reading note rows
+CREATE INDEX IF NOT EXISTS notes_user_facets ON notes (user_id, subject_id, chapter_id, updated_at, id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5 (
+    title, body, tags, tokenize = 'unicode61 remove_diacritics 2'
+);
+
+-- One row per (note, tag): the multikey index Mongo keeps on notes.tags
+CREATE TABLE IF NOT EXISTS note_tags (
+    note_id     TEXT NOT NULL,
+    user_id     TEXT NOT NULL,
+    tag         TEXT NOT NULL,
+    PRIMARY KEY (note_id, tag)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS note_tags_user_tag ON note_tags (user_id, tag);
+
+CREATE TABLE IF NOT EXISTS tag_counts (
+    user_id     TEXT NOT NULL,
+    tag         TEXT NOT NULL,
+    count       INTEGER NOT NULL,
+    PRIMARY KEY (user_id, tag)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tag_counts_user_count ON tag_counts (user_id, count);
+
+CREATE TRIGGER IF NOT EXISTS note_tags_count_add AFTER INSERT ON note_tags BEGIN
+    INSERT INTO tag_counts (user_id, tag, count) VALUES (NEW.user_id, NEW.tag, 1)
+        ON CONFLICT (user_id, tag) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS note_tags_count_remove AFTER DELETE ON note_tags BEGIN
+    UPDATE tag_counts SET count = count - 1 WHERE user_id = OLD.user_id AND tag = OLD.tag;
+    DELETE FROM tag_counts WHERE user_id = OLD.user_id AND tag = OLD.tag AND count <= 0;
+END;
+
+CREATE TABLE IF NOT EXISTS activity (
+    user_id     TEXT NOT NULL,
+    date        TEXT NOT NULL,
+    count       INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, date)
+);
+
+CREATE TABLE IF NOT EXISTS counters (
+    user_id     TEXT PRIMARY KEY,
+    seq         INTEGER NOT NULL
+);
+
+-- next_seq reservations of the last RESERVATION_SECONDS: `last` - `n` + 1 .. `last`
+CREATE TABLE IF NOT EXISTS seq_reservations (
+    user_id     TEXT NOT NULL,
+    last        INTEGER NOT NULL,
+    n           INTEGER NOT NULL,
+    at          REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS seq_reservations_user_at ON seq_reservations (user_id, at);
+
+CREATE TABLE IF NOT EXISTS tombstones (
+    id          INTEGER PRIMARY KEY,
+    user_id     TEXT NOT NULL,
+    kind        TEXT NOT NULL,
+    ref_id      TEXT NOT NULL,
+    seq         INTEGER NOT NULL,
+    deleted_at  TEXT
+);
+CREATE INDEX IF NOT EXISTS tombstones_user_seq ON tombstones (user_id, seq);
+"""
+
+# Created by _migrate (v2), once notes has its `lsh` column
+LSH_SCHEMA = """
+-- One row per (note, LSH band key): the multikey index Mongo keeps on notes.lsh
+CREATE TABLE IF NOT EXISTS note_lsh (
+    user_id     TEXT NOT NULL,
+    band        INTEGER NOT NULL,
+    note_id     TEXT NOT NULL,
+    PRIMARY KEY (user_id, band, note_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS note_lsh_note ON note_lsh (note_id);
+
+CREATE TRIGGER IF NOT EXISTS notes_lsh_insert AFTER INSERT ON notes BEGIN
+    INSERT OR IGNORE INTO note_lsh SELECT NEW.user_id, value, NEW.id FROM json_each(NEW.lsh);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_lsh_update AFTER UPDATE OF lsh ON notes BEGIN
+    DELETE FROM note_lsh WHERE note_id = OLD.id;
+    INSERT OR IGNORE INTO note_lsh SELECT NEW.user_id, value, NEW.id FROM json_each(NEW.lsh);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_lsh_delete AFTER DELETE ON notes BEGIN
+    DELETE FROM note_lsh WHERE note_id = OLD.id;
+END;
+"""
+
+SCHEMA_VERSION = 2
+
+# VM instructions between checks of the request's deadline (config/deadline.py)
+PROGRESS_STEPS = 10_000
+
+_COLUMNS = {
+    "users":    ("username", "email", "password", "avatar", "created_at", "updated_at"),
+    "subjects": ("user_id", "name", "color", "icon", "created_at", "updated_at", "seq"),
+    "chapters": ("user_id", "subject_id", "name", "icon", "created_at", "updated_at", "seq"),
+    "notes":    ("user_id", "subject_id", "chapter_id", "title", "content", "content_codec",
+                 "content_text", "tags", "created_at", "updated_at", "seq",
+                 "minhash", "lsh"),
+}
+_REFS = ("user_id", "subject_id", "chapter_id", "ref_id")
+
+
+def _doc(row) -> dict:
+    """sqlite3.Row → Mongo-shaped document."""
+    if row is None:
+        return None
+    d = dict(row)
+    if "id" in d:
+        d["_id"] = ObjectId(d.pop("id"))
+    for key in _REFS:
+        if d.get(key):
+            d[key] = ObjectId(d[key])
+    if isinstance(d.get("tags"), str) and d["tags"].startswith("["):
+        d["tags"] = json.loads(d["tags"])
+    for key in ("minhash", "lsh"):
+        if isinstance(d.get(key), str):
+            d[key] = json.loads(d[key])
+    for key in DATE_FIELDS:
+        if key in d:
+            d[key] = as_datetime(d[key])
+    return d
+
+
+def _param(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, list):
+        return json.dumps(value)
+    if isinstance(value, datetime):
+        return value.isoformat(timespec="microseconds")
+    return value
+
+
+def _updated(column: str, after, before) -> tuple:
+    """(" AND …" clause, params) for `column` in [after, before); ("", []) if unbounded."""
+    clause, params = "", []
+    if after is not None:
+        clause += f" AND {column} >= ?"
+        params.append(_param(after))
+    if before is not None:
+        clause += f" AND {column} < ?"
+        params.append(_param(before))
+    return clause, params
+
+
+def _chunks(values: list, size: int = 500):
+    """Split long IN (...) lists below SQLite's bound-parameter limit."""
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _fts_query(query: str) -> str:
+    """Quote each word so user input can't break FTS5 syntax; any word matches."""
+    words = re.findall(r"\w+", query)
+    return " OR ".join('"%s"' % w for w in words)
+
+
+class SQLiteRepository(Repository):
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path   = path
+        self._local = threading.local()
+        self._conns = []                 # every thread's connection, for close()
+        self._lock  = threading.Lock()
+        self._conn().executescript(SCHEMA)
+        self._migrate()
+
+    # ── Connection handling ───────────────────────────────────────────────────
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=5,
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            # Interrupt a statement once the request's budget has run out
+            conn.set_progress_handler(deadline.expired, PROGRESS_STEPS)
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    @contextmanager
+    def _tx(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            # An interrupted statement may already have rolled the transaction back
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def _migrate(self):
+        """Bring databases created by older versions up to SCHEMA_VERSION."""
+        conn    = self._conn()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        if version < 2:
+            have = {r["name"] for r in conn.execute("PRAGMA table_info(notes)")}
+            for col in ("minhash", "lsh"):
+                if col not in have:
+                    conn.execute(f"ALTER TABLE notes ADD COLUMN {col} TEXT")
+            conn.executescript(LSH_SCHEMA)
+        with self._tx() as conn:
+            if version < 1:
+                # v1: tags went from comma strings to JSON arrays + note_tags rows
+                for row in conn.execute("SELECT id, user_id, tags FROM notes").fetchall():
+                    tags = normalize_tags(_doc({"tags": row["tags"]})["tags"])
+                    conn.execute("UPDATE notes SET tags = ? WHERE id = ?", [json.dumps(tags), row["id"]])
+                    self._set_note_tags(conn, row["id"], row["user_id"], tags)
+            if version < 2:
+                # v2: MinHash signatures + LSH band keys for near-duplicate detection
+                for row in conn.execute(
+                    "SELECT id, content, content_codec, content_text FROM notes WHERE lsh IS NULL"
+                ).fetchall():
+                    fields = dedup_fields(note_text(dict(row)))
+                    conn.execute("UPDATE notes SET minhash = ?, lsh = ? WHERE id = ?",
+                                 [_param(fields["minhash"]), _param(fields["lsh"]), row["id"]])
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _one(self, sql: str, *params):
+        return _doc(self._conn().execute(sql, [_param(p) for p in params]).fetchone())
+
+    def _all(self, sql: str, *params) -> list:
+        return [_doc(r) for r in self._conn().execute(sql, [_param(p) for p in params])]
+
+    def _scalar(self, sql: str, *params):
+        return self._conn().execute(sql, [_param(p) for p in params]).fetchone()[0]
+
+    def _insert(self, conn, table: str, doc: dict):
+        doc["_id"] = doc.get("_id") or ObjectId()
+        cols = ["id"] + [c for c in _COLUMNS[table] if c in doc]
+        vals = [str(doc["_id"])] + [_param(doc[c]) for c in cols[1:]]
+        try:
+            conn.execute(
+                f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                vals,
+            )
+        except sqlite3.IntegrityError as e:
+            raise DuplicateError(str(e).rsplit(".", 1)[-1])
+        return doc["_id"]
+
+    def _update(self, conn, table: str, _id, updates: dict, user_id=None, returning: bool = True):
+        """Apply `updates` to the row, if owned by `user_id` when given; the row after, or None."""
+        cols   = [c for c in _COLUMNS[table] if c in updates]
+        where  = "id = ?" if user_id is None else "id = ? AND user_id = ?"
+        params = [str(_id)] if user_id is None else [str(_id), str(user_id)]
+        if not cols:
+            return self._one(f"SELECT * FROM {table} WHERE {where}", *params) if returning else None
+        try:
+            cursor = conn.execute(
+                f"UPDATE {table} SET {', '.join(c + ' = ?' for c in cols)} WHERE {where}"
+                + (" RETURNING *" if returning else ""),
+                [_param(updates[c]) for c in cols] + params,
+            )
+            return _doc(cursor.fetchone()) if returning else None
+        except sqlite3.IntegrityError as e:
+            raise DuplicateError(str(e).rsplit(".", 1)[-1])
+
+    def _index_note(self, conn, note_id):
+        row = conn.execute(
+            "SELECT rowid, title, content, content_text, tags FROM notes WHERE id = ?",
+            [str(note_id)],
+        ).fetchone()
+        conn.execute("DELETE FROM notes_fts WHERE rowid = ?", [row["rowid"]])
+        body = row["content_text"] if row["content_text"] is not None else strip_html(row["content"])
+        tags = " ".join(_doc({"tags": row["tags"]})["tags"] or [])
+        conn.execute(
+            "INSERT INTO notes_fts (rowid, title, body, tags) VALUES (?, ?, ?, ?)",
+            [row["rowid"], row["title"], body, tags],
+        )
+
+    def _unindex_notes(self, conn, where: str, value):
+        """Drop notes' search rows and tags (which updates tag_counts)."""
+        conn.execute(
+            f"DELETE FROM notes_fts WHERE rowid IN (SELECT rowid FROM notes WHERE {where} = ?)",
+            [str(value)],
+        )
+        conn.execute(
+            f"DELETE FROM note_tags WHERE note_id IN (SELECT id FROM notes WHERE {where} = ?)",
+            [str(value)],
+        )
+
+    def _set_note_tags(self, conn, note_id, user_id, tags: list):
+        conn.execute("DELETE FROM note_tags WHERE note_id = ?", [str(note_id)])
+        conn.executemany(
+            "INSERT INTO note_tags (note_id, user_id, tag) VALUES (?, ?, ?)",
+            [(str(note_id), str(user_id), tag) for tag in tags],
+        )
+
+    def close(self):
+        """Checkpoint the WAL into the main file and close every connection."""
+        with self._lock:
+            conns, self._conns = self._conns, []
+        for i, conn in enumerate(conns):
+            try:
+                if i == 0:
+                    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+    # ── Users ─────────────────────────────────────────────────────────────────
+
+    def insert_user(self, doc):
+        with self._tx() as conn:
+            return self._insert(conn, "users", doc)
+
+    def find_user(self, user_id):
+        return self._one("SELECT * FROM users WHERE id = ?", user_id)
+
+    def find_user_by_email(self, email):
+        return self._one("SELECT * FROM users WHERE email = ?", email)
+
+    def update_user(self, user_id, updates):
+        with self._tx() as conn:
+            return self._update(conn, "users", user_id, updates)
+
+    # ── Subjects ──────────────────────────────────────────────────────────────
+
+    def list_subjects(self, user_id):
+        return self._all("SELECT * FROM subjects WHERE user_id = ? ORDER BY name", user_id)
+
+    def find_subject(self, subject_id, user_id=None):
+        if user_id is None:
+            return self._one("SELECT * FROM subjects WHERE id = ?", subject_id)
+        return self._one("SELECT * FROM subjects WHERE id = ? AND user_id = ?", subject_id, user_id)
+
+    def insert_subject(self, doc):
+        with self._tx() as conn:
+            return self._insert(conn, "subjects", doc)
+
+    def update_subject(self, subject_id, updates, user_id=None):
+        with self._tx() as conn:
+            return self._update(conn, "subjects", subject_id, updates, user_id)
+
+    def delete_subject(self, subject_id):
+        sid = str(subject_id)
+        with self._tx() as conn:
+            note_ids    = [ObjectId(r[0]) for r in conn.execute("SELECT id FROM notes WHERE subject_id = ?", [sid])]
+            chapter_ids = [ObjectId(r[0]) for r in conn.execute("SELECT id FROM chapters WHERE subject_id = ?", [sid])]
+            self._unindex_notes(conn, "subject_id", sid)
+            conn.execute("DELETE FROM notes WHERE subject_id = ?", [sid])
+            conn.execute("DELETE FROM chapters WHERE subject_id = ?", [sid])
+            conn.execute("DELETE FROM subjects WHERE id = ?", [sid])
+        return {"note_ids": note_ids, "chapter_ids": chapter_ids}
+
+    def count_subjects(self, user_id):
+        return self._scalar("SELECT COUNT(*) FROM subjects WHERE user_id = ?", user_id)
+
+    # ── Chapters ──────────────────────────────────────────────────────────────
+
+    def list_chapters(self, subject_id):
+        return self._all("SELECT * FROM chapters WHERE subject_id = ? ORDER BY name", subject_id)
+
+    def find_chapter(self, chapter_id, user_id=None, fields=None):
+        cols = ", ".join(["id", *fields]) if fields is not None else "*"
+        if user_id is None:
+            return self._one(f"SELECT {cols} FROM chapters WHERE id = ?", chapter_id)
+        return self._one(f"SELECT {cols} FROM chapters WHERE id = ? AND user_id = ?", chapter_id, user_id)
+
+    def insert_chapter(self, doc):
+        with self._tx() as conn:
+            return self._insert(conn, "chapters", doc)
+
+    def update_chapter(self, chapter_id, updates, user_id=None):
+        with self._tx() as conn:
+            return self._update(conn, "chapters", chapter_id, updates, user_id)
+
+    def delete_chapter(self, chapter_id):
+        cid = str(chapter_id)
+        with self._tx() as conn:
+            note_ids = [ObjectId(r[0]) for r in conn.execute("SELECT id FROM notes WHERE chapter_id = ?", [cid])]
+            self._unindex_notes(conn, "chapter_id", cid)
+            conn.execute("DELETE FROM notes WHERE chapter_id = ?", [cid])
+            conn.execute("DELETE FROM chapters WHERE id = ?", [cid])
+        return note_ids
+
+    def count_chapters(self, **by):
+        (key, value), = by.items()
+        return self._scalar(f"SELECT COUNT(*) FROM chapters WHERE {key} = ?", value)
+
+    # ── Notes ─────────────────────────────────────────────────────────────────
+
+    def iter_notes(self, chapter_id, batch=100):
+        cursor = self._conn().execute("SELECT * FROM notes WHERE chapter_id = ?", [str(chapter_id)])
+        try:
+            while True:
+                rows = cursor.fetchmany(batch)
+                if not rows:
+                    return
+                for row in rows:
+                    yield _doc(row)
+        finally:
+            cursor.close()
+
+    def list_notes(self, chapter_id, updated_after=None, updated_before=None):
+        span, params = _updated("updated_at", updated_after, updated_before)
+        return self._all(                           # notes_chapter_updated index
+            f"SELECT * FROM notes WHERE chapter_id = ?{span} ORDER BY updated_at DESC", chapter_id, *params
+        )
+
+    def recent_notes(self, user_id, limit):
+        return self._all(
+            "SELECT * FROM notes WHERE user_id = ? ORDER BY updated_at DESC LIMIT ?", user_id, limit
+        )
+
+    def find_note(self, note_id, user_id=None):
+        if user_id is None:
+            return self._one("SELECT * FROM notes WHERE id = ?", note_id)
+        return self._one("SELECT * FROM notes WHERE id = ? AND user_id = ?", note_id, user_id)
+
+    def insert_note(self, doc):
+        with self._tx() as conn:
+            note_id = self._insert(conn, "notes", doc)
+            self._index_note(conn, note_id)
+            self._set_note_tags(conn, note_id, doc["user_id"], doc.get("tags") or [])
+        return note_id
+
+    def update_note(self, note_id, updates, user_id=None):
+        with self._tx() as conn:
+            note = self._update(conn, "notes", note_id, updates, user_id)
+            if note is None:
+                return None
+            if {"title", "content", "tags"} & set(updates):
+                self._index_note(conn, note_id)
+            if "tags" in updates:
+                self._set_note_tags(conn, note_id, note["user_id"], updates["tags"])
+        return note
+
+    def delete_note(self, note_id):
+        with self._tx() as conn:
+            self._unindex_notes(conn, "id", note_id)
+            conn.execute("DELETE FROM notes WHERE id = ?", [str(note_id)])
+
+    def find_notes(self, note_ids, user_id, fields=("tags",)):
+        cols  = ", ".join(["id", "user_id", *fields])
+        found = []
+        for chunk in _chunks([str(i) for i in note_ids]):
+            # +user_id: look rows up by primary key, not by scanning the user's notes_user_facets range
+            found += self._all(
+                f"SELECT {cols} FROM notes WHERE +user_id = ? AND id IN ({', '.join('?' * len(chunk))})",
+                user_id, *chunk,
+            )
+        return found
+
+    def iter_notes_by_id(self, note_ids, user_id, fields=None, batch=100):
+        cols = ", ".join(["id", *fields]) if fields is not None else ", ".join(
+            c for c in ("id", *_COLUMNS["notes"]) if c not in ("content_text", "minhash", "lsh"))
+        for chunk in _chunks([str(i) for i in note_ids]):
+            cursor = self._conn().execute(
+                f"SELECT {cols} FROM notes WHERE +user_id = ? AND id IN ({', '.join('?' * len(chunk))})",
+                [str(user_id), *chunk],
+            )
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield _doc(row)
+            finally:
+                cursor.close()
+
+    def bulk_update_notes(self, notes, updates):
+        with self._tx() as conn:
+            for n, u in zip(notes, updates):
+                self._update(conn, "notes", n["_id"], u, returning=False)
+                if {"title", "content", "tags"} & set(u):
+                    self._index_note(conn, n["_id"])
+                if "tags" in u:
+                    self._set_note_tags(conn, n["_id"], n["user_id"], u["tags"])
+
+    def delete_notes(self, notes):
+        with self._tx() as conn:
+            for chunk in _chunks([str(n["_id"]) for n in notes]):
+                marks = ", ".join("?" * len(chunk))
+                conn.execute(f"DELETE FROM notes_fts WHERE rowid IN (SELECT rowid FROM notes WHERE id IN ({marks}))", chunk)
+                conn.execute(f"DELETE FROM note_tags WHERE note_id IN ({marks})", chunk)
+                conn.execute(f"DELETE FROM notes WHERE id IN ({marks})", chunk)
+
+    def count_notes(self, **by):
+        (key, value), = by.items()
+        return self._scalar(f"SELECT COUNT(*) FROM notes WHERE {key} = ?", value)
+
+    def search_notes(self, user_id, query, limit):
+        match = _fts_query(query)
+        if not match:
+            return []
+        return self._all(
+            """SELECT n.* FROM notes_fts f JOIN notes n ON n.rowid = f.rowid
+               WHERE notes_fts MATCH ? AND n.user_id = ?
+               ORDER BY bm25(notes_fts) LIMIT ?""",
+            match, user_id, limit,
+        )
+
+    def note_texts(self, user_id):
+        for row in self._conn().execute(
+            "SELECT COALESCE(content_text, content) FROM notes WHERE user_id = ?", [str(user_id)]
+        ):
+            yield row[0] or ""
+
+    def notes_by_tag(self, user_id, tag, chapter_id=None, updated_after=None, updated_before=None):
+        span, params = _updated("n.updated_at", updated_after, updated_before)
+        sql = f"""SELECT n.* FROM note_tags t JOIN notes n ON n.id = t.note_id
+                  WHERE t.user_id = ? AND t.tag = ?{span}"""
+        params = [user_id, tag, *params]
+        if chapter_id is not None:
+            sql += " AND n.chapter_id = ?"
+            params.append(chapter_id)
+        return self._all(sql + " ORDER BY n.updated_at DESC", *params)
+
+    def browse_notes(self, user_id, filters, windows, sort, skip, limit):
+        # Shared filters: owner, text match, every required tag. The text
+        # match runs once as a subquery; as a join, SQLite would probe the
+        # FTS index once per candidate note.
+        shared, params = ["n.user_id = ?"], [str(user_id)]
+        match = _fts_query(filters.get("q") or "")
+        if match:
+            shared.append("n.rowid IN (SELECT rowid FROM notes_fts WHERE notes_fts MATCH ?)")
+            params.append(match)
+        for tag in filters.get("tags") or []:
+            shared.append("n.id IN (SELECT note_id FROM note_tags WHERE user_id = ? AND tag = ?)")
+            params += [str(user_id), tag]
+
+        own = {}                                    # dimension → (clause, params)
+        for dim, col in (("subject", "subject_id"), ("chapter", "chapter_id")):
+            ids = [str(i) for i in filters.get(f"{col}s") or []]
+            if ids:
+                own[dim] = (f"n.{col} IN ({', '.join('?' * len(ids))})", ids)
+        span, span_params = _updated("n.updated_at", filters.get("updated_after"), filters.get("updated_before"))
+        if span:
+            own["updated"] = (span.removeprefix(" AND "), span_params)
+
+        def where(skip_dim=None):
+            clauses, args = list(shared), list(params)
+            for dim, (clause, extra) in own.items():
+                if dim != skip_dim:
+                    clauses.append(clause)
+                    args += extra
+            return " AND ".join(clauses), args
+
+        order = {
+            "relevance": "bm25(notes_fts), n.updated_at DESC" if match else "n.updated_at DESC, n.id DESC",
+            "updated":   "n.updated_at DESC, n.id DESC",
+            "title":     "n.title, n.id",
+        }[sort]
+        source = "notes n"
+        if match and sort == "relevance":           # bm25() needs the FTS table in the query
+            source = "notes_fts f CROSS JOIN notes n ON n.rowid = f.rowid AND notes_fts MATCH ?"
+
+        conn = self._conn()
+        conn.execute("BEGIN")                       # one snapshot for the page and every facet
+        try:
+            sql, args = where()
+            notes = [_doc(r) for r in conn.execute(
+                f"""SELECT n.id, n.user_id, n.subject_id, n.chapter_id, n.title, n.tags,
+                           n.created_at, n.updated_at, n.seq
+                    FROM {source} WHERE {sql} ORDER BY {order} LIMIT ? OFFSET ?""",
+                ([match] if source != "notes n" else []) + args + [limit, skip],
+            )]
+            total = conn.execute(f"SELECT COUNT(*) FROM notes n WHERE {sql}", args).fetchone()[0]
+            if len(args) == 1:                      # unfiltered: the maintained counts
+                tags = conn.execute(
+                    "SELECT tag, count FROM tag_counts WHERE user_id = ? ORDER BY count DESC, tag LIMIT 50",
+                    args,
+                ).fetchall()
+            else:
+                tags = conn.execute(
+                    f"""SELECT t.tag, COUNT(*) AS count FROM notes n JOIN note_tags t ON t.note_id = n.id
+                        WHERE {sql} GROUP BY t.tag ORDER BY count DESC, t.tag LIMIT 50""",
+                    args,
+                ).fetchall()
+
+            sql, args = where("subject")
+            subjects = conn.execute(
+                f"""SELECT n.subject_id AS id, s.name, COUNT(*) AS count
+                    FROM notes n LEFT JOIN subjects s ON s.id = n.subject_id
+                    WHERE {sql} GROUP BY n.subject_id ORDER BY count DESC, n.subject_id""",
+                args,
+            ).fetchall()
+
+            sql, args = where("chapter")
+            chapters = conn.execute(
+                f"""SELECT n.chapter_id AS id, c.name, c.subject_id, COUNT(*) AS count
+                    FROM notes n LEFT JOIN chapters c ON c.id = n.chapter_id
+                    WHERE {sql} GROUP BY n.chapter_id ORDER BY count DESC, n.chapter_id""",
+                args,
+            ).fetchall()
+
+            sql, args = where("updated")
+            sums = ", ".join("COALESCE(SUM(n.updated_at >= ?), 0)" for _ in windows) or "NULL"
+            counts = conn.execute(
+                f"SELECT {sums} FROM notes n WHERE {sql}", [_param(since) for _, since in windows] + args,
+            ).fetchone()
+        finally:
+            conn.execute("COMMIT")
+
+        oid = lambda v: ObjectId(v) if v else None
+        return {
+            "notes": notes,
+            "total": total,
+            "facets": {
+                "subjects": [{"id": oid(r["id"]), "name": r["name"], "count": r["count"]} for r in subjects],
+                "chapters": [{"id": oid(r["id"]), "name": r["name"], "subject_id": oid(r["subject_id"]),
+                              "count": r["count"]} for r in chapters],
+                "tags":     [{"tag": r["tag"], "count": r["count"]} for r in tags],
+                "updated":  [{"window": name, "count": counts[i]} for i, (name, _) in enumerate(windows)],
+            },
+        }
+
+    def library_tree(self, user_id, depth, notes_per_chapter):
+        uid  = str(user_id)
+        conn = self._conn()
+        conn.execute("BEGIN")                       # one snapshot for every level
+        try:
+            subjects = self._all("SELECT * FROM subjects WHERE user_id = ? ORDER BY name", uid)
+            if depth == 1:
+                chapter_counts = dict(conn.execute(
+                    "SELECT subject_id, COUNT(*) FROM chapters WHERE user_id = ? GROUP BY subject_id", [uid]
+                ).fetchall())
+                note_counts = dict(conn.execute(
+                    "SELECT subject_id, COUNT(*) FROM notes WHERE user_id = ? GROUP BY subject_id", [uid]
+                ).fetchall())
+                for s in subjects:
+                    s["chapter_count"] = chapter_counts.get(str(s["_id"]), 0)
+                    s["note_count"]    = note_counts.get(str(s["_id"]), 0)
+                return subjects
+
+            chapters = self._all("SELECT * FROM chapters WHERE user_id = ? ORDER BY name", uid)
+            note_counts = dict(conn.execute(
+                "SELECT chapter_id, COUNT(*) FROM notes WHERE user_id = ? GROUP BY chapter_id", [uid]
+            ).fetchall())
+
+            headers = {}
+            if depth >= 3:
+                # Rank on the covering index first, then read text for the kept rows only
+                for row in conn.execute(
+                    """SELECT n.id, n.chapter_id, n.title, n.updated_at,
+                              substr(COALESCE(n.content_text, n.content), 1, ?) AS text
+                       FROM (SELECT rowid AS r, ROW_NUMBER() OVER (
+                                 PARTITION BY chapter_id ORDER BY updated_at DESC) AS rank
+                             FROM notes WHERE user_id = ?) ranked
+                       JOIN notes n ON n.rowid = ranked.r
+                       WHERE ranked.rank <= ? ORDER BY n.chapter_id, ranked.rank""",
+                    [SNIPPET_SOURCE_CHARS, uid, notes_per_chapter],
+                ):
+                    note = _doc(row)
+                    headers.setdefault(note.pop("chapter_id"), []).append(note)
+        finally:
+            conn.execute("COMMIT")
+
+        by_subject = {}
+        for ch in chapters:
+            ch["note_count"] = note_counts.get(str(ch["_id"]), 0)
+            if depth >= 3:
+                ch["notes"] = headers.get(ch["_id"], [])
+            by_subject.setdefault(ch["subject_id"], []).append(ch)
+        for s in subjects:
+            s["chapters"]      = by_subject.get(s["_id"], [])
+            s["chapter_count"] = len(s["chapters"])
+            s["note_count"]    = sum(ch["note_count"] for ch in s["chapters"])
+        return subjects
+
+    # ── Near-duplicates ───────────────────────────────────────────────────────
+
+    def lsh_candidates(self, user_id, keys, fields=("title",)):
+        if not keys:
+            return []
+        cols = ", ".join(["id", "minhash", *fields])
+        return self._all(
+            f"""SELECT {cols} FROM notes WHERE id IN (
+                    SELECT note_id FROM note_lsh WHERE user_id = ? AND band IN ({', '.join('?' * len(keys))}))""",
+            user_id, *keys,
+        )
+
+    def lsh_buckets(self, user_id):
+        # Find the shared keys first: group_concat over every key costs more
+        buckets = {}
+        for band, note_id in self._conn().execute(
+            """WITH shared AS (SELECT band FROM note_lsh WHERE user_id = ? GROUP BY band HAVING COUNT(*) > 1)
+               SELECT band, note_id FROM note_lsh WHERE user_id = ? AND band IN shared""",
+            [str(user_id)] * 2,
+        ):
+            buckets.setdefault(band, []).append(ObjectId(note_id))
+        return list(buckets.values())
+
+    # ── Tags ──────────────────────────────────────────────────────────────────
+
+    def tag_counts(self, user_id, limit=0):
+        rows = self._conn().execute(
+            "SELECT tag, count FROM tag_counts WHERE user_id = ? ORDER BY count DESC, tag LIMIT ?",
+            [str(user_id), limit or -1],
+        )
+        return [dict(r) for r in rows]
+
+    def count_tags(self, user_id):
+        return self._scalar("SELECT COUNT(*) FROM tag_counts WHERE user_id = ?", user_id)
+
+    def rebuild_tag_counts(self, user_id=None):
+        where, params = ("WHERE user_id = ?", [str(user_id)]) if user_id is not None else ("", [])
+        with self._tx() as conn:
+            conn.execute(f"DELETE FROM tag_counts {where}", params)
+            conn.execute(
+                f"""INSERT INTO tag_counts (user_id, tag, count)
+                    SELECT user_id, tag, COUNT(*) FROM note_tags {where} GROUP BY user_id, tag""",
+                params,
+            )
+
+    # ── Activity ──────────────────────────────────────────────────────────────
+
+    def record_activity(self, user_id, date):
+        self._conn().execute(
+            """INSERT INTO activity (user_id, date, count) VALUES (?, ?, 1)
+               ON CONFLICT (user_id, date) DO UPDATE SET count = count + 1""",
+            [str(user_id), date],
+        )
+
+    def activity_since(self, user_id, date):
+        rows = self._conn().execute(
+            "SELECT date, count FROM activity WHERE user_id = ? AND date >= ?", [str(user_id), date]
+        )
+        return [dict(r) for r in rows]
+
+    def activity_log(self, user_id, limit):
+        rows = self._conn().execute(
+            "SELECT date, count FROM activity WHERE user_id = ? ORDER BY date DESC LIMIT ?",
+            [str(user_id), limit],
+        )
+        return [dict(r) for r in rows]
+
+    # ── Delta sync ────────────────────────────────────────────────────────────
+
+    def next_seq(self, user_id, n=1):
+        now = time.time()
+        with self._tx() as conn:
+            last = conn.execute(
+                """INSERT INTO counters (user_id, seq) VALUES (?, ?)
+                   ON CONFLICT (user_id) DO UPDATE SET seq = seq + excluded.seq
+                   RETURNING seq""",
+                [str(user_id), n],
+            ).fetchone()[0]
+            conn.execute("INSERT INTO seq_reservations (user_id, last, n, at) VALUES (?, ?, ?, ?)",
+                         [str(user_id), last, n, now])
+            conn.execute("DELETE FROM seq_reservations WHERE user_id = ? AND at < ?",
+                         [str(user_id), now - RESERVATION_SECONDS])
+        return last
+
+    def release_seq(self, user_id, seq):
+        with self._tx() as conn:
+            conn.execute("DELETE FROM seq_reservations WHERE user_id = ? AND last = ?", [str(user_id), seq])
+
+    def reserved_seqs(self, user_id, within):
+        rows = self._conn().execute(
+            "SELECT last, n FROM seq_reservations WHERE user_id = ? AND at >= ? ORDER BY last",
+            [str(user_id), time.time() - min(within, RESERVATION_SECONDS)],
+        ).fetchall()
+        return [(r["last"] - r["n"] + 1, r["last"]) for r in rows]
+
+    def insert_tombstones(self, docs):
+        with self._tx() as conn:
+            conn.executemany(
+                "INSERT INTO tombstones (user_id, kind, ref_id, seq, deleted_at) VALUES (?, ?, ?, ?, ?)",
+                [(str(d["user_id"]), d["kind"], str(d["ref_id"]), d["seq"], _param(d["deleted_at"])) for d in docs],
+            )
+
+    def changes_since(self, user_id, since, limit, full=True):
+        changes = []
+        for table in ("subjects", "chapters", "notes", "tombstones"):
+            if table == "tombstones":
+                cols = "user_id, kind, ref_id, seq, deleted_at"
+            else:
+                cols = "*" if full else "id, seq"
+            for doc in self._all(
+                f"SELECT {cols} FROM {table} WHERE user_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                user_id, since, limit + 1,
+            ):
+                changes.append((doc["seq"], table, doc))
+        changes.sort(key=lambda c: c[0])
+        return changes[:limit + 1]
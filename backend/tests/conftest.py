@@ -0,0 +1,111 @@
+"""
+Shared fixtures. The app runs against mongomock or a temporary SQLite file
+(pip install -r requirements-dev.txt), so no MongoDB server is needed:
+
+    cd backend && python -m pytest
+
+mongo_app / sqlite_app are fully wired apps; app is each of them in turn.
+library(app) signs up a new user with one subject and chapter and calls
+the API as them.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# `import app` builds a module-level app; keep it from connecting anywhere
+os.environ["NOTEVAULT_DEFER_CONNECT"] = "1"
+
+
+def _services(mp, tmp_path_factory):
+    """Local media, events in process, no shared cache."""
+    mp.setenv("MEDIA_STORE", "local")
+    mp.setenv("MEDIA_DIR", str(tmp_path_factory.mktemp("media")))
+    mp.setenv("EVENTS_BACKEND", "local")
+    mp.setenv("CACHE_URL", "")
+
+
+@pytest.fixture(scope="module")
+def mongo_app(tmp_path_factory):
+    """A fully wired app whose MongoDB is an in-memory mongomock client."""
+    mongomock = pytest.importorskip("mongomock")
+    client    = mongomock.MongoClient()
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("STORAGE_BACKEND", "mongo")
+        mp.setenv("MONGO_URI", "mongodb://localhost:27017/notevault_test")
+        _services(mp, tmp_path_factory)
+
+        import config.db
+        mp.setattr(config.db, "MongoClient", lambda *a, **k: client)
+        # mongomock has no text indexes; the unique ones are what tests rely on
+        create_index = mongomock.collection.Collection.create_index
+        mp.setattr(mongomock.collection.Collection, "create_index",
+                   lambda self, keys, **kw: None if "text" in dict(keys).values()
+                   else create_index(self, keys, **kw))
+
+        from app import create_app, init_services
+        app = create_app(connect=False)
+        init_services(app)
+        yield app
+
+
+@pytest.fixture(scope="module")
+def sqlite_app(tmp_path_factory):
+    """A fully wired app on a new SQLite file."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("STORAGE_BACKEND", "sqlite")
+        mp.setenv("SQLITE_PATH", str(tmp_path_factory.mktemp("sqlite") / "notevault.db"))
+        _services(mp, tmp_path_factory)
+
+        from app import create_app, init_services
+        app = create_app(connect=False)
+        init_services(app)
+        yield app
+        app.repo.close()
+
+
+@pytest.fixture(scope="module", params=["mongo", "sqlite"])
+def app(request):
+    """Each storage backend in turn (the other one's fixture is torn down first)."""
+    return request.getfixturevalue(f"{request.param}_app")
+
+
+class Library:
+    """A new user with subject "Physics" / chapter "Waves", calling the API as them."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+        email       = f"t-{os.urandom(4).hex()}@example.com"
+        body        = self.call("POST", "/api/auth/signup",
+                                {"username": email.split("@")[0], "email": email, "password": "testing"})
+        self.user_id    = body["user"]["id"]
+        self.headers    = {"Authorization": f"Bearer {body['token']}"}
+        self.subject_id = self.call("POST", "/api/subjects", {"name": "Physics"})["subject"]["id"]
+        self.chapter_id = self.chapter("Waves")
+
+    def open(self, method, url, json=None):
+        return self.client.open(url, method=method, json=json, headers=getattr(self, "headers", None))
+
+    def call(self, method, url, json=None, expect=(200, 201)) -> dict:
+        res = self.open(method, url, json)
+        assert res.status_code in expect, (method, url, res.status_code, res.get_json())
+        return res.get_json()
+
+    def chapter(self, name, subject_id=None) -> str:
+        body = {"name": name, "subject_id": subject_id or self.subject_id}
+        return self.call("POST", "/api/chapters", body)["chapter"]["id"]
+
+    def note(self, title="Note", content="", tags=None, chapter_id=None, subject_id=None) -> str:
+        body = {"title": title, "content": content, "tags": tags or [],
+                "chapter_id": chapter_id or self.chapter_id, "subject_id": subject_id or self.subject_id}
+        return self.call("POST", "/api/notes", body)["note"]["id"]
+
+
+@pytest.fixture
+def library():
+    """library(app) → a Library for a new user."""
+    return Library
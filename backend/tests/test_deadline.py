@@ -0,0 +1,210 @@
+"""Query budgets, optional sections and the circuit breaker (middleware/deadline.py)."""
+
+import sqlite3
+import types
+
+import pytest
+from flask import Flask, jsonify
+from pymongo.errors import AutoReconnect, ExecutionTimeout, OperationFailure, ServerSelectionTimeoutError
+
+from config import deadline
+from middleware import admission
+from middleware import deadline as middleware
+from middleware.deadline import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+class Clock:
+    """Stands in for time.monotonic(); moved on by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(middleware, "time", types.SimpleNamespace(monotonic=clock))
+    return clock
+
+
+# ── CircuitBreaker ────────────────────────────────────────────────────────────
+
+def _tripped(clock, **kwargs) -> CircuitBreaker:
+    breaker = CircuitBreaker(window=10, min_requests=4, failure_ratio=0.5, cooldown=15, **kwargs)
+    for failed in (True, False, True, False):
+        assert breaker.allow()
+        breaker.record(failed)
+    assert breaker.state_name == OPEN
+    return breaker
+
+
+def test_stays_closed_below_min_requests_or_ratio(clock):
+    breaker = CircuitBreaker(window=10, min_requests=4, failure_ratio=0.5, cooldown=15)
+    for _ in range(3):
+        breaker.record(True)
+    assert breaker.state_name == CLOSED                 # 3 of 3 failed, but too few to judge
+
+    breaker = CircuitBreaker(window=10, min_requests=4, failure_ratio=0.5, cooldown=15)
+    for failed in (True, False, False, False, False, True, True):
+        breaker.record(failed)
+    assert breaker.state_name == CLOSED                 # 3 of 7
+    assert breaker.state()["failure_ratio"] == round(3 / 7, 3)
+
+
+def test_old_outcomes_leave_the_window(clock):
+    breaker = CircuitBreaker(window=10, min_requests=4, failure_ratio=0.5, cooldown=15)
+    for _ in range(3):
+        breaker.record(True)
+    clock.now += 11
+    for _ in range(3):
+        breaker.record(False)
+    breaker.record(True)
+    assert breaker.state_name == CLOSED                 # 1 of 4: the first failures aged out
+    assert breaker.state()["requests"] == 4
+
+
+def test_opens_and_rejects_until_the_cooldown(clock):
+    breaker = _tripped(clock)
+    assert breaker.opened == 1
+    assert not breaker.allow()
+    clock.now += 5
+    assert breaker.retry_after() == 10
+    assert not breaker.allow()
+
+
+def test_one_probe_after_the_cooldown_closes_it(clock):
+    breaker = _tripped(clock)
+    clock.now += 15
+    assert breaker.allow()                              # the probe
+    assert breaker.state_name == HALF_OPEN
+    assert not breaker.allow()                          # only one at a time
+    breaker.record(False)
+    assert breaker.state_name == CLOSED
+    assert breaker.state()["requests"] == 0             # judged afresh
+    assert breaker.allow()
+
+
+def test_failed_probe_opens_it_again(clock):
+    breaker = _tripped(clock)
+    clock.now += 15
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state_name == OPEN and breaker.opened == 2
+    assert not breaker.allow()
+    assert breaker.retry_after() == 15
+
+
+def test_released_probe_lets_another_one_through(clock):
+    breaker = _tripped(clock)
+    clock.now += 15
+    assert breaker.allow()
+    breaker.release()                                   # e.g. shed before reaching the database
+    assert breaker.state_name == HALF_OPEN
+    assert breaker.allow()
+
+
+# ── deadline.optional ─────────────────────────────────────────────────────────
+
+def _timeout():
+    raise ExecutionTimeout("operation exceeded time limit")
+
+
+def test_optional_outside_a_budget_or_not_allowed_always_runs():
+    skipped = []
+    assert deadline.optional("words", lambda: 1, skipped, {"words"}) == 1
+    with deadline.budget(1):
+        assert deadline.optional("words", lambda: 2, skipped, set(), reserve=5) == 2
+        with pytest.raises(ExecutionTimeout):
+            deadline.optional("words", _timeout, skipped, set())
+    assert skipped == []
+
+
+def test_optional_leaves_out_what_does_not_fit():
+    skipped = []
+    with deadline.budget(1):
+        assert deadline.optional("words", lambda: 1, skipped, {"words"}, reserve=5, fallback=0) == 0
+        assert deadline.optional("tags", _timeout, skipped, {"tags"}, fallback=[]) == []
+        assert deadline.optional("recent", lambda: 3, skipped, {"recent"}, reserve=0.5) == 3
+    assert skipped == ["words", "tags"]
+
+
+def test_optional_budget_keeps_the_reserve():
+    with deadline.budget(1):
+        inner = deadline.optional("words", deadline.remaining, [], {"words"}, reserve=0.4)
+        assert 0.5 < inner <= 0.6
+        assert deadline.remaining() > 0.9
+
+
+def test_optional_does_not_swallow_other_errors():
+    with deadline.budget(1), pytest.raises(OperationFailure):
+        deadline.optional("words", lambda: (_ for _ in ()).throw(OperationFailure("bad")), [], {"words"})
+
+
+# ── The wired middleware: 503 / 504, and the breaker across requests ────────
+
+ERRORS = {
+    "mongo_timeout":   ExecutionTimeout("operation exceeded time limit"),
+    "mongo_down":      ServerSelectionTimeoutError("no servers"),
+    "mongo_reset":     AutoReconnect("connection reset"),
+    "sqlite_timeout":  sqlite3.OperationalError("interrupted"),
+    "sqlite_locked":   sqlite3.OperationalError("database is locked"),
+}
+
+
+@pytest.fixture
+def api(clock):
+    """/api/ok and /api/fail/<error>, behind budgets, admission and a breaker of 4 requests."""
+    app = Flask(__name__)
+    app.config.update(BREAKER_MIN_REQUESTS=4, BREAKER_FAILURE_RATIO=0.5, BREAKER_COOLDOWN=15)
+    middleware.init_deadlines(app)
+    admission.init_admission(app)
+
+    @app.route("/api/ok")
+    def ok():
+        return jsonify({"remaining": deadline.remaining()})
+
+    @app.route("/api/fail/<error>")
+    def fail(error):
+        raise ERRORS[error]
+
+    yield app.test_client()
+    middleware.breaker = admission.controller = None
+
+
+@pytest.mark.parametrize("error, status", [
+    ("mongo_timeout", 504), ("sqlite_timeout", 504),
+    ("mongo_down", 503), ("mongo_reset", 503), ("sqlite_locked", 503),
+])
+def test_database_errors_map_to_503_or_504(api, error, status):
+    res = api.get(f"/api/fail/{error}")
+    assert res.status_code == status
+    if status == 503:
+        assert res.headers["Retry-After"] == "1"
+
+
+def test_requests_run_inside_their_class_budget(api):
+    assert 1.9 < api.get("/api/ok").get_json()["remaining"] <= 2.0      # "read": 2000 ms
+    assert deadline.remaining() is None                                  # closed after the request
+
+
+def test_breaker_opens_on_outages_and_closes_after_a_probe(api, clock):
+    for _ in range(4):
+        assert api.get("/api/fail/mongo_timeout").status_code == 504
+    res = api.get("/api/ok")
+    assert res.status_code == 503 and res.headers["Retry-After"] == "15"
+    assert middleware.breaker.state_name == OPEN
+
+    clock.now += 15
+    assert api.get("/api/ok").status_code == 200                         # the probe
+    assert middleware.breaker.state_name == CLOSED
+    assert api.get("/api/ok").status_code == 200
+
+
+def test_shed_requests_do_not_count(api, monkeypatch):
+    monkeypatch.setattr(admission.controller, "admit", lambda name: False)
+    for _ in range(10):
+        assert api.get("/api/ok").status_code == 503
+    assert middleware.breaker.state()["requests"] == 0
@@ -0,0 +1,27 @@
+"""GET /api/export: every note gets its own path in the zip, however its names sanitize."""
+
+import io
+import zipfile
+
+
+def _paths(lib, query=""):
+    res = lib.open("GET", f"/api/export?format=md{query}")
+    assert res.status_code == 200, res.get_data(as_text=True)
+    return zipfile.ZipFile(io.BytesIO(res.get_data())).namelist()
+
+
+def test_names_that_sanitize_alike_get_distinct_paths(app, library):
+    lib = library(app)
+    lib.note("Fringes")
+    lib.note("Fringes", chapter_id=lib.chapter("Waves/Optics"))
+    lib.note("Fringes", chapter_id=lib.chapter("Waves:Optics"))
+    a = lib.call("POST", "/api/subjects", {"name": "A/B"})["subject"]["id"]
+    b = lib.call("POST", "/api/subjects", {"name": "A:B"})["subject"]["id"]
+    lib.note("Note", chapter_id=lib.chapter("Ch", a), subject_id=a)
+    lib.note("Note", chapter_id=lib.chapter("Ch", b), subject_id=b)
+
+    paths = _paths(lib)
+    assert len(paths) == len(set(p.lower() for p in paths)) == 5
+    assert {p.rsplit("/", 1)[0] for p in paths} == {
+        "Physics/Waves", "Physics/Waves_Optics", "Physics/Waves_Optics (2)", "A_B/Ch", "A_B (2)/Ch"}
+
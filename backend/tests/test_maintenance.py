@@ -0,0 +1,66 @@
+"""Maintenance jobs retire the cached responses of the users a batch changed."""
+
+import pytest
+from bson import ObjectId
+
+import maintenance
+from config.cache import MemoryCache, generation_key
+from config.db import get_db
+from maintenance import JOBS
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = MemoryCache()
+    monkeypatch.setattr(maintenance, "_cache", cache)
+    return cache
+
+
+def _generation(cache, lib):
+    return int(cache.get(generation_key(lib.user_id)) or 0)
+
+
+def _process(name, coll, user_ids, dry_run=False):
+    job  = JOBS[name]
+    docs = list(get_db()[coll].find({"user_id": {"$in": [ObjectId(u) for u in user_ids]}},
+                                    job.fields.get(coll)).sort("_id", 1))
+    return job.process(get_db(), coll, docs, dry_run)
+
+
+def test_text_bumps_only_users_whose_notes_changed(mongo_app, library, cache):
+    stale, fine = library(mongo_app), library(mongo_app)
+    nid = stale.note("Optics", "<p>Light bends</p>")
+    fine.note("Waves", "<p>Sound travels</p>")
+    get_db().notes.update_one({"_id": ObjectId(nid)}, {"$set": {"minhash": None, "lsh": None}})
+    users = [stale.user_id, fine.user_id]
+
+    assert _process("text", "notes", users, dry_run=True) == 1
+    assert _generation(cache, stale) == 0
+    assert _process("text", "notes", users) == 1
+    assert (_generation(cache, stale), _generation(cache, fine)) == (1, 0)
+    assert _process("text", "notes", users) == 0              # nothing left to fix, nothing bumped
+    assert _generation(cache, stale) == 1
+
+
+def test_orphans_bumps_the_owners_of_what_was_deleted(mongo_app, library, cache):
+    orphaned, fine = library(mongo_app), library(mongo_app)
+    orphaned.note("Left behind")
+    fine.note("Kept")
+    get_db().subjects.delete_one({"_id": ObjectId(orphaned.subject_id)})     # a cascade that stopped
+    users = [orphaned.user_id, fine.user_id]
+
+    assert _process("orphans", "chapters", users) == 1
+    assert _process("orphans", "notes", users) == 1
+    assert (_generation(cache, orphaned), _generation(cache, fine)) == (2, 0)
+
+
+def test_counts_bumps_users_whose_counts_were_off(mongo_app, library, cache):
+    off, fine = library(mongo_app), library(mongo_app)
+    off.note("A", tags=["exam"])
+    fine.note("B", tags=["exam"])
+    get_db().tag_counts.delete_many({"user_id": ObjectId(off.user_id)})
+    ids  = [ObjectId(off.user_id), ObjectId(fine.user_id)]
+    docs = list(get_db().users.find({"_id": {"$in": ids}}, {"_id": 1}).sort("_id", 1))
+
+    assert JOBS["counts"].process(get_db(), "users", docs, False) == 1
+    assert (_generation(cache, off), _generation(cache, fine)) == (1, 0)
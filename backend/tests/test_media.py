@@ -0,0 +1,60 @@
+"""Inline media extraction on save and by migration: only allowlisted types."""
+
+import base64
+import hashlib
+
+from bson import ObjectId
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg"><script>alert(1)</script></svg>'
+
+
+def _data_url(mimetype, data):
+    return f"data:{mimetype};base64,{base64.b64encode(data).decode()}"
+
+
+def test_save_reports_only_extracted_media(mongo_app, library):
+    lib = library(mongo_app)
+    nid = lib.note("Figures")
+    png, svg = _data_url("image/png", PNG), _data_url("image/svg+xml", SVG)
+
+    body   = lib.call("PUT", f"/api/notes/{nid}", {"content": f'<img src="{png}"><img src="{svg}">'})
+    digest = hashlib.sha256(PNG).hexdigest()
+    assert body["media"] == [digest]
+    assert f'src="/api/media/{digest}"' in body["note"]["content"]
+    assert svg in body["note"]["content"]                 # left inline, never given a media URL
+
+    res = lib.open("GET", f"/api/media/{digest}")
+    assert res.status_code == 200 and res.data == PNG
+    assert res.headers["X-Content-Type-Options"] == "nosniff"
+
+
+def test_save_without_media_reports_none(mongo_app, library):
+    lib  = library(mongo_app)
+    body = lib.call("POST", "/api/notes", {"title": "Plain", "content": "<p>text</p>",
+                                           "chapter_id": lib.chapter_id, "subject_id": lib.subject_id})
+    assert body["media"] == []
+
+
+def test_migration_extracts_allowlisted_media_once(mongo_app, library):
+    from config.db import get_db
+    from config.media import get_media_store
+    from migrations import extract_media
+
+    lib = library(mongo_app)
+    png = lib.note("Inline PNG")
+    svg = lib.note("Inline SVG")
+    db  = get_db()
+    # Written before media extraction existed
+    for nid, data_url in ((png, _data_url("image/png", PNG)), (svg, _data_url("image/svg+xml", SVG))):
+        db.notes.update_one({"_id": ObjectId(nid)}, {"$set": {"content": f'<img src="{data_url}">'}})
+    seqs = {nid: db.notes.find_one({"_id": ObjectId(nid)})["seq"] for nid in (png, svg)}
+
+    assert extract_media.run(db, get_media_store(), dry_run=True)["rewritten"] == 1
+    assert extract_media.run(db, get_media_store()) == {"scanned": 1, "rewritten": 1}
+    assert extract_media.run(db, get_media_store()) == {"scanned": 0, "rewritten": 0}
+
+    note = db.notes.find_one({"_id": ObjectId(png)})
+    assert note["content"] == f'<img src="/api/media/{hashlib.sha256(PNG).hexdigest()}">'
+    assert note["seq"] > seqs[png]                              # synced clients fetch it again
+    assert db.notes.find_one({"_id": ObjectId(svg)})["seq"] == seqs[svg]
@@ -0,0 +1,38 @@
+"""GET /api/notes/<id>/related: the TF-IDF index follows the delta-sync feed."""
+
+from bson import ObjectId
+
+from models.note import new_note_doc
+from storage import get_repo
+
+
+def _related(lib, note_id):
+    return [r["id"] for r in lib.call("GET", f"/api/notes/{note_id}/related")["related"]]
+
+
+def test_indexes_a_write_that_commits_after_a_later_seq(app, library):
+    lib   = library(app)
+    first = lib.note("Interference of light waves", "<p>Two slits and fringes of light</p>")
+
+    # A write reserves its seq, then a later one commits before it does
+    repo     = get_repo()
+    reserved = repo.next_seq(ObjectId(lib.user_id))
+    later    = lib.note("Light fringes", "<p>Interference fringes of light on a screen</p>")
+    assert _related(lib, later) == [first]
+
+    doc = new_note_doc(lib.user_id, lib.subject_id, lib.chapter_id,
+                       "Thin film interference", "<p>Light fringes in soap films</p>")
+    doc["seq"] = reserved
+    slow = str(repo.insert_note(doc))
+
+    assert set(_related(lib, later)) == {first, slow}
+
+
+def test_deleted_note_leaves_the_index(app, library):
+    lib   = library(app)
+    first = lib.note("Doppler effect", "<p>Moving sources shift the frequency of sound</p>")
+    other = lib.note("Doppler radar", "<p>Frequency shift of moving sources</p>")
+    assert _related(lib, other) == [first]
+
+    lib.call("DELETE", f"/api/notes/{first}")
+    assert _related(lib, other) == []
@@ -0,0 +1,84 @@
+"""
+MongoDB operations per create / update request (see bench/roundtrips.py,
+which measures the same requests against a real server).
+
+mongomock emits no command monitoring events, so its Collection methods
+are wrapped instead; a depth guard keeps its internal calls (find_one
+goes through find) from being counted twice.
+"""
+
+import types
+
+import pytest
+
+from bench.roundtrips import EXPECTED, CommandCounter, measure
+
+# Collection method → the command it sends
+COMMANDS = {
+    "find":                "find",
+    "find_one":            "find",
+    "insert_one":          "insert",
+    "insert_many":         "insert",
+    "update_one":          "update",
+    "bulk_write":          "update",
+    "delete_one":          "delete",
+    "delete_many":         "delete",
+    "find_one_and_update": "findAndModify",
+    "find_one_and_delete": "findAndModify",
+    "aggregate":           "aggregate",
+    "count_documents":     "count",
+}
+
+
+@pytest.fixture(scope="module")
+def commands(mongo_app):
+    """Request name → Counter of commands, for every request in EXPECTED."""
+    import mongomock.collection
+
+    counter = CommandCounter()
+    depth   = [0]
+
+    def counted(method, command):
+        def wrapper(self, *args, **kwargs):
+            if not depth[0]:
+                counter.started(types.SimpleNamespace(command_name=command))
+            depth[0] += 1
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                depth[0] -= 1
+        return wrapper
+
+    with pytest.MonkeyPatch.context() as mp:
+        for name, command in COMMANDS.items():
+            mp.setattr(mongomock.collection.Collection, name,
+                       counted(getattr(mongomock.collection.Collection, name), command))
+        yield measure(mongo_app.test_client(), counter)
+
+
+@pytest.mark.parametrize("request_name", list(EXPECTED))
+def test_round_trips(commands, request_name):
+    expected, before = EXPECTED[request_name]
+    sent = sum(commands[request_name].values())
+    assert sent == expected, dict(commands[request_name])
+    assert sent < before
+
+
+# Every request starts with the token's user lookup (find) except signup;
+# findAndModify is the seq counter and, on updates, the owned write itself
+BREAKDOWN = {
+    "POST signup":   {"insert": 1},
+    "PUT profile":   {"find": 1, "findAndModify": 1},
+    "POST subject":  {"find": 1, "findAndModify": 1, "insert": 1},
+    "PUT subject":   {"find": 1, "findAndModify": 2},
+    "POST chapter":  {"find": 2, "findAndModify": 1, "insert": 1},              # + subject check
+    "PUT chapter":   {"find": 1, "findAndModify": 2},
+    "POST note":     {"find": 2, "findAndModify": 1, "insert": 1, "update": 2},  # chapter check; tags, activity
+    "PUT note":      {"find": 1, "findAndModify": 2, "update": 1},              # activity
+    "PUT note tags": {"find": 1, "findAndModify": 2, "update": 2},              # + tag counts
+}
+
+
+@pytest.mark.parametrize("request_name", list(BREAKDOWN))
+def test_no_check_or_re_read(commands, request_name):
+    assert dict(commands[request_name]) == BREAKDOWN[request_name]
@@ -0,0 +1,83 @@
+"""@single_flight: requests made after the user's write never share a flight started before it."""
+
+import threading
+
+import pytest
+from flask import Flask, g, jsonify
+
+from middleware import singleflight
+
+
+@pytest.fixture
+def slow_app():
+    """GET /slow blocks until `release` is set and answers with its call number."""
+    app   = Flask(__name__)
+    state = {"calls": 0, "generation": 0}
+    entered, release = threading.Event(), threading.Event()
+
+    @app.before_request
+    def _user():
+        g.user_id          = "u1"
+        g.cache_generation = state["generation"]
+
+    @app.route("/slow")
+    @singleflight.single_flight
+    def slow():
+        state["calls"] += 1
+        call = state["calls"]
+        entered.set()
+        release.wait(5)
+        return jsonify({"call": call})
+
+    app.state, app.entered, app.release = state, entered, release
+    return app
+
+
+class _Watched(threading.Event):
+    """A flight's `done` event that tells when a follower starts waiting on it."""
+
+    def __init__(self):
+        super().__init__()
+        self.waiting = threading.Event()
+
+    def wait(self, timeout=None):
+        self.waiting.set()
+        return super().wait(timeout)
+
+
+def _get(app, results, name):
+    res = app.test_client().get("/slow")
+    results[name] = (res.get_json()["call"], res.headers.get("X-Single-Flight"))
+
+
+def _start(app, results, name):
+    thread = threading.Thread(target=_get, args=(app, results, name))
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize("write", ["this worker", "another worker"])
+def test_request_after_a_write_does_not_join_an_older_flight(slow_app, write):
+    results = {}
+    leader  = _start(slow_app, results, "leader")
+    assert slow_app.entered.wait(5)
+    flight  = next(f for k, f in singleflight._flights.items() if k[0] == "u1")
+    flight.done = watched = _Watched()
+    before  = _start(slow_app, results, "before")
+    assert watched.waiting.wait(5)                  # joined the leader's flight
+
+    if write == "this worker":
+        singleflight.forget("u1")
+    else:
+        slow_app.state["generation"] += 1           # the shared cache generation moved on
+
+    slow_app.entered.clear()
+    after = _start(slow_app, results, "after")
+    assert slow_app.entered.wait(5), "the request after the write waited for the older flight"
+    slow_app.release.set()
+    for thread in (leader, before, after):
+        thread.join(5)
+
+    assert results["leader"] == (1, None)
+    assert results["before"] == (1, "shared")
+    assert results["after"]  == (2, None)
@@ -0,0 +1,192 @@
+"""The SQLite repository on its own: documents, FTS search, tag-count triggers, migrations."""
+
+import sqlite3
+
+import pytest
+from bson import ObjectId
+
+from models.note import new_note_doc, new_subject_doc, new_chapter_doc, pack_content, utcnow
+from storage.base import DuplicateError
+from storage.sqlite import SQLiteRepository, SCHEMA_VERSION
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "notevault.db")
+
+
+@pytest.fixture
+def repo(path):
+    repo = SQLiteRepository(path)
+    yield repo
+    repo.close()
+
+
+class Shelf:
+    """One user's subject and chapter in `repo`."""
+
+    def __init__(self, repo):
+        self.repo       = repo
+        self.user_id    = ObjectId()
+        self.subject_id = repo.insert_subject(new_subject_doc(str(self.user_id), "Physics"))
+        self.chapter_id = repo.insert_chapter(new_chapter_doc(str(self.user_id), str(self.subject_id), "Waves"))
+
+    def note(self, title, content="", tags=None, **fields):
+        doc = new_note_doc(str(self.user_id), str(self.subject_id), str(self.chapter_id), title, content, tags)
+        doc.update(fields)
+        return self.repo.insert_note(doc)
+
+    def tags(self):
+        return {t["tag"]: t["count"] for t in self.repo.tag_counts(self.user_id)}
+
+
+@pytest.fixture
+def shelf(repo):
+    return Shelf(repo)
+
+
+def test_documents_round_trip_as_mongo_shapes(repo, shelf):
+    nid  = shelf.note("Interference", "<p>Two slits</p>", ["optics"])
+    note = repo.find_note(nid, shelf.user_id)
+    assert note["_id"] == nid and note["chapter_id"] == shelf.chapter_id
+    assert note["tags"] == ["optics"]
+    assert note["created_at"].tzinfo is None
+    assert repo.find_note(nid, ObjectId()) is None               # someone else's
+
+
+def test_owned_update_returns_the_new_document_or_none(repo, shelf):
+    nid = shelf.note("Draft")
+    assert repo.update_note(nid, {"title": "Final"}, ObjectId()) is None
+    assert repo.update_note(nid, {"title": "Final"}, shelf.user_id)["title"] == "Final"
+
+
+def test_duplicate_names_raise(repo, shelf):
+    with pytest.raises(DuplicateError):
+        repo.insert_subject(new_subject_doc(str(shelf.user_id), "Physics"))
+    with pytest.raises(DuplicateError):
+        repo.update_chapter(repo.insert_chapter(
+            new_chapter_doc(str(shelf.user_id), str(shelf.subject_id), "Optics")), {"name": "Waves"})
+
+
+def test_tombstones_store_iso_text(repo, path, shelf):
+    when = utcnow()
+    repo.insert_tombstones([{"user_id": shelf.user_id, "kind": "note", "ref_id": ObjectId(),
+                             "seq": 7, "deleted_at": when}])
+    raw = sqlite3.connect(path).execute("SELECT deleted_at FROM tombstones").fetchone()[0]
+    assert raw == when.isoformat(timespec="microseconds")
+    (seq, coll, doc), = repo.changes_since(shelf.user_id, 0, 10)
+    assert (seq, coll, doc["deleted_at"]) == (7, "tombstones", when)
+
+
+# ── Full-text search ──────────────────────────────────────────────────────────
+
+def _titles(notes):
+    return [n["title"] for n in notes]
+
+
+def test_search_ranks_matches_and_follows_writes(repo, shelf):
+    shelf.note("Diffraction", "<p>Light bends around an edge</p>")
+    shelf.note("Revision", "<p>Heat, sound, motion, optics and interference, then mechanics and gravity</p>")
+    best  = shelf.note("Interference", "<p>Interference of light: interference fringes</p>")
+    other = Shelf(repo)
+    other.note("Interference elsewhere", "<p>interference</p>")
+
+    assert _titles(repo.search_notes(shelf.user_id, "interference", 10)) == ["Interference", "Revision"]
+    assert set(_titles(repo.search_notes(shelf.user_id, "light", 10))) == {"Diffraction", "Interference"}
+
+    repo.update_note(best, {"title": "Fringes", **pack_content("<p>Young's experiment</p>")})
+    assert _titles(repo.search_notes(shelf.user_id, "interference", 10)) == ["Revision"]
+    assert _titles(repo.search_notes(shelf.user_id, "young", 10)) == ["Fringes"]
+
+    repo.delete_note(best)
+    assert repo.search_notes(shelf.user_id, "young", 10) == []
+
+
+def test_search_covers_tags_and_compressed_content(repo, shelf):
+    shelf.note("Tagged", tags=["exam"])
+    shelf.note("Long", **pack_content("<p>" + "standing waves " * 2000 + "</p>"))
+    assert _titles(repo.search_notes(shelf.user_id, "exam", 10)) == ["Tagged"]
+    assert _titles(repo.search_notes(shelf.user_id, "standing", 10)) == ["Long"]
+
+
+@pytest.mark.parametrize("query", ['"unbalanced', "a OR", "NEAR(", "col:umn*", "-"])
+def test_search_input_cannot_break_fts_syntax(repo, shelf, query):
+    shelf.note("Quotes", "<p>unbalanced column</p>")
+    repo.search_notes(shelf.user_id, query, 10)
+
+
+# ── Tag counts (note_tags triggers) ───────────────────────────────────────────
+
+def test_tag_counts_follow_every_note_write(repo, shelf):
+    a = shelf.note("A", tags=["exam", "lab"])
+    b = shelf.note("B", tags=["exam"])
+    assert shelf.tags() == {"exam": 2, "lab": 1}
+
+    repo.update_note(a, {"tags": ["lab", "ncert"]})
+    assert shelf.tags() == {"exam": 1, "lab": 1, "ncert": 1}
+
+    notes = repo.find_notes([a, b], shelf.user_id)
+    repo.bulk_update_notes(notes, [{"tags": ["ncert"]}, {"tags": ["exam", "ncert"]}])
+    assert shelf.tags() == {"exam": 1, "ncert": 2}
+
+    repo.delete_note(a)
+    assert shelf.tags() == {"exam": 1, "ncert": 1}
+    repo.delete_notes(repo.find_notes([b], shelf.user_id))
+    assert shelf.tags() == {}
+
+
+def test_tag_counts_follow_cascading_deletes(repo, shelf):
+    shelf.note("A", tags=["exam"])
+    other = repo.insert_chapter(new_chapter_doc(str(shelf.user_id), str(shelf.subject_id), "Optics"))
+    shelf.repo.insert_note(new_note_doc(str(shelf.user_id), str(shelf.subject_id), str(other), "B", "", ["exam"]))
+    assert shelf.tags() == {"exam": 2}
+
+    repo.delete_chapter(other)
+    assert shelf.tags() == {"exam": 1}
+    repo.delete_subject(shelf.subject_id)
+    assert shelf.tags() == {}
+
+
+# ── Migrations ────────────────────────────────────────────────────────────────
+
+def _downgrade(path, version):
+    """Turn a current database back into what `version` created."""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        DROP TRIGGER notes_lsh_insert; DROP TRIGGER notes_lsh_update; DROP TRIGGER notes_lsh_delete;
+        DROP TABLE note_lsh;
+        ALTER TABLE notes DROP COLUMN minhash; ALTER TABLE notes DROP COLUMN lsh;
+    """)
+    if version == 0:
+        # Tags were comma-separated strings, without note_tags rows
+        conn.execute("UPDATE notes SET tags = (SELECT group_concat(value, ', ') FROM json_each(notes.tags))")
+        conn.executescript("DELETE FROM note_tags; DELETE FROM tag_counts;")
+    conn.execute(f"PRAGMA user_version = {version}")
+    conn.commit()
+    conn.close()
+
+
+@pytest.mark.parametrize("version", [0, 1])
+def test_migrates_older_databases(path, version):
+    repo  = SQLiteRepository(path)
+    shelf = Shelf(repo)
+    text  = "<p>Light from two narrow slits spreads out and overlaps on a distant screen, where the "
+    text += "waves add up in bright fringes and cancel in dark ones between them.</p>"
+    a = shelf.note("Interference", text, ["exam", "lab"])
+    b = shelf.note("Interference again", text, ["exam"])
+    repo.close()
+    _downgrade(path, version)
+
+    repo = SQLiteRepository(path)
+    try:
+        assert repo._scalar("PRAGMA user_version") == SCHEMA_VERSION
+        assert repo.find_note(a)["tags"] == ["exam", "lab"]
+        shelf.repo = repo
+        assert shelf.tags() == {"exam": 2, "lab": 1}
+        assert _titles(repo.notes_by_tag(shelf.user_id, "lab")) == ["Interference"]
+        assert len(repo.find_note(a)["minhash"]) > 0
+        assert [sorted(bucket) for bucket in repo.lsh_buckets(shelf.user_id)][0] == sorted([a, b])
+    finally:
+        repo.close()
+
+    SQLiteRepository(path).close()                   # opening it again changes nothing
@@ -0,0 +1,129 @@
+"""GET /api/sync: cursors, the hold below writes in flight, tombstones and bad tokens."""
+
+import base64
+
+from bson import ObjectId
+
+from models.note import new_note_doc
+from routes.sync import _encode_token, _decode_token
+from storage import get_repo
+
+
+def _sync(lib, since="", limit=None, expect=(200,)):
+    url = f"/api/sync?since={since}" + (f"&limit={limit}" if limit else "")
+    return lib.call("GET", url, expect=expect)
+
+
+def _note_ids(body):
+    return [n["id"] for n in body["notes"]]
+
+
+def test_full_then_incremental(app, library):
+    lib  = library(app)
+    full = _sync(lib)
+    assert [s["id"] for s in full["subjects"]] == [lib.subject_id]
+    assert [c["id"] for c in full["chapters"]] == [lib.chapter_id]
+    assert full["has_more"] is False
+
+    nid   = lib.note("Optics")
+    delta = _sync(lib, full["next"])
+    assert _note_ids(delta) == [nid]
+    assert delta["subjects"] == delta["chapters"] == delta["deleted"] == []
+    assert _sync(lib, delta["next"])["notes"] == []
+
+
+def test_pages_follow_has_more(app, library):
+    lib  = library(app)
+    nids = [lib.note(f"Note {i}") for i in range(5)]
+    seen, since = [], ""
+    while True:
+        body  = _sync(lib, since, limit=2)
+        seen += _note_ids(body)
+        since = body["next"]
+        if not body["has_more"]:
+            break
+    assert seen == nids
+
+
+def test_change_committed_out_of_order_is_not_skipped(app, library):
+    lib    = library(app)
+    cursor = _sync(lib)["next"]
+
+    # A write reserves its seq; a later write commits first
+    repo     = get_repo()
+    reserved = repo.next_seq(ObjectId(lib.user_id))
+    later    = lib.note("Later")
+
+    body = _sync(lib, cursor)
+    assert _note_ids(body) == [later]
+    assert _decode_token(body["next"]) == reserved - 1        # held below the write in flight
+    assert body["has_more"] is False
+
+    doc = new_note_doc(lib.user_id, lib.subject_id, lib.chapter_id, "Slow")
+    doc["seq"] = reserved
+    slow = str(repo.insert_note(doc))
+
+    body = _sync(lib, body["next"])
+    assert _note_ids(body) == [slow, later]                   # `later` again: apply by id
+    assert _decode_token(body["next"]) == reserved + 1
+
+
+def test_deleted_note_comes_back_as_a_tombstone(app, library):
+    lib    = library(app)
+    nid    = lib.note("Short-lived")
+    cursor = _sync(lib)["next"]
+
+    lib.call("DELETE", f"/api/notes/{nid}")
+    body = _sync(lib, cursor)
+    assert body["deleted"] == [{"kind": "note", "id": nid}]
+    assert body["notes"] == []
+
+
+def test_deleted_subject_tombstones_its_chapters_and_notes(app, library):
+    lib    = library(app)
+    nid    = lib.note("Cascade")
+    cursor = _sync(lib)["next"]
+
+    lib.call("DELETE", f"/api/subjects/{lib.subject_id}")
+    deleted = _sync(lib, cursor)["deleted"]
+    assert {"kind": "note", "id": nid} in deleted
+    assert {"kind": "chapter", "id": lib.chapter_id} in deleted
+    assert {"kind": "subject", "id": lib.subject_id} in deleted
+
+
+def _raw_token(text):
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip("=")
+
+
+def test_malformed_tokens_are_rejected(app, library):
+    lib = library(app)
+    for token in ("%%%", "bm90LWEtdG9rZW4", _raw_token("v1:abc"), _raw_token("v2:5"), _raw_token("5")):
+        body = _sync(lib, token, expect=(400,))
+        assert body["error"] == "Invalid sync token", token
+    assert _sync(lib, limit="abc", expect=(400,))["error"] == "limit must be an integer"
+
+
+def test_token_ahead_of_the_server_returns_nothing(app, library):
+    lib    = library(app)
+    lib.note("Existing")
+    token  = _encode_token(10_000)
+    body   = _sync(lib, token)
+    assert body["notes"] == body["deleted"] == []
+    assert body["next"] == token and body["has_more"] is False
+
+
+def test_writes_that_match_nothing_do_not_hold_the_cursor(app, library):
+    lib, other = library(app), library(app)
+    cursor     = _sync(lib)["next"]
+
+    missing = str(ObjectId())
+    lib.call("PUT", f"/api/notes/{missing}", {"content": "<p>x</p>"}, expect=(404,))
+    lib.call("PUT", f"/api/notes/{other.note('Theirs')}", {"content": "<p>x</p>"}, expect=(404,))
+    lib.call("PUT", f"/api/chapters/{missing}", {"name": "Optics"}, expect=(404,))
+    lib.call("PUT", f"/api/subjects/{other.subject_id}", {"name": "Mine"}, expect=(404,))
+    lib.call("POST", "/api/subjects", {"name": "Physics"}, expect=(409,))
+    nid = lib.note("After")
+
+    body = _sync(lib, cursor)
+    assert _note_ids(body) == [nid]
+    assert body["next"] == _encode_token(body["notes"][0]["seq"])
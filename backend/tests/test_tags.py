@@ -0,0 +1,99 @@
+"""Per-user tag counts stay in step with the notes' tags through every kind of note write."""
+
+import pytest
+
+
+def _counts(lib):
+    return {t["tag"]: t["count"] for t in lib.call("GET", "/api/tags")["tags"]}
+
+
+def _from_notes(lib):
+    """The counts recomputed from the notes themselves."""
+    counts = {}
+    for subject in lib.call("GET", "/api/subjects")["subjects"]:
+        for chapter in lib.call("GET", f"/api/chapters?subject_id={subject['id']}")["chapters"]:
+            for note in lib.call("GET", f"/api/notes?chapter_id={chapter['id']}")["notes"]:
+                for tag in note["tags"]:
+                    counts[tag] = counts.get(tag, 0) + 1
+    return counts
+
+
+def _check(lib, expected):
+    assert _counts(lib) == expected
+    assert _from_notes(lib) == expected
+
+
+@pytest.fixture
+def lib(app, library):
+    return library(app)
+
+
+def test_create_and_update(lib):
+    a = lib.note("A", tags="Exam, lab, exam")                 # normalized: exam, lab
+    lib.note("B", tags=["exam"])
+    _check(lib, {"exam": 2, "lab": 1})
+
+    lib.call("PUT", f"/api/notes/{a}", {"tags": ["lab", "ncert"]})
+    _check(lib, {"exam": 1, "lab": 1, "ncert": 1})
+
+    lib.call("PUT", f"/api/notes/{a}", {"content": "<p>no tag change</p>"})
+    lib.call("PUT", f"/api/notes/{a}", {"tags": ["ncert", "lab"]})     # same set, reordered
+    _check(lib, {"exam": 1, "lab": 1, "ncert": 1})
+
+    lib.call("PUT", f"/api/notes/{a}", {"tags": ""})
+    _check(lib, {"exam": 1})
+
+
+def test_bulk_operations(lib):
+    ids = [lib.note("A", tags=["exam"]), lib.note("B", tags=["exam", "lab"]), lib.note("C")]
+
+    lib.call("POST", "/api/notes/bulk", {"ids": ids, "op": "add_tags", "tags": "lab, ncert"})
+    _check(lib, {"exam": 2, "lab": 3, "ncert": 3})
+
+    lib.call("POST", "/api/notes/bulk", {"ids": ids, "op": "remove_tags", "tags": ["exam", "lab"]})
+    _check(lib, {"ncert": 3})
+
+    lib.call("POST", "/api/notes/bulk", {"ids": ids[:2], "op": "move", "chapter_id": lib.chapter("Optics")})
+    _check(lib, {"ncert": 3})
+
+    lib.call("POST", "/api/notes/bulk", {"ids": ids[1:], "op": "delete"})
+    _check(lib, {"ncert": 1})
+
+
+def test_deletes_and_cascades(lib):
+    a = lib.note("A", tags=["exam", "lab"])
+    lib.note("B", tags=["exam"])
+    optics = lib.chapter("Optics")
+    lib.note("C", tags=["exam", "optics"], chapter_id=optics)
+    chemistry = lib.call("POST", "/api/subjects", {"name": "Chemistry"})["subject"]["id"]
+    bonds     = lib.chapter("Bonds", chemistry)
+    lib.note("D", tags=["exam", "lab"], chapter_id=bonds, subject_id=chemistry)
+    _check(lib, {"exam": 4, "lab": 2, "optics": 1})
+
+    lib.call("DELETE", f"/api/notes/{a}")
+    _check(lib, {"exam": 3, "lab": 1, "optics": 1})
+
+    lib.call("DELETE", f"/api/chapters/{optics}")
+    _check(lib, {"exam": 2, "lab": 1})
+
+    lib.call("DELETE", f"/api/subjects/{chemistry}")
+    _check(lib, {"exam": 1})
+
+    lib.call("DELETE", f"/api/subjects/{lib.subject_id}")
+    _check(lib, {})
+
+
+def test_counts_are_per_user(app, library):
+    mine, theirs = library(app), library(app)
+    mine.note("Mine", tags=["exam"])
+    theirs.note("Theirs", tags=["exam", "lab"])
+    _check(mine, {"exam": 1})
+    _check(theirs, {"exam": 1, "lab": 1})
+
+
+def test_rebuild_matches_the_running_counts(app, lib):
+    lib.note("A", tags=["exam", "lab"])
+    lib.note("B", tags=["exam"])
+    running = _counts(lib)
+    app.repo.rebuild_tag_counts()
+    assert _counts(lib) == running == {"exam": 2, "lab": 1}